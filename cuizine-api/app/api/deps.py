@@ -1,6 +1,11 @@
-from fastapi import HTTPException, logger, status
-from typing import TypeVar, Type, Optional
-from pydantic import BaseModel, ValidationError
+from fastapi import HTTPException, Depends, Request, status
+from typing import Any, Dict, TypeVar, Type, Optional
+from pydantic import BaseModel, Field, ValidationError
+from app.core.config import settings
+from app.core.security import TokenVerificationError, verify_token
+import logging
+
+logger = logging.getLogger(__name__)
 
 T = TypeVar('T', bound=BaseModel)
 
@@ -49,4 +54,100 @@ def validate_response_model(data: dict, model: Type[T]) -> Optional[T]:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Invalid response format from authentication service"
-        )
\ No newline at end of file
+        )
+
+class UserMetadata(BaseModel):
+    subscription_tier: str = "free"
+    subscription_status: Optional[str] = "active"
+    role: str = "user"
+    recipes_remaining: int = 0
+    recipes_generated: int = 0
+
+class JWTPayload(BaseModel):
+    sub: str
+    email: Optional[str] = None
+    metadata: UserMetadata = Field(default_factory=UserMetadata)
+    exp: Optional[int] = None
+    iat: Optional[int] = None
+
+class ClerkUser(BaseModel):
+    id: str
+    email: Optional[str] = None
+    metadata: UserMetadata
+
+async def verify_auth_token(authorization: Optional[str]) -> JWTPayload:
+    """Verify a bearer Authorization header and return its payload"""
+    if not authorization or not authorization.startswith("Bearer "):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Missing bearer token"
+        )
+
+    try:
+        claims = await verify_token(authorization[len("Bearer "):])
+    except TokenVerificationError as e:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail=f"Invalid token: {e}"
+        )
+    except Exception as e:
+        logger.error(f"Token verification failed: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Authentication service unavailable"
+        )
+
+    try:
+        return JWTPayload.model_validate(claims)
+    except ValidationError as e:
+        handle_clerk_error(e)
+
+async def get_current_user(request: Request) -> ClerkUser:
+    """
+    Resolve the authenticated user, verifying the token at most once per request.
+
+    The rate limit middleware runs first and stores the result on
+    `request.state.user`; route dependencies then reuse it.
+    """
+    user = getattr(request.state, "user", None)
+    if user is not None:
+        return user
+
+    payload = await verify_auth_token(request.headers.get("authorization"))
+    user = ClerkUser(id=payload.sub, email=payload.email, metadata=payload.metadata)
+    request.state.user = user
+    return user
+
+async def verify_subscription_access(
+    user: ClerkUser = Depends(get_current_user)
+) -> ClerkUser:
+    """Require an active subscription"""
+    if user.metadata.subscription_status not in (None, "active", "trialing"):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Subscription is not active"
+        )
+    return user
+
+async def require_admin(
+    user: ClerkUser = Depends(get_current_user)
+) -> ClerkUser:
+    """Require the admin role in the user's Clerk metadata"""
+    if user.metadata.role != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin access required"
+        )
+    return user
+
+async def get_subscription_tier(user: ClerkUser = Depends(get_current_user)) -> str:
+    return user.metadata.subscription_tier
+
+async def get_rate_limit(user: ClerkUser) -> int:
+    """Requests per minute allowed for the user's tier"""
+    limits: Dict[str, Any] = {
+        "free": settings.FREE_RATE_LIMIT,
+        "pro": settings.PRO_RATE_LIMIT,
+        "premium": settings.PREMIUM_RATE_LIMIT
+    }
+    return limits.get(user.metadata.subscription_tier, settings.FREE_RATE_LIMIT)
@@ -1,46 +1,108 @@
-from clerk_backend_api import Clerk
-from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response, status
+from fastapi.responses import JSONResponse
+from fastapi.responses import StreamingResponse
 from app.api.deps import ClerkUser, verify_subscription_access
-from app.core.database import get_db
-from sqlalchemy.orm import Session
+from app.core.admission import AdmissionRejected
+from app.core.config import settings
+from app.core.idempotency import idempotency, request_fingerprint
+from app.core.database import SessionLocal, get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+import anyio
+import asyncio
 import logging
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 
 from app.schemas.recipes import (
     RecipeGenerationRequest,
+    RecipeBatchRequest,
     RecipeResponse,
-    RecipeGenerationError
+    RecipeGenerationError,
+    GenerationJobResponse
 )
 
 # Import from models (DB models)
-from app.models.recipes import Recipe as DBRecipe
+from app.core.openai_manager import check_admission
 from app.services.recipe_generator import RecipeGeneratorService
+from app.services.credit_ledger import Reservation, credit_ledger
+from app.services.generation_queue import generation_queue
+from app.monitoring.metrics import metrics
+from app.utils.helpers import ClientDisconnected, cancel_on_disconnect, format_sse
 
-router = APIRouter(prefix="/api/v1/generator", tags=["recipe-generator"])
+router = APIRouter()
 logger = logging.getLogger(__name__)
 
+generations_cancelled = metrics.counter(
+    "generation_client_cancelled", "Generations cancelled and refunded because the client disconnected"
+)
+
+# SSE event names for elements of the arrays streamed item by item
+STREAM_ITEM_EVENTS = {
+    "ingredients": "ingredient",
+    "instructions": "instruction"
+}
+
 @router.post("/generate", 
     response_model=RecipeResponse,  # Use Pydantic schema for response
     responses={
+        202: {"model": GenerationJobResponse},
         403: {"model": RecipeGenerationError},
+        429: {"model": RecipeGenerationError},
         500: {"model": RecipeGenerationError}
     }
 )
 async def generate_recipe_endpoint(
     request: RecipeGenerationRequest,  # Use Pydantic schema for request
-    background_tasks: BackgroundTasks,
+    http_request: Request,
+    queue: bool = Query(False, description="Enqueue the generation and return a job to poll"),
+    idempotency_key: Optional[str] = Header(
+        None, alias="Idempotency-Key", description="Retries with the same key get the first response"
+    ),
     user: ClerkUser = Depends(verify_subscription_access),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ) -> RecipeResponse:
-    """Generate a recipe based on user preferences"""
-    try:
-        # Validate user has remaining recipes
-        if user.metadata.recipes_remaining <= 0:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="No recipe credits remaining. Please upgrade your plan."
-            )
+    """
+    Generate a recipe based on user preferences.
+
+    If the client disconnects before the recipe is ready the completion is
+    cancelled, nothing is stored and the credit is refunded. Queued
+    generations (`queue=true`) run to completion regardless.
+
+    With an Idempotency-Key, a retry joins or replays the first request
+    instead of paying for another completion and credit. Such a request is
+    not cancelled on disconnect, so the retry finds the finished recipe; it
+    runs with a session of its own since it can outlive this request's.
+    """
+    if idempotency_key is None:
+        return await generate_recipe(request, user, db, queue, http_request)
+
+    async def detached():
+        async with SessionLocal() as session:
+            return await generate_recipe(request, user, session, queue, http_request, watch_disconnect=False)
+
+    return await idempotency.run(
+        "generate",
+        user.id,
+        idempotency_key,
+        request_fingerprint({"request": request, "queue": queue}),
+        detached
+    )
+
+async def generate_recipe(
+    request: RecipeGenerationRequest,
+    user: ClerkUser,
+    db: AsyncSession,
+    queue: bool,
+    http_request: Request,
+    watch_disconnect: bool = True
+):
+    """Reserve a credit and generate, cancelling on a disconnect of `http_request` if `watch_disconnect`"""
+    # Take the credit before paying for a completion; parallel requests cannot overdraw
+    reservation = await reserve_credits(user)
+
+    if queue:
+        return await enqueue_generation(request, user, reservation, db, http_request)
 
+    try:
         # Log generation attempt
         logger.info(f"Generating recipe for user {user.id}", 
                    extra={
@@ -50,117 +112,377 @@ async def generate_recipe_endpoint(
                    })
 
         # Initialize service
-        generator_service = RecipeGeneratorService(db)
+        generator_service = RecipeGeneratorService(db, subscription_tier=user.metadata.subscription_tier)
         
         # Generate recipe
-        recipe = await generator_service.generate_recipe(request, user.id)
+        generation = generator_service.generate_recipe(request, user.id)
+        if not watch_disconnect:
+            recipe = await generation
+        else:
+            recipe = await cancel_on_disconnect(
+                http_request,
+                generation,
+                poll_interval=settings.DISCONNECT_POLL_INTERVAL
+            )
 
-        # Update user's recipe count in background
-        background_tasks.add_task(
-            update_user_recipe_count,
-            user.id
+    except ClientDisconnected:
+        await refund_abandoned(reservation, "generate")
+        logger.info(f"Client disconnected; cancelled generation for user {user.id}")
+        return Response(status_code=499)  # Client Closed Request; nobody is listening
+    except AdmissionRejected as e:
+        await credit_ledger.refund(reservation)
+        return capacity_exceeded(e)
+    except Exception as e:
+        await credit_ledger.refund(reservation)
+        logger.error(f"Recipe generation failed: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to generate recipe"
         )
 
-        return RecipeResponse(
-            success=True,
-            data=recipe,
-            credits_remaining=user.metadata.recipes_remaining - 1,
-            generation_id=recipe.id
-        )
+    # Clerk metadata catches up with the ledger in the background
+    await credit_ledger.commit(reservation)
 
+    return RecipeResponse(
+        success=True,
+        data=recipe,
+        credits_remaining=reservation.remaining,
+        generation_id=recipe.id
+    )
+
+async def enqueue_generation(
+    request: RecipeGenerationRequest,
+    user: ClerkUser,
+    reservation: Reservation,
+    db: AsyncSession,
+    http_request: Request
+) -> JSONResponse:
+    """Hand a generation to the job queue; a worker settles the reserved credit"""
+    try:
+        job = await generation_queue.enqueue(
+            db, user.id, request, user.metadata.subscription_tier, reservation.count
+        )
     except Exception as e:
-        logger.error(f"Recipe generation failed: {str(e)}")
+        logger.error(f"Failed to enqueue generation for user {user.id}: {str(e)}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Failed to generate recipe"
+            detail="Failed to queue recipe generation"
+        )
+
+    logger.info(f"Queued generation job {job.id} for user {user.id}")
+    response = GenerationJobResponse(
+        job_id=job.id,
+        status=job.status,
+        credits_remaining=reservation.remaining,
+        created_at=job.created_at
+    )
+    return JSONResponse(
+        status_code=status.HTTP_202_ACCEPTED,
+        content=response.model_dump(mode="json"),
+        headers={"Location": str(http_request.url_for("get_generation_job", job_id=job.id))}
+    )
+
+@router.get("/jobs/{job_id}",
+    response_model=GenerationJobResponse,
+    responses={
+        404: {"model": RecipeGenerationError}
+    }
+)
+async def get_generation_job(
+    job_id: str,
+    user: ClerkUser = Depends(verify_subscription_access),
+    db: AsyncSession = Depends(get_db)
+) -> GenerationJobResponse:
+    """Poll a queued generation; `data` holds the recipe once it succeeded"""
+    job = await generation_queue.get(db, job_id, user.id)
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Generation job not found"
         )
 
+    recipe = None
+    if job.status == "succeeded" and job.recipe_id:
+        recipe = await RecipeGeneratorService(db).get_recipe(job.recipe_id)
+
+    return GenerationJobResponse(
+        job_id=job.id,
+        status=job.status,
+        attempts=job.attempts,
+        data=recipe,
+        error=job.error,
+        created_at=job.created_at,
+        finished_at=job.finished_at
+    )
+
+@router.post("/generate/stream",
+    response_class=StreamingResponse,
+    responses={
+        403: {"model": RecipeGenerationError},
+        429: {"model": RecipeGenerationError}
+    }
+)
+async def stream_recipe_endpoint(
+    request: RecipeGenerationRequest,
+    user: ClerkUser = Depends(verify_subscription_access)
+) -> StreamingResponse:
+    """
+    Generate a recipe as a Server-Sent Events stream.
+
+    Emits a `field` event for each top-level value as soon as it is complete,
+    an `ingredient` / `instruction` event per list element, then a `recipe`
+    event with the same body as /generate once the recipe is stored. A
+    failure mid-stream refunds the credit and ends with an `error` event.
+
+    The body runs after this handler (and its dependencies) have returned,
+    so the stream opens a session of its own.
+    """
+    tier = user.metadata.subscription_tier
+    try:
+        check_admission(tier)
+    except AdmissionRejected as e:
+        return capacity_exceeded(e)
+
+    reservation = await reserve_credits(user)
+
+    logger.info(f"Streaming recipe for user {user.id}",
+               extra={
+                   "user_id": user.id,
+                   "recipe_type": request.recipe_type,
+                   "ingredients": len(request.ingredients)
+               })
+
+    async def events():
+        settled = False
+        try:
+            async with SessionLocal() as db:
+                generator_service = RecipeGeneratorService(db, subscription_tier=tier)
+                async for event in generator_service.stream_recipe(request, user.id):
+                    if event.kind == "item":
+                        yield format_sse(
+                            STREAM_ITEM_EVENTS.get(event.key, "item"),
+                            {"index": event.index, "value": event.value}
+                        )
+                    elif event.kind == "field":
+                        yield format_sse("field", {"key": event.key, "value": event.value})
+                    else:
+                        recipe = event.value
+                        # Stored: the credit is owed even if the client leaves now
+                        settled = True
+                        with anyio.CancelScope(shield=True):
+                            await credit_ledger.commit(reservation)
+                        response = RecipeResponse(
+                            success=True,
+                            data=recipe,
+                            credits_remaining=reservation.remaining,
+                            generation_id=recipe.id
+                        )
+                        yield format_sse("recipe", response.model_dump(mode="json"))
+
+        except (asyncio.CancelledError, GeneratorExit):
+            if not settled:
+                await refund_abandoned(reservation, "stream")
+            raise
+        except AdmissionRejected as e:
+            await credit_ledger.refund(reservation)
+            yield format_sse("error", {
+                "detail": "Recipe generation is at capacity",
+                "retry_after": e.retry_after
+            })
+        except Exception as e:
+            await credit_ledger.refund(reservation)
+            logger.error(f"Recipe streaming failed: {str(e)}")
+            yield format_sse("error", {"detail": "Failed to generate recipe"})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"  # Keep proxies from buffering the stream
+        }
+    )
+
+@router.post("/batch",
+    response_class=StreamingResponse,
+    responses={
+        403: {"model": RecipeGenerationError},
+        429: {"model": RecipeGenerationError}
+    }
+)
+async def generate_batch_endpoint(
+    batch: RecipeBatchRequest,
+    user: ClerkUser = Depends(verify_subscription_access)
+) -> StreamingResponse:
+    """
+    Generate several recipes in one request, streamed as Server-Sent Events.
+
+    Credits for the whole batch are reserved up front. Each generation is
+    stored as soon as it finishes and emitted as a `recipe` event (or
+    `failed`) with its index in the batch; a `done` event then reports the
+    totals. Only stored recipes are charged, including when the client
+    leaves early. Like /generate/stream, the body opens its own session.
+    """
+    tier = user.metadata.subscription_tier
+    try:
+        check_admission(tier)
+    except AdmissionRejected as e:
+        return capacity_exceeded(e)
+
+    reservation = await reserve_credits(user, count=len(batch.requests))
+
+    logger.info(f"Generating batch of {len(batch.requests)} recipes for user {user.id}",
+               extra={"user_id": user.id, "batch_size": len(batch.requests)})
+
+    async def events():
+        generated = 0
+        try:
+            async with SessionLocal() as db:
+                generator_service = RecipeGeneratorService(db, subscription_tier=tier)
+                async for result in generator_service.generate_batch(
+                    batch.requests,
+                    user.id,
+                    concurrency=settings.GENERATION_BATCH_CONCURRENCY
+                ):
+                    if result.recipe is not None:
+                        generated += 1  # Already stored
+                        yield format_sse("recipe", {
+                            "index": result.index,
+                            "data": result.recipe.model_dump(mode="json")
+                        })
+                    else:
+                        yield format_sse("failed", {
+                            "index": result.index,
+                            "detail": "Failed to generate recipe"
+                        })
+
+        except (asyncio.CancelledError, GeneratorExit):
+            # Recipes stored so far are owed; the rest of the reservation goes back
+            with anyio.CancelScope(shield=True):
+                await credit_ledger.commit(reservation, used=generated)
+            generations_cancelled.inc(endpoint="batch")
+            raise
+        except Exception as e:
+            await credit_ledger.commit(reservation, used=generated)
+            logger.error(f"Batch generation failed: {str(e)}")
+            yield format_sse("error", {"detail": "Failed to generate recipes"})
+            return
+
+        with anyio.CancelScope(shield=True):
+            await credit_ledger.commit(reservation, used=generated)
+
+        yield format_sse("done", {
+            "generated": generated,
+            "failed": len(batch.requests) - generated,
+            "credits_remaining": reservation.remaining
+        })
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"
+        }
+    )
+
 @router.post("/regenerate/{recipe_id}", 
     response_model=RecipeResponse,
     responses={
         404: {"model": RecipeGenerationError},
+        429: {"model": RecipeGenerationError},
         500: {"model": RecipeGenerationError}
     }
 )
 async def regenerate_recipe(
     recipe_id: str,
-    background_tasks: BackgroundTasks,
     user: ClerkUser = Depends(verify_subscription_access),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ) -> RecipeResponse:
     """Regenerate a recipe with the same parameters"""
-    try:
-        generator_service = RecipeGeneratorService(db)
-        
-        # Get original recipe parameters
-        original_params = await generator_service.get_recipe_parameters(recipe_id)
-        if not original_params:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Original recipe not found"
-            )
+    generator_service = RecipeGeneratorService(db, subscription_tier=user.metadata.subscription_tier)
+    
+    # Get original recipe parameters
+    original_params = await generator_service.get_recipe_parameters(recipe_id)
+    if not original_params:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Original recipe not found"
+        )
+
+    reservation = await reserve_credits(user)
 
-        # Create new request from original parameters
-        request = RecipeGenerationRequest(**original_params)
+    try:
+        # Create new request from original parameters; always a new variant
+        request = RecipeGenerationRequest(**{**original_params, "fresh": True})
         
         # Generate new recipe
         recipe = await generator_service.generate_recipe(request, user.id)
-        
-        # Update user's recipe count in background
-        background_tasks.add_task(
-            update_user_recipe_count,
-            user.id
-        )
-        
-        return RecipeResponse(
-            success=True,
-            data=recipe,
-            credits_remaining=user.metadata.recipes_remaining - 1,
-            generation_id=recipe.id
-        )
 
-    except HTTPException:
-        raise
+    except AdmissionRejected as e:
+        await credit_ledger.refund(reservation)
+        return capacity_exceeded(e)
     except Exception as e:
+        await credit_ledger.refund(reservation)
         logger.error(f"Recipe regeneration failed: {str(e)}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to regenerate recipe"
         )
 
-async def update_user_recipe_count(user_id: str) -> None:
-    """Update user's remaining recipe count"""
-    try:
-        # Get current metadata
-        user = Clerk.users.get(user_id=user_id)
-        metadata = user.public_metadata or {}
-        
-        # Update recipe count
-        recipes_remaining = metadata.get('recipes_remaining', 0) - 1
-        recipes_generated = metadata.get('recipes_generated', 0) + 1
-        
-        # Update metadata
-        Clerk.users.update_metadata(
-            user_id=user_id,
-            public_metadata={
-                **metadata,
-                'recipes_remaining': max(0, recipes_remaining),
-                'recipes_generated': recipes_generated
-            }
+    await credit_ledger.commit(reservation)
+    
+    return RecipeResponse(
+        success=True,
+        data=recipe,
+        credits_remaining=reservation.remaining,
+        generation_id=recipe.id
+    )
+
+def capacity_exceeded(e: AdmissionRejected) -> JSONResponse:
+    """429 for a generation shed because OpenAI capacity is saturated"""
+    error = RecipeGenerationError(
+        message="Recipe generation is at capacity. Please retry shortly.",
+        error_code="capacity_exceeded",
+        retry_after=e.retry_after
+    )
+    return JSONResponse(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        content=error.model_dump(mode="json"),
+        headers={"Retry-After": str(e.retry_after)}
+    )
+
+async def refund_abandoned(reservation: Reservation, endpoint: str) -> None:
+    """Refund a generation the client walked away from, even while being cancelled"""
+    with anyio.CancelScope(shield=True):
+        await credit_ledger.refund(reservation)
+    generations_cancelled.inc(endpoint=endpoint)
+
+async def reserve_credits(user: ClerkUser, count: int = 1) -> Reservation:
+    """Atomically reserve recipe credits or fail with 403"""
+    reservation = await credit_ledger.reserve(
+        user.id,
+        user.metadata.recipes_remaining,
+        user.metadata.recipes_generated,
+        count=count
+    )
+    if reservation is None:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="No recipe credits remaining. Please upgrade your plan."
         )
-    except Exception as e:
-        logger.error(f"Failed to update recipe count: {str(e)}")
-        raise
+    return reservation
 
 @router.get("/credits")
 async def get_recipe_credits(
     user: ClerkUser = Depends(verify_subscription_access)
 ) -> Dict[str, Any]:
     """Get user's remaining recipe credits"""
+    remaining = await credit_ledger.get_remaining(user.id, user.metadata.recipes_remaining)
     return {
         "success": True,
         "data": {
-            "remaining": user.metadata.recipes_remaining,
+            "remaining": remaining,
             "total": get_plan_limit(user.metadata.subscription_tier),
             "subscription_tier": user.metadata.subscription_tier
         }
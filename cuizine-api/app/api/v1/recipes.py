@@ -1,9 +1,17 @@
 from datetime import datetime
+from fastapi import APIRouter, Depends, Query
 from pydantic import BaseModel, Field
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional, Dict, Any
 from enum import Enum
 
+from app.api.deps import ClerkUser, get_current_user
+from app.core.database import get_db
 from app.schemas.base import BaseResponse, ErrorResponse
+from app.schemas.recipes import RecipeLookupField, RecipeLookupMatch, RecipeLookupResponse
+from app.services.recipe_storage import RecipeStorageService
+
+router = APIRouter()
 
 class RecipeType(str, Enum):
     RANDOM = "random"
@@ -102,3 +110,15 @@ class Recipe(BaseModel):
     storage_instructions: Optional[str] = None
     leftover_ideas: Optional[List[str]] = None
     scaling_notes: Optional[str] = None
+
+@router.get("/lookup", response_model=RecipeLookupResponse)
+async def lookup_recipes(
+    q: str = Query(..., min_length=3, max_length=100, description="Title or ingredient, typos allowed"),
+    field: RecipeLookupField = Query(RecipeLookupField.TITLE),
+    limit: int = Query(10, ge=1, le=50),
+    user: ClerkUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+) -> RecipeLookupResponse:
+    """Recipes whose title or ingredients resemble `q`, closest first with their similarity"""
+    matches = await RecipeStorageService(db).fuzzy_lookup(q, field, limit=limit)
+    return RecipeLookupResponse(data=[RecipeLookupMatch.model_validate(match) for match in matches])
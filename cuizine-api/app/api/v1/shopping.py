@@ -0,0 +1,84 @@
+from fastapi import APIRouter, Depends, Header, HTTPException, status
+from app.api.deps import ClerkUser, get_current_user
+from app.core.database import SessionLocal, get_db
+from app.core.idempotency import idempotency, request_fingerprint
+from app.schemas.shopping import (
+    ShoppingList,
+    ShoppingListCreate,
+    ShoppingListMerge,
+    ShoppingListResponse
+)
+from app.services.shopping_list import ShoppingListService
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Any, Awaitable, Callable, Optional
+
+router = APIRouter()
+
+async def run_once(
+    endpoint: str,
+    user: ClerkUser,
+    idempotency_key: Optional[str],
+    body: Any,
+    db: AsyncSession,
+    handler: Callable[[AsyncSession], Awaitable[ShoppingListResponse]]
+):
+    """
+    Run a list write directly with the request's session, or at most once
+    per key when the client sent one. A keyed write runs in a task that can
+    outlive the request, so it opens a session of its own.
+    """
+    if idempotency_key is None:
+        return await handler(db)
+
+    async def detached() -> ShoppingListResponse:
+        async with SessionLocal() as session:
+            return await handler(session)
+
+    return await idempotency.run(
+        endpoint,
+        user.id,
+        idempotency_key,
+        request_fingerprint(body),
+        detached,
+        status_code=status.HTTP_201_CREATED
+    )
+
+@router.post("", response_model=ShoppingListResponse, status_code=status.HTTP_201_CREATED)
+async def create_shopping_list(
+    body: ShoppingListCreate,
+    idempotency_key: Optional[str] = Header(
+        None, alias="Idempotency-Key", description="Retries with the same key get the first response"
+    ),
+    user: ClerkUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+) -> ShoppingListResponse:
+    """Create a shopping list from a recipe's ingredients"""
+    async def create(db: AsyncSession):
+        try:
+            shopping_list = await ShoppingListService(db).create_list_from_recipe(
+                body.recipe_id, user.id, servings=body.servings
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+        return ShoppingListResponse(data=ShoppingList.model_validate(shopping_list))
+
+    return await run_once("shopping_create", user, idempotency_key, body, db, create)
+
+@router.post("/merge", response_model=ShoppingListResponse, status_code=status.HTTP_201_CREATED)
+async def merge_shopping_lists(
+    body: ShoppingListMerge,
+    idempotency_key: Optional[str] = Header(
+        None, alias="Idempotency-Key", description="Retries with the same key get the first response"
+    ),
+    user: ClerkUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+) -> ShoppingListResponse:
+    """Merge several of the user's lists into a new one, adding up shared items"""
+    async def merge(db: AsyncSession):
+        try:
+            merged = await ShoppingListService(db).merge_lists(body.list_ids, user.id, body.name)
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+        return ShoppingListResponse(data=ShoppingList.model_validate(merged))
+
+    return await run_once("shopping_merge", user, idempotency_key, body, db, merge)
@@ -0,0 +1,39 @@
+from fastapi import APIRouter, Depends, Query
+from app.api.deps import ClerkUser, get_current_user, require_admin
+from app.core.database import get_db
+from app.monitoring.llm_ledger import usage_summary
+from app.schemas.usage import LLMUsageGroup, LLMUsageResponse, UsageGroupBy
+from datetime import datetime, timedelta, timezone
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+
+router = APIRouter()
+
+async def _summary(db: AsyncSession, group_by: UsageGroupBy, hours: int, user_id: Optional[str] = None) -> LLMUsageResponse:
+    since = datetime.now(timezone.utc) - timedelta(hours=hours)
+    rows = await usage_summary(db, group_by.value, since, user_id=user_id)
+    return LLMUsageResponse(
+        group_by=group_by,
+        since=since,
+        groups=[LLMUsageGroup(**row) for row in rows]
+    )
+
+@router.get("/llm", response_model=LLMUsageResponse)
+async def llm_usage(
+    group_by: UsageGroupBy = Query(UsageGroupBy.TIER),
+    hours: int = Query(24, ge=1, le=24 * 90, description="Look-back window"),
+    user: ClerkUser = Depends(require_admin),
+    db: AsyncSession = Depends(get_db)
+) -> LLMUsageResponse:
+    """Token spend and latency percentiles of LLM calls per user, tier, recipe type or model"""
+    return await _summary(db, group_by, hours)
+
+@router.get("/llm/me", response_model=LLMUsageResponse)
+async def my_llm_usage(
+    group_by: UsageGroupBy = Query(UsageGroupBy.RECIPE_TYPE),
+    hours: int = Query(24, ge=1, le=24 * 90, description="Look-back window"),
+    user: ClerkUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+) -> LLMUsageResponse:
+    """The same summary restricted to the caller's own calls"""
+    return await _summary(db, group_by, hours, user_id=user.id)
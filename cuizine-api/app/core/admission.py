@@ -0,0 +1,107 @@
+from typing import Dict, List, Optional
+import asyncio
+import heapq
+import itertools
+import math
+import time
+
+class AdmissionRejected(Exception):
+    """The queue is too long to admit another request; retry after `retry_after` seconds"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Admission queue is full, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+class PriorityAdmission:
+    """
+    Capacity-limited admission that serves waiters by tier and by age.
+
+    Every waiter is ordered by a virtual arrival time: its real arrival minus
+    the head start of its tier. A premium request therefore overtakes free
+    requests that have waited less than the gap between the two head starts,
+    but a free request that has waited longer than that gap is served first,
+    so lower tiers age into priority instead of starving.
+
+    The expected wait for a newcomer is estimated from the number of waiters
+    ahead of it and a moving average of how long a slot is held. When it goes
+    past `max_wait` the request is rejected with AdmissionRejected rather than
+    queued.
+    """
+
+    def __init__(
+        self,
+        capacity: int,
+        headstarts: Dict[str, float],
+        max_wait: float,
+        initial_service_time: float = 5.0
+    ):
+        self.capacity = capacity
+        self.headstarts = headstarts
+        self.max_wait = max_wait
+        self.service_time = initial_service_time  # Moving average of slot hold time
+        self._in_use = 0
+        self._waiters: List[list] = []  # Heap of [virtual_arrival, seq, future]
+        self._seq = itertools.count()
+
+    @property
+    def in_use(self) -> int:
+        return self._in_use
+
+    @property
+    def waiting(self) -> int:
+        return sum(1 for _, _, future in self._waiters if not future.done())
+
+    def _virtual_arrival(self, tier: str, now: float) -> float:
+        return now - self.headstarts.get(tier, 0.0)
+
+    def estimated_wait(self, tier: str) -> float:
+        """Seconds a request of `tier` arriving now is expected to queue"""
+        if self._in_use < self.capacity and not self.waiting:
+            return 0.0
+        key = self._virtual_arrival(tier, time.monotonic())
+        ahead = sum(
+            1 for arrival, _, future in self._waiters
+            if arrival <= key and not future.done()
+        )
+        return (ahead + 1) * self.service_time / self.capacity
+
+    def check(self, tier: str) -> None:
+        """Raise AdmissionRejected if a request of `tier` would be shed right now"""
+        wait = self.estimated_wait(tier)
+        if wait > self.max_wait:
+            raise AdmissionRejected(retry_after=max(1, math.ceil(wait)))
+
+    async def acquire(self, tier: str, shed: bool = True) -> None:
+        if self._in_use < self.capacity and not self.waiting:
+            self._in_use += 1
+            return
+        if shed:
+            self.check(tier)
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(
+            self._waiters,
+            [self._virtual_arrival(tier, time.monotonic()), next(self._seq), future]
+        )
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was handed over just as we were cancelled; pass it on
+                self._in_use -= 1
+                self._wake()
+            raise
+
+    def release(self, held: Optional[float] = None) -> None:
+        if held is not None:
+            self.service_time = 0.8 * self.service_time + 0.2 * held
+        self._in_use -= 1
+        self._wake()
+
+    def _wake(self) -> None:
+        while self._in_use < self.capacity and self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if future.done():
+                continue  # Cancelled while waiting
+            self._in_use += 1
+            future.set_result(None)
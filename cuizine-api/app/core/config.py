@@ -1,6 +1,6 @@
 from functools import lru_cache
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import Any, Dict, List, Optional
 
 class Settings(BaseSettings):
     # Your exact environment variables from the .env file
@@ -12,7 +12,69 @@ class Settings(BaseSettings):
     CLERK_JWKS_URL: str 
     CLERK_ISSUER: str 
     CLERK_AUDIENCE: str 
+    CLERK_JWKS_CACHE_TTL: int = 3600  # Seconds before signing keys are re-fetched
+    AUTH_CLAIMS_CACHE_SIZE: int = 10000  # Verified tokens kept per worker
+    AUTH_CLAIMS_CACHE_TTL: int = 60  # Seconds a verified token skips signature checks
     OPENAI_API_KEY: str
+    OPENAI_MAX_CONCURRENCY: int = 16  # In-flight completions per worker
+    OPENAI_MAX_CONNECTIONS: int = 32
+    OPENAI_MAX_KEEPALIVE_CONNECTIONS: int = 16
+    OPENAI_KEEPALIVE_EXPIRY: float = 90.0  # Seconds an idle connection stays open
+    OPENAI_TIMEOUT: float = 60.0  # HTTP read timeout for the OpenAI client
+    OPENAI_DEADLINE: float = 45.0  # Seconds one generation may take, queueing and retries included
+    OPENAI_ATTEMPT_TIMEOUT: float = 30.0  # Seconds a single completion attempt may take once it has a slot
+    OPENAI_MAX_ATTEMPTS: int = 3  # Attempts for transient failures (timeouts, 429, 5xx)
+    OPENAI_HEDGE_ENABLED: bool = False  # Fire a second request once the first passes p95 latency
+    OPENAI_HEDGE_MIN_SAMPLES: int = 50  # Completions observed before p95 is trusted for hedging
+    OPENAI_TIER_HEADSTART: Dict[str, float] = {  # Seconds of queue seniority a tier starts with
+        "free": 0.0,
+        "pro": 15.0,
+        "premium": 30.0
+    }
+    OPENAI_MAX_QUEUE_WAIT: float = 20.0  # Shed with 429 when the estimated queue wait exceeds this
+    # Completion backends and which ones each tier / recipe_type tries, in order
+    MODEL_ROUTES: Dict[str, Any] = {
+        "backends": {
+            "openai-mini": {"model": "gpt-4o-mini", "slo_p95": 20.0, "max_error_rate": 0.25}
+        },
+        "routes": {
+            "*": {"*": ["openai-mini"]}
+        }
+    }
+    MODEL_ROUTES_FILE: Optional[str] = None  # JSON file overriding MODEL_ROUTES, reloaded when it changes
+    MODEL_ROUTES_RELOAD_INTERVAL: float = 5.0  # Seconds between checks of MODEL_ROUTES_FILE
+    MODEL_BREAKER_WINDOW: float = 60.0  # Seconds of calls behind a backend's p95 and error rate
+    MODEL_BREAKER_MIN_SAMPLES: int = 10  # Calls in the window before a breaker may open
+    MODEL_BREAKER_COOLDOWN: float = 30.0  # Seconds an open backend is skipped before a probe
+    RECIPE_OUTPUT_FORMAT: str = "compact"  # "compact" (strict short-key schema) or "verbose" (JSON template prompt)
+    OPENAI_MAX_OUTPUT_TOKENS: Dict[str, int] = {  # Completion token cap per output format
+        "compact": 1500,
+        "verbose": 4000
+    }
+    # Exact-match cache of generated recipes
+    GENERATION_CACHE_BACKEND: str = "redis"  # "redis" (local LRU + Redis) or "memory" (LRU only)
+    GENERATION_CACHE_SIZE: int = 1024  # Recipes kept in the per-worker LRU
+    GENERATION_CACHE_TTLS: Dict[str, int] = {  # Seconds per recipe_type; 0 disables caching
+        "random": 24 * 3600,
+        "custom": 6 * 3600,
+        "crazy": 0
+    }
+    # Serve stored AI recipes matching a request instead of generating a new one
+    RECIPE_LIBRARY_ENABLED: bool = False  # Each process keeps its own index in memory; opt in per deployment
+    RECIPE_LIBRARY_MAX_ENTRIES: int = 20000  # Newest AI recipes indexed per process; older ones are never served
+    RECIPE_LIBRARY_MIN_SCORE: float = 0.9  # Match score in [0, 1] a stored recipe needs to be served
+    RECIPE_LIBRARY_TOP_K: int = 5  # Served recipe is picked at random among this many best matches
+    RECIPE_LIBRARY_TIERS: List[str] = ["free", "pro"]  # Tiers that may be served library recipes
+    RECIPE_LIBRARY_RECIPE_TYPES: List[str] = ["random", "custom"]  # "crazy" always gets a new one
+    RECIPE_LIBRARY_REFRESH_INTERVAL: float = 300.0  # Seconds between loads of recipes stored by other workers
+    # Database pool; every worker process opens its own
+    WEB_CONCURRENCY: int = 1  # Worker processes per host, as read by uvicorn / gunicorn
+    DB_MAX_CONNECTIONS: int = 40  # Connections one host's processes may hold in total
+    DB_REQUEST_CONNECTIONS: int = 10  # Connections a process keeps open for requests beyond its workers
+    DB_POOL_TIMEOUT: float = 10.0  # Seconds a checkout waits for a free connection before failing
+    DB_POOL_RECYCLE: int = 1800  # Seconds before a connection is closed and reopened
+    DB_STATEMENT_TIMEOUT_MS: int = 15000  # Postgres statement_timeout per connection; 0 disables
+    FUZZY_MATCH_THRESHOLD: float = 0.5  # pg_trgm word similarity (0-1) a misspelled lookup must reach
     REDIS_URL: str = "your_redis_url"  # Optional with default
     FRONTEND_URL: str = "your_nextjs_url"  # Optional with default
     SLACK_TOKEN: Optional[str] = "your_slack_token"  # Optional
@@ -24,6 +86,32 @@ class Settings(BaseSettings):
     FREE_RATE_LIMIT: int = 10
     PRO_RATE_LIMIT: int = 50
     PREMIUM_RATE_LIMIT: int = 100
+    RATE_LIMIT_BACKEND: str = "upstash"  # "upstash", "local" (token buckets + Redis sync) or "memory"
+    RATE_LIMIT_SYNC_INTERVAL_MS: int = 250  # How often "local" reconciles with Redis
+    RATE_LIMIT_OVERSHOOT: float = 0.1  # Fraction of a limit a worker may admit between syncs
+    # Recipe credit ledger (Clerk metadata is synced write-behind)
+    CREDIT_LEDGER_BACKEND: str = "redis"  # "redis" or "memory"
+    CREDIT_LEDGER_TTL: int = 35 * 24 * 3600  # Seconds an idle balance is kept
+    CREDIT_SYNC_INTERVAL: float = 5.0  # Seconds between Clerk syncs
+    CREDIT_SYNC_BATCH_SIZE: int = 100
+    CREDIT_SYNC_CONCURRENCY: int = 10
+    # Durable generation job queue (Postgres, claimed with SKIP LOCKED)
+    GENERATION_WORKERS: int = 4  # Jobs run concurrently per process; 0 disables the in-process pool
+    GENERATION_JOB_POLL_INTERVAL: float = 1.0  # Seconds an idle worker waits before polling again
+    GENERATION_JOB_LEASE: int = 300  # Seconds before a running job whose worker died is reclaimed; renewed while it runs
+    GENERATION_JOB_MAX_ATTEMPTS: int = 3
+    GENERATION_JOB_RETENTION_DAYS: int = 7  # Finished jobs (and their polling URLs) are deleted after this
+    GENERATION_BATCH_CONCURRENCY: int = 4  # Completions in flight per batch request
+    DISCONNECT_POLL_INTERVAL: float = 0.5  # Seconds between client disconnect checks during a generation
+    # Idempotency-Key handling for generation and shopping list writes
+    IDEMPOTENCY_BACKEND: str = "redis"  # "redis" or "memory"
+    IDEMPOTENCY_TTL: int = 24 * 3600  # Seconds a completed response is replayed for its key
+    IDEMPOTENCY_LOCK_TTL: int = 120  # Seconds a key stays claimed by a running request; above OPENAI_DEADLINE
+    IDEMPOTENCY_POLL_INTERVAL: float = 0.5  # Seconds between checks while another worker runs the key
+    # Per-call LLM accounting written to llm_calls
+    LLM_LEDGER_BATCH_SIZE: int = 200  # Records per INSERT; a full batch is written right away
+    LLM_LEDGER_FLUSH_INTERVAL: float = 2.0  # Seconds between writes of a partial batch
+    LLM_LEDGER_MAX_PENDING: int = 10000  # Records buffered before new ones are dropped
     
     
 
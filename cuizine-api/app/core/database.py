@@ -1,15 +1,144 @@
-from sqlalchemy import create_engine
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import event, exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from typing import Any, AsyncIterator, Dict, Tuple
+from app.monitoring.metrics import metrics
 from .config import settings
+import time
 
-engine = create_engine(settings.DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+POOL_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# Connections held by tasks that run beside requests: LLM ledger flusher and recipe library refresh
+BACKGROUND_CONNECTIONS = 2
+
+pool_checkout_wait = metrics.histogram(
+    "db_pool_checkout_wait_seconds", "Time spent waiting for a pooled connection", buckets=POOL_BUCKETS
+)
+pool_hold_time = metrics.histogram(
+    "db_pool_hold_seconds", "Time a connection was checked out before going back to the pool",
+    buckets=POOL_BUCKETS
+)
+pool_checkout_timeouts = metrics.counter(
+    "db_pool_checkout_timeouts", "Checkouts that gave up after DB_POOL_TIMEOUT"
+)
+pool_checked_out = metrics.gauge(
+    "db_pool_checked_out", "Connections currently checked out of the pool"
+)
+pool_overflow = metrics.gauge(
+    "db_pool_overflow", "Connections open beyond pool_size; negative while the pool is not yet full"
+)
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """Queue pool that reports how long each checkout waited, including opening a new connection"""
+
+    def _do_get(self):
+        started = time.monotonic()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            pool_checkout_timeouts.inc()
+            raise
+        finally:
+            pool_checkout_wait.observe(time.monotonic() - started)
+
+def observe_pool(engine: AsyncEngine) -> AsyncEngine:
+    """Report hold time and pool occupancy for the engine; checkout waits need an InstrumentedPool"""
+    pool = engine.sync_engine.pool
+
+    def record_occupancy(returning: int = 0) -> None:
+        if isinstance(pool, AsyncAdaptedQueuePool):
+            pool_checked_out.set(pool.checkedout() - returning)
+            pool_overflow.set(pool.overflow())
+
+    def on_checkout(dbapi_connection, connection_record, connection_proxy) -> None:
+        connection_record.info["checked_out_at"] = time.monotonic()
+        record_occupancy()
+
+    def on_checkin(dbapi_connection, connection_record) -> None:
+        checked_out_at = connection_record.info.pop("checked_out_at", None)
+        if checked_out_at is not None:
+            pool_hold_time.observe(time.monotonic() - checked_out_at)
+        # The event fires before the pool takes the connection back
+        record_occupancy(returning=1)
+
+    event.listen(engine.sync_engine, "checkout", on_checkout)
+    event.listen(engine.sync_engine, "checkin", on_checkin)
+    return engine
+
+def async_database_url(url: str) -> str:
+    """DATABASE_URL with its Postgres driver swapped for asyncpg; Alembic keeps the sync one"""
+    parsed = make_url(url)
+    if parsed.get_backend_name() == "postgresql":
+        parsed = parsed.set(drivername="postgresql+asyncpg")
+    return parsed.render_as_string(hide_password=False)
+
+def pool_limits(
+    max_connections: int = settings.DB_MAX_CONNECTIONS,
+    processes: int = settings.WEB_CONCURRENCY,
+    generation_workers: int = settings.GENERATION_WORKERS,
+    request_connections: int = settings.DB_REQUEST_CONNECTIONS
+) -> Tuple[int, int]:
+    """
+    (pool_size, max_overflow) for one worker process.
+
+    The pool keeps enough connections open for the process's generation
+    workers, its background tasks and `request_connections` concurrent
+    requests. Overflow may grow it up to the process's share of
+    `max_connections`, so all processes together never exceed it.
+    """
+    share = max(1, max_connections // max(1, processes))
+    wanted = generation_workers + BACKGROUND_CONNECTIONS + request_connections
+    pool_size = max(1, min(wanted, share))
+    return pool_size, share - pool_size
+
+def build_engine(url: str = settings.DATABASE_URL, **options: Any) -> AsyncEngine:
+    """
+    The process's async engine: sized by `pool_limits`, connections checked
+    with a ping before use and recycled every DB_POOL_RECYCLE seconds, and
+    on Postgres every statement capped at DB_STATEMENT_TIMEOUT_MS by the
+    server. `options` override any create_async_engine argument.
+    """
+    pool_size, max_overflow = pool_limits()
+    arguments: Dict[str, Any] = {
+        "poolclass": InstrumentedPool,
+        "pool_size": pool_size,
+        "max_overflow": max_overflow,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": True
+    }
+    if make_url(url).get_backend_name() == "postgresql" and settings.DB_STATEMENT_TIMEOUT_MS:
+        arguments["connect_args"] = {
+            "server_settings": {"statement_timeout": str(settings.DB_STATEMENT_TIMEOUT_MS)}
+        }
+    arguments.update(options)
+    return observe_pool(create_async_engine(async_database_url(url), **arguments))
+
+# The one engine and Base of the app; migrations build their own sync engine from DATABASE_URL
+engine = build_engine()
+SessionLocal = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
 Base = declarative_base()
 
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db() -> AsyncIterator[AsyncSession]:
+    """
+    Request-scoped session.
+
+    It checks out a connection only when the first query runs, and gives it
+    back whenever a transaction ends, so a request that never queries never
+    takes one. Call `release_connection` before slow work that does not need
+    the database.
+    """
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
\ No newline at end of file
+
+async def release_connection(db: AsyncSession) -> None:
+    """
+    End the session's unit of work so its connection goes back to the pool.
+
+    Loaded objects stay attached and readable (commits do not expire them);
+    the next query checks out a connection again.
+    """
+    if db.in_transaction():
+        await db.commit()
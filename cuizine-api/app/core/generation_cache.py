@@ -0,0 +1,133 @@
+from upstash_redis.asyncio import Redis
+from app.core.config import settings
+from app.core.redis_client import redis
+from app.monitoring.metrics import metrics
+from collections import OrderedDict
+from pydantic import BaseModel
+from typing import Any, Dict, Optional, Union
+import hashlib
+import json
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Bump when the prompt or output contract changes so old entries stop matching
+CACHE_VERSION = "v2"
+
+cache_lookups = metrics.counter(
+    "generation_cache_lookups", "Generation cache lookups by tier and outcome"
+)
+
+def _fold(value: Any) -> Any:
+    if isinstance(value, str):
+        return " ".join(value.split()).casefold()
+    return value
+
+def cache_key(parameters: Dict[str, Any]) -> str:
+    """
+    Canonical hash of the inputs that shape the recipe prompt.
+
+    Strings are case-folded and whitespace-normalised, and list inputs are
+    sorted, so "Chicken, rice" and "rice, chicken" share one entry.
+    """
+    canonical = {
+        "recipe_type": _fold(parameters.get("recipe_type")),
+        "selected_ingredients": sorted({_fold(i) for i in parameters.get("selected_ingredients") or []}),
+        "meal_type": _fold(parameters.get("meal_type")) or None,
+        "cuisine": _fold(parameters.get("cuisine")) or None,
+        "dietary_restrictions": sorted({_fold(r) for r in parameters.get("dietary_restrictions") or []}),
+        "servings": int(parameters.get("servings") or 2),
+        "is_spicy": bool(parameters.get("is_spicy"))
+    }
+    digest = hashlib.sha256(
+        json.dumps(canonical, sort_keys=True, separators=(",", ":")).encode()
+    ).hexdigest()
+    return f"gen:{CACHE_VERSION}:{digest}"
+
+class GenerationCache:
+    """
+    Two-tier exact-match cache of generated recipes.
+
+    The first tier is an in-process LRU, the second is shared through Redis.
+    Each recipe_type has its own TTL; a TTL of 0 (e.g. "crazy") disables
+    caching for that type. Values are stored as JSON so every hit hands the
+    caller a fresh copy.
+    """
+
+    def __init__(self, client: Optional[Redis], max_size: int, ttls: Dict[str, int]):
+        self.client = client
+        self.max_size = max_size
+        self.ttls = ttls
+        self._local: "OrderedDict[str, tuple[float, str]]" = OrderedDict()
+
+    def ttl_for(self, parameters: Dict[str, Any]) -> int:
+        return self.ttls.get(_fold(parameters.get("recipe_type")), 0)
+
+    async def get(self, parameters: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        payload = await self.get_json(parameters)
+        return json.loads(payload) if payload is not None else None
+
+    async def get_json(self, parameters: Dict[str, Any]) -> Optional[str]:
+        """The cached recipe as its stored JSON text, for callers that validate it directly"""
+        recipe_type = _fold(parameters.get("recipe_type"))
+        if self.ttl_for(parameters) <= 0:
+            return None
+
+        key = cache_key(parameters)
+        entry = self._local.get(key)
+        if entry is not None:
+            expires_at, payload = entry
+            if time.time() < expires_at:
+                self._local.move_to_end(key)
+                cache_lookups.inc(tier="local", outcome="hit", recipe_type=recipe_type)
+                return payload
+            del self._local[key]
+
+        if self.client is not None:
+            try:
+                payload = await self.client.get(key)
+            except Exception as e:
+                logger.error(f"Generation cache read failed: {e}")
+                payload = None
+            if payload is not None:
+                # Promote to the local tier; Redis owns the remaining lifetime
+                self._remember(key, payload, self.ttl_for(parameters))
+                cache_lookups.inc(tier="redis", outcome="hit", recipe_type=recipe_type)
+                return payload
+
+        cache_lookups.inc(tier="all", outcome="miss", recipe_type=recipe_type)
+        return None
+
+    async def set(self, parameters: Dict[str, Any], recipe: Union[BaseModel, Dict[str, Any]]) -> None:
+        ttl = self.ttl_for(parameters)
+        if ttl <= 0:
+            return
+
+        key = cache_key(parameters)
+        if isinstance(recipe, BaseModel):
+            payload = recipe.model_dump_json()
+        else:
+            payload = json.dumps(recipe, default=str)
+        self._remember(key, payload, ttl)
+
+        if self.client is not None:
+            try:
+                await self.client.set(key, payload, ex=ttl)
+            except Exception as e:
+                logger.error(f"Generation cache write failed: {e}")
+
+    def _remember(self, key: str, payload: str, ttl: int) -> None:
+        self._local[key] = (time.time() + ttl, payload)
+        self._local.move_to_end(key)
+        while len(self._local) > self.max_size:
+            self._local.popitem(last=False)
+
+    def clear(self) -> None:
+        self._local.clear()
+
+generation_cache = GenerationCache(
+    redis if settings.GENERATION_CACHE_BACKEND == "redis" else None,
+    max_size=settings.GENERATION_CACHE_SIZE,
+    ttls=settings.GENERATION_CACHE_TTLS
+)
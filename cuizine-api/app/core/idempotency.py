@@ -0,0 +1,295 @@
+from upstash_redis.asyncio import Redis
+from app.core.config import settings
+from app.core.redis_client import redis
+from app.monitoring.metrics import metrics
+from dataclasses import asdict, dataclass, field
+from fastapi import HTTPException, Response, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+import asyncio
+import hashlib
+import json
+import logging
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_KEY_PREFIX = "idem:"
+MAX_KEY_LENGTH = 255
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+# Not replayed: hop-by-hop headers, and those Response derives from the body and media type
+UNSTORED_HEADERS = frozenset({
+    "connection", "keep-alive", "proxy-authenticate", "proxy-authorization", "te", "trailer",
+    "transfer-encoding", "upgrade", "content-length", "content-type"
+})
+
+idempotent_requests = metrics.counter(
+    "idempotent_requests", "Requests carrying an Idempotency-Key, by endpoint and outcome"
+)
+
+# Overwrite or drop a key only while it still holds our own in-flight marker
+COMPLETE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+  redis.call('SET', KEYS[1], ARGV[2], 'EX', tonumber(ARGV[3]))
+  return 1
+end
+return 0
+"""
+
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+  return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+@dataclass
+class IdempotencyRecord:
+    fingerprint: str
+    owner: str  # Random per claim, so only the claimant can complete or release it
+    status_code: Optional[int] = None  # None while the first request is still running
+    media_type: Optional[str] = None
+    body: Optional[str] = None
+    headers: List[Tuple[str, str]] = field(default_factory=list)  # Such as Location
+
+    @property
+    def done(self) -> bool:
+        return self.status_code is not None
+
+    def dumps(self) -> str:
+        return json.dumps(asdict(self), separators=(",", ":"))
+
+    @classmethod
+    def loads(cls, payload: str) -> "IdempotencyRecord":
+        return cls(**json.loads(payload))
+
+def request_fingerprint(payload: Any) -> str:
+    """Hash of a request body; a key reused with a different body is rejected"""
+    canonical = json.dumps(jsonable_encoder(payload), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+class RedisIdempotencyStore:
+    """Records as Redis strings; SET NX claims a key across every worker"""
+
+    def __init__(self, client: Redis):
+        self.client = client
+
+    async def claim(self, key: str, record: IdempotencyRecord, ttl: int) -> bool:
+        return bool(await self.client.set(IDEMPOTENCY_KEY_PREFIX + key, record.dumps(), nx=True, ex=ttl))
+
+    async def get(self, key: str) -> Optional[IdempotencyRecord]:
+        payload = await self.client.get(IDEMPOTENCY_KEY_PREFIX + key)
+        return IdempotencyRecord.loads(payload) if payload is not None else None
+
+    async def complete(self, key: str, claim: IdempotencyRecord, record: IdempotencyRecord, ttl: int) -> bool:
+        stored = await self.client.eval(
+            COMPLETE_SCRIPT,
+            keys=[IDEMPOTENCY_KEY_PREFIX + key],
+            args=[claim.dumps(), record.dumps(), ttl]
+        )
+        return bool(int(stored))
+
+    async def release(self, key: str, claim: IdempotencyRecord) -> None:
+        await self.client.eval(RELEASE_SCRIPT, keys=[IDEMPOTENCY_KEY_PREFIX + key], args=[claim.dumps()])
+
+class InMemoryIdempotencyStore:
+    """Process-local stand-in with the same semantics, for tests and local runs"""
+
+    def __init__(self):
+        self._records: Dict[str, Tuple[float, str]] = {}
+
+    def _get(self, key: str) -> Optional[str]:
+        entry = self._records.get(key)
+        if entry is None:
+            return None
+        expires_at, payload = entry
+        if time.time() >= expires_at:
+            del self._records[key]
+            return None
+        return payload
+
+    async def claim(self, key: str, record: IdempotencyRecord, ttl: int) -> bool:
+        if self._get(key) is not None:
+            return False
+        self._records[key] = (time.time() + ttl, record.dumps())
+        return True
+
+    async def get(self, key: str) -> Optional[IdempotencyRecord]:
+        payload = self._get(key)
+        return IdempotencyRecord.loads(payload) if payload is not None else None
+
+    async def complete(self, key: str, claim: IdempotencyRecord, record: IdempotencyRecord, ttl: int) -> bool:
+        if self._get(key) != claim.dumps():
+            return False
+        self._records[key] = (time.time() + ttl, record.dumps())
+        return True
+
+    async def release(self, key: str, claim: IdempotencyRecord) -> None:
+        if self._get(key) == claim.dumps():
+            del self._records[key]
+
+class Idempotency:
+    """
+    Runs a request at most once per Idempotency-Key and replays its response.
+
+    The first request with a key claims it in the store with an in-flight
+    marker that expires after `lock_ttl` seconds, then runs its handler in a
+    task of its own. A retry of the same key on the same worker awaits that
+    task; one on another worker polls the store until the response lands.
+    Either way it receives the original response instead of starting a new
+    generation or writing a second list. Retries after completion get the
+    stored response replayed for `ttl` seconds, marked with an
+    Idempotent-Replayed header.
+
+    The handler keeps running when its client goes away, since a retry is
+    expected to collect the result; it must not use request-scoped resources
+    such as the `get_db` session, which close with the request. Only 2xx responses are stored; errors
+    and exceptions release the key so a retry runs the request again. A key
+    reused with a different request body is rejected with 422.
+    """
+
+    def __init__(self, store, ttl: int, lock_ttl: int, poll_interval: float):
+        self.store = store
+        self.ttl = ttl
+        self.lock_ttl = lock_ttl
+        self.poll_interval = poll_interval
+        self._running: Dict[str, asyncio.Task] = {}
+
+    async def run(
+        self,
+        endpoint: str,
+        user_id: str,
+        key: str,
+        fingerprint: str,
+        handler: Callable[[], Awaitable[Any]],
+        status_code: int = 200
+    ) -> Response:
+        """Run `handler` once for this key; a non-Response result is sent as JSON with `status_code`"""
+        if not key or len(key) > MAX_KEY_LENGTH:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Idempotency-Key must be 1 to {MAX_KEY_LENGTH} characters"
+            )
+        # Keys are per user and endpoint, so clients cannot collide or read each other's responses
+        scoped = f"{endpoint}:{user_id}:{key}"
+        deadline = time.monotonic() + self.lock_ttl
+
+        while True:
+            task = self._running.get(scoped)
+            if task is not None:
+                idempotent_requests.inc(endpoint=endpoint, outcome="attached")
+                self._check(await self.store.get(scoped), fingerprint)
+                record, _ = await asyncio.shield(task)
+                return self._replay(record, replayed=True)
+
+            claim = IdempotencyRecord(fingerprint=fingerprint, owner=uuid.uuid4().hex)
+            if await self.store.claim(scoped, claim, self.lock_ttl):
+                idempotent_requests.inc(endpoint=endpoint, outcome="executed")
+                task = asyncio.create_task(self._execute(scoped, claim, handler, status_code))
+                self._running[scoped] = task
+                task.add_done_callback(lambda t: self._forget(scoped, t))
+                _, response = await asyncio.shield(task)
+                return response
+
+            record = await self.store.get(scoped)
+            if record is None:
+                continue  # Released or expired between our claim and the read; claim again
+            self._check(record, fingerprint)
+            if record.done:
+                idempotent_requests.inc(endpoint=endpoint, outcome="replayed")
+                return self._replay(record, replayed=True)
+
+            # Running on another worker: wait for its response or for the key to free up
+            if time.monotonic() >= deadline:
+                idempotent_requests.inc(endpoint=endpoint, outcome="conflict")
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail="A request with this Idempotency-Key is still in progress",
+                    headers={"Retry-After": str(max(1, round(self.poll_interval)))}
+                )
+            await asyncio.sleep(self.poll_interval)
+
+    async def _execute(
+        self,
+        key: str,
+        claim: IdempotencyRecord,
+        handler: Callable[[], Awaitable[Any]],
+        status_code: int
+    ) -> Tuple[IdempotencyRecord, Response]:
+        """The stored record, and the handler's own response for the first caller"""
+        try:
+            result = await handler()
+        except BaseException:
+            await self._release(key, claim)
+            raise
+
+        if not isinstance(result, Response):
+            result = JSONResponse(jsonable_encoder(result), status_code=status_code)
+        record = IdempotencyRecord(
+            fingerprint=claim.fingerprint,
+            owner=claim.owner,
+            status_code=result.status_code,
+            media_type=result.media_type,
+            body=result.body.decode(),
+            headers=[
+                (name, value) for name, value in result.headers.items()
+                if name.lower() not in UNSTORED_HEADERS
+            ]
+        )
+        if 200 <= record.status_code < 300:
+            try:
+                if not await self.store.complete(key, claim, record, self.ttl):
+                    logger.warning(f"Idempotency key {key} expired before its response was stored")
+            except Exception as e:
+                logger.error(f"Failed to store idempotent response for {key}: {e}")
+        else:
+            await self._release(key, claim)
+        return record, result
+
+    def _forget(self, key: str, task: asyncio.Task) -> None:
+        self._running.pop(key, None)
+        if not task.cancelled():
+            task.exception()  # Retrieved by whoever awaited it; don't warn if its client left
+
+    async def _release(self, key: str, claim: IdempotencyRecord) -> None:
+        try:
+            await self.store.release(key, claim)
+        except Exception as e:
+            # The marker expires after lock_ttl; until then retries wait or get 409
+            logger.error(f"Failed to release idempotency key {key}: {e}")
+
+    @staticmethod
+    def _check(record: Optional[IdempotencyRecord], fingerprint: str) -> None:
+        if record is not None and record.fingerprint != fingerprint:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="Idempotency-Key was already used with a different request"
+            )
+
+    @staticmethod
+    def _replay(record: IdempotencyRecord, replayed: bool) -> Response:
+        response = Response(
+            content=record.body,
+            status_code=record.status_code,
+            media_type=record.media_type
+        )
+        for name, value in record.headers:
+            response.headers.append(name, value)
+        if replayed:
+            response.headers[REPLAYED_HEADER] = "true"
+        return response
+
+def _create_store():
+    if settings.IDEMPOTENCY_BACKEND == "memory":
+        return InMemoryIdempotencyStore()
+    return RedisIdempotencyStore(redis)
+
+idempotency = Idempotency(
+    _create_store(),
+    ttl=settings.IDEMPOTENCY_TTL,
+    lock_ttl=settings.IDEMPOTENCY_LOCK_TTL,
+    poll_interval=settings.IDEMPOTENCY_POLL_INTERVAL
+)
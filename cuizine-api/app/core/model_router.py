@@ -0,0 +1,279 @@
+from app.core.config import settings
+from app.monitoring.metrics import metrics
+from collections import deque
+from dataclasses import dataclass
+from pydantic import BaseModel, ValidationError, model_validator
+from typing import Callable, Deque, Dict, Iterable, List, Optional, Tuple
+import json
+import logging
+import math
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+backend_calls = metrics.counter(
+    "model_backend_calls", "Completion calls per backend and outcome"
+)
+backend_failovers = metrics.counter(
+    "model_backend_failovers", "Calls routed past the preferred backend of their route"
+)
+breaker_transitions = metrics.counter(
+    "model_breaker_transitions", "Circuit breaker state changes per backend"
+)
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+class BackendConfig(BaseModel):
+    model: str
+    base_url: Optional[str] = None  # Any OpenAI-compatible endpoint; None uses the default client
+    api_key_env: Optional[str] = None  # Environment variable holding its key; default OPENAI_API_KEY
+    slo_p95: float  # Seconds; a rolling p95 above this trips the breaker
+    max_error_rate: float = 0.25
+
+class RoutingConfig(BaseModel):
+    """
+    Backends and, per tier and recipe_type, the order to try them in.
+
+    `routes` maps tier -> recipe_type -> backend names; "*" matches any
+    tier or type, and routes["*"]["*"] is required as the catch-all.
+    """
+    backends: Dict[str, BackendConfig]
+    routes: Dict[str, Dict[str, List[str]]]
+
+    @model_validator(mode="after")
+    def check_routes(self):
+        if not self.routes.get("*", {}).get("*"):
+            raise ValueError('routes["*"]["*"] is required')
+        for tier, by_type in self.routes.items():
+            for recipe_type, names in by_type.items():
+                unknown = [n for n in names if n not in self.backends]
+                if unknown or not names:
+                    raise ValueError(f"Route {tier}/{recipe_type} has no or unknown backends: {unknown}")
+        return self
+
+@dataclass(frozen=True)
+class Backend:
+    name: str
+    model: str
+    base_url: Optional[str] = None
+    api_key_env: Optional[str] = None
+
+class CircuitBreaker:
+    """
+    Health of one backend from a rolling window of its recent calls.
+
+    The breaker opens when, over the last `window` seconds and at least
+    `min_samples` calls, the error rate passes `max_error_rate` or the p95
+    latency passes `slo_p95`. An open backend is skipped for `cooldown`
+    seconds; it then lets a single probe call through (half-open), which
+    closes the breaker on success and re-opens it on failure.
+    """
+
+    def __init__(
+        self,
+        slo_p95: float,
+        max_error_rate: float,
+        window: float,
+        min_samples: int,
+        cooldown: float,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.slo_p95 = slo_p95
+        self.max_error_rate = max_error_rate
+        self.window = window
+        self.min_samples = min_samples
+        self.cooldown = cooldown
+        self.clock = clock
+        self.state = CLOSED
+        self._samples: Deque[Tuple[float, float, bool]] = deque()  # (at, latency, ok)
+        self._opened_at = 0.0
+        self._probing = False
+
+    def _trim(self, now: float) -> None:
+        while self._samples and self._samples[0][0] < now - self.window:
+            self._samples.popleft()
+
+    def p95(self) -> Optional[float]:
+        latencies = sorted(latency for _, latency, _ in self._samples)
+        if not latencies:
+            return None
+        return latencies[min(len(latencies) - 1, math.ceil(0.95 * len(latencies)) - 1)]
+
+    def error_rate(self) -> float:
+        if not self._samples:
+            return 0.0
+        return sum(1 for _, _, ok in self._samples if not ok) / len(self._samples)
+
+    def available(self) -> bool:
+        """Whether a call may be sent now; claims the probe when half-open"""
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN and self.clock() - self._opened_at >= self.cooldown:
+            self.state = HALF_OPEN
+            self._probing = False
+        if self.state == HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def record(self, latency: float, ok: bool) -> Optional[str]:
+        """Add one call's outcome; returns the new state if it changed"""
+        now = self.clock()
+        if self.state == HALF_OPEN:
+            self._probing = False
+            if ok and latency <= self.slo_p95:
+                self._samples.clear()
+                self.state = CLOSED
+            else:
+                self._open(now)
+            return self.state
+
+        self._samples.append((now, latency, ok))
+        self._trim(now)
+        if self.state == CLOSED and len(self._samples) >= self.min_samples:
+            if self.error_rate() > self.max_error_rate or self.p95() > self.slo_p95:
+                self._open(now)
+                return OPEN
+        return None
+
+    def abandon(self) -> None:
+        """A call was cancelled without an outcome; let another probe through"""
+        self._probing = False
+
+    def _open(self, now: float) -> None:
+        self.state = OPEN
+        self._opened_at = now
+
+class ModelRouter:
+    """
+    Picks the completion backend for a request by tier and recipe_type.
+
+    Each route is an ordered list of backends; a request goes to the first
+    one whose circuit breaker lets it through, skipping any it has already
+    failed on. When every backend of a route is unavailable the preferred
+    one is used anyway, so an outage degrades to errors rather than
+    refusing all traffic.
+
+    With `path`, the configuration is read from that JSON file and reloaded
+    when the file changes (checked at most every `reload_interval` seconds).
+    A file that fails to parse or validate is logged and the previous
+    configuration stays in effect. Breaker state survives reloads for
+    backends that keep their name.
+    """
+
+    def __init__(
+        self,
+        config: Dict,
+        path: Optional[str] = None,
+        reload_interval: float = 5.0,
+        window: float = 60.0,
+        min_samples: int = 10,
+        cooldown: float = 30.0,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.path = path
+        self.reload_interval = reload_interval
+        self.window = window
+        self.min_samples = min_samples
+        self.cooldown = cooldown
+        self.clock = clock
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self._mtime: Optional[float] = None
+        self._checked_at = clock()
+        self.load(RoutingConfig.model_validate(config))
+        if path:
+            self.reload()
+
+    def load(self, config: RoutingConfig) -> None:
+        self.config = config
+        breakers = {}
+        for name, backend in config.backends.items():
+            breaker = self.breakers.get(name) or CircuitBreaker(
+                backend.slo_p95, backend.max_error_rate,
+                self.window, self.min_samples, self.cooldown, self.clock
+            )
+            breaker.slo_p95 = backend.slo_p95
+            breaker.max_error_rate = backend.max_error_rate
+            breakers[name] = breaker
+        self.breakers = breakers
+
+    def reload(self) -> bool:
+        """Re-read the config file if it changed; True when a new config was loaded"""
+        self._checked_at = self.clock()
+        try:
+            mtime = os.stat(self.path).st_mtime
+            if mtime == self._mtime:
+                return False
+            with open(self.path) as f:
+                config = RoutingConfig.model_validate(json.load(f))
+        except (OSError, ValueError, ValidationError) as e:
+            logger.error(f"Keeping the current model routes; failed to load {self.path}: {e}")
+            return False
+        self._mtime = mtime
+        self.load(config)
+        logger.info(f"Loaded model routes from {self.path}")
+        return True
+
+    def _maybe_reload(self) -> None:
+        if self.path and self.clock() - self._checked_at >= self.reload_interval:
+            self.reload()
+
+    def route(self, tier: str, recipe_type: str) -> List[str]:
+        routes = self.config.routes
+        for t, r in ((tier, recipe_type), (tier, "*"), ("*", recipe_type), ("*", "*")):
+            names = routes.get(t, {}).get(r)
+            if names:
+                return names
+        return routes["*"]["*"]
+
+    def _backend(self, name: str) -> Backend:
+        config = self.config.backends[name]
+        return Backend(name, config.model, config.base_url, config.api_key_env)
+
+    def choose(self, tier: str, recipe_type: str, exclude: Iterable[str] = ()) -> Backend:
+        self._maybe_reload()
+        names = self.route(tier, recipe_type)
+        skipped = set(exclude)
+        for name in names:
+            if name not in skipped and self.breakers[name].available():
+                if name != names[0]:
+                    backend_failovers.inc(preferred=names[0], chosen=name)
+                return self._backend(name)
+        return self._backend(names[0])
+
+    def record(self, backend: Backend, latency: float, ok: bool) -> None:
+        backend_calls.inc(backend=backend.name, outcome="ok" if ok else "error")
+        breaker = self.breakers.get(backend.name)
+        if breaker is None:
+            return  # Removed by a reload while the call was in flight
+        changed = breaker.record(latency, ok)
+        if changed:
+            breaker_transitions.inc(backend=backend.name, state=changed)
+            if changed == OPEN:
+                logger.warning(
+                    f"Backend {backend.name} breaker opened: p95 {breaker.p95()}s, "
+                    f"error rate {breaker.error_rate():.0%}"
+                )
+
+    def record_abandoned(self, backend: Backend, elapsed: float) -> None:
+        """
+        A call cancelled before it answered (attempt timeout, losing hedge,
+        client gone) counts as a failure only once it had run past the SLO.
+        """
+        breaker = self.breakers.get(backend.name)
+        if breaker is None:
+            return
+        if elapsed > breaker.slo_p95:
+            self.record(backend, elapsed, ok=False)
+        else:
+            breaker.abandon()
+
+model_router = ModelRouter(
+    settings.MODEL_ROUTES,
+    path=settings.MODEL_ROUTES_FILE,
+    reload_interval=settings.MODEL_ROUTES_RELOAD_INTERVAL,
+    window=settings.MODEL_BREAKER_WINDOW,
+    min_samples=settings.MODEL_BREAKER_MIN_SAMPLES,
+    cooldown=settings.MODEL_BREAKER_COOLDOWN
+)
@@ -1,54 +1,488 @@
 from openai import AsyncOpenAI
+from app.core.admission import AdmissionRejected, PriorityAdmission
 from app.core.config import settings
-from typing import Dict, Any, List
+from app.core.generation_cache import cache_key, generation_cache
+from app.core.model_router import Backend, ModelRouter, model_router
+from app.core.retry_policy import TRANSIENT_ERRORS, RetryPolicy
+from app.core.singleflight import SingleFlight
+from app.schemas.recipe_output import RESPONSE_FORMAT, CompactRecipe, expand_field
+from app.schemas.recipes import GeneratedRecipe
+from app.monitoring.llm_ledger import llm_ledger
+from app.monitoring.metrics import metrics
+from app.utils.json_stream import IncrementalJSONParser, JSONStreamEvent
+from contextlib import aclosing, asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Dict, Any, AsyncIterator, List, Optional, Set, Tuple
+import asyncio
+import httpx
 import json
 import logging
-from tenacity import retry, stop_after_attempt, wait_exponential
+import os
+import time
 
 logger = logging.getLogger(__name__)
 
+completion_queue_depth = metrics.gauge(
+    "openai_completion_queue_depth", "Completions waiting for a concurrency slot"
+)
+completions_in_flight = metrics.gauge(
+    "openai_completions_in_flight", "Completions currently running"
+)
+completion_slot_wait = metrics.histogram(
+    "openai_completion_slot_wait_seconds", "Time spent waiting for a concurrency slot, by tier"
+)
+completion_latency = metrics.histogram(
+    "openai_completion_seconds", "Latency of successful completion requests"
+)
+prompt_tokens = metrics.histogram(
+    "openai_prompt_tokens", "Prompt tokens per completion, by output format",
+    buckets=(100, 200, 300, 400, 600, 800, 1000, 1500, 2000, 3000)
+)
+completion_tokens = metrics.histogram(
+    "openai_completion_tokens", "Completion tokens per completion, by output format",
+    buckets=(100, 200, 300, 400, 600, 800, 1000, 1500, 2000, 3000, 4000)
+)
+completions_shed = metrics.counter(
+    "openai_completions_shed", "Completions rejected because the queue wait was too long"
+)
+
+coalesced_generations = metrics.counter(
+    "generation_coalesced", "Generations that joined an identical in-flight request"
+)
+
+# Arrays whose elements are streamed one by one instead of as a whole field
+STREAMED_ARRAYS = ("ingredients", "instructions")
+COMPACT_STREAMED_ARRAYS = ("i", "s")
+
+SYSTEM_PROMPT = """You are a professional chef and recipe creator. 
+            Create detailed, accurate recipes that match the given requirements exactly. 
+            The recipe should be creative but practical, with precise measurements and clear instructions.
+            Always include preparation time, cooking time, difficulty level, and full nutritional information."""
+
+COMPACT_SYSTEM_PROMPT = (
+    "You are a professional chef. Write a practical recipe that meets the requirements exactly, "
+    "with precise amounts and clear steps. Keep text short; use null for anything not needed."
+)
+
+_client: Optional[AsyncOpenAI] = None
+_backend_clients: Dict[Tuple[str, Optional[str]], AsyncOpenAI] = {}
+_generation_flights = SingleFlight(on_coalesced=coalesced_generations.inc)
+_admission = PriorityAdmission(
+    capacity=settings.OPENAI_MAX_CONCURRENCY,
+    headstarts=settings.OPENAI_TIER_HEADSTART,
+    max_wait=settings.OPENAI_MAX_QUEUE_WAIT
+)
+default_retry_policy = RetryPolicy(
+    deadline=settings.OPENAI_DEADLINE,
+    attempt_timeout=settings.OPENAI_ATTEMPT_TIMEOUT,
+    max_attempts=settings.OPENAI_MAX_ATTEMPTS
+)
+
+def _new_client(api_key: str, base_url: Optional[str] = None) -> AsyncOpenAI:
+    return AsyncOpenAI(
+        api_key=api_key,
+        base_url=base_url,
+        max_retries=0,  # Retries are handled in OpenAIManager
+        http_client=httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=settings.OPENAI_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=settings.OPENAI_KEEPALIVE_EXPIRY
+            ),
+            timeout=httpx.Timeout(settings.OPENAI_TIMEOUT, connect=5.0)
+        )
+    )
+
+def get_openai_client() -> AsyncOpenAI:
+    """Process-wide OpenAI client sharing one keep-alive connection pool"""
+    global _client
+    if _client is None:
+        _client = _new_client(settings.OPENAI_API_KEY)
+    return _client
+
+def get_backend_client(backend: Backend) -> AsyncOpenAI:
+    """Process-wide client for a routed backend with its own base URL"""
+    key = (backend.base_url, backend.api_key_env)
+    if key not in _backend_clients:
+        api_key = os.environ[backend.api_key_env] if backend.api_key_env else settings.OPENAI_API_KEY
+        _backend_clients[key] = _new_client(api_key, backend.base_url)
+    return _backend_clients[key]
+
+async def close_openai_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
+    while _backend_clients:
+        _, client = _backend_clients.popitem()
+        await client.close()
+
+@asynccontextmanager
+async def completion_slot(tier: str = "free", shed: bool = True):
+    """
+    Cap in-flight completions per worker at OPENAI_MAX_CONCURRENCY.
+
+    Waiting completions are admitted by subscription tier and age; with
+    `shed`, AdmissionRejected is raised instead of queueing when the
+    estimated wait is past OPENAI_MAX_QUEUE_WAIT. Yields the seconds spent
+    waiting for the slot.
+    """
+    loop = asyncio.get_running_loop()
+    queued_at = loop.time()
+    completion_queue_depth.inc()
+    try:
+        await _admission.acquire(tier, shed=shed)
+    except AdmissionRejected:
+        completions_shed.inc(tier=tier)
+        raise
+    finally:
+        completion_queue_depth.dec()
+    admitted_at = loop.time()
+    completion_slot_wait.observe(admitted_at - queued_at, tier=tier)
+
+    completions_in_flight.inc()
+    try:
+        yield admitted_at - queued_at
+    finally:
+        completions_in_flight.dec()
+        _admission.release(held=loop.time() - admitted_at)
+
+def check_admission(tier: str) -> None:
+    """Fail fast with AdmissionRejected before committing to a generation"""
+    try:
+        _admission.check(tier)
+    except AdmissionRejected:
+        completions_shed.inc(tier=tier)
+        raise
+
+def hedge_delay() -> Optional[float]:
+    """
+    p95 completion latency, after which a hedged request is worth sending.
+
+    Hedging stays off until enough completions have been observed, and while
+    requests are queueing for a slot, when a second request would only add load.
+    """
+    if not settings.OPENAI_HEDGE_ENABLED:
+        return None
+    if completion_latency.count() < settings.OPENAI_HEDGE_MIN_SAMPLES:
+        return None
+    if _admission.waiting or _admission.in_use >= _admission.capacity:
+        return None
+    return completion_latency.percentile(0.95)
+
+def _slot_options(parameters: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "tier": parameters.get('subscription_tier') or "free",
+        # Background jobs wait their turn instead of being shed
+        "shed": not parameters.get('background', False)
+    }
+
+def record_usage(usage: Any, output_format: str) -> None:
+    """Token counts of one completion, when the API reported them"""
+    if usage is None:
+        return
+    prompt_tokens.observe(usage.prompt_tokens, format=output_format)
+    completion_tokens.observe(usage.completion_tokens, format=output_format)
+
+@dataclass
+class CallStats:
+    """What one generation call cost, filled in as its attempts run"""
+    cache: str = "miss"  # hit, miss, coalesced, bypass (fresh)
+    model: Optional[str] = None
+    attempts: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    queue_wait: float = 0.0
+    first_token: Optional[float] = None  # Seconds to the first streamed content
+    failed_backends: Set[str] = field(default_factory=set)  # Errored or timed out; skipped when routing a retry
+
+    def add_usage(self, usage: Any) -> None:
+        if usage is not None:
+            self.prompt_tokens += usage.prompt_tokens
+            self.completion_tokens += usage.completion_tokens
+
+def _ms(seconds: Optional[float]) -> Optional[int]:
+    return None if seconds is None else round(seconds * 1000)
+
+def _replay_events(recipe: Dict[str, Any]) -> List[JSONStreamEvent]:
+    """Events an incremental parse of an already complete recipe would yield"""
+    events = []
+    for key, value in recipe.items():
+        if key in STREAMED_ARRAYS and isinstance(value, list):
+            events.extend(JSONStreamEvent("item", key, item, i) for i, item in enumerate(value))
+        else:
+            events.append(JSONStreamEvent("field", key, value))
+    return events
+
 class OpenAIManager:
-    def __init__(self):
-        self.client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
+    def __init__(
+        self,
+        client: Optional[AsyncOpenAI] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        output_format: Optional[str] = None,
+        router: Optional[ModelRouter] = None
+    ):
+        self.client = client or get_openai_client()
+        self.retry_policy = retry_policy or default_retry_policy
+        self.output_format = output_format or settings.RECIPE_OUTPUT_FORMAT
+        self.router = router or model_router
+
+    @property
+    def compact(self) -> bool:
+        return self.output_format == "compact"
+
+    async def generate_recipe(self, parameters: Dict[str, Any]) -> GeneratedRecipe:
+        """
+        Generate a recipe, serving repeat parameter sets from the cache and
+        sharing one completion between identical concurrent requests.
+        Requests marked `fresh` always get their own completion. Every call
+        is recorded in the LLM call ledger.
+        """
+        stats = CallStats()
+        started = time.monotonic()
+        status = "error"
+        try:
+            recipe = await self._generate_recipe(parameters, stats)
+            status = "ok"
+            return recipe
+        except asyncio.CancelledError:
+            status = "cancelled"
+            raise
+        finally:
+            self._record_call(parameters, stats, started, status)
+
+    async def _generate_recipe(self, parameters: Dict[str, Any], stats: CallStats) -> GeneratedRecipe:
+        if parameters.get('fresh'):
+            stats.cache = "bypass"
+            return await self._generate(parameters, stats)
+
+        cached = await generation_cache.get_json(parameters)
+        if cached is not None:
+            stats.cache = "hit"
+            return GeneratedRecipe.model_validate_json(cached)
+
+        key = cache_key(parameters)
+        if _generation_flights.in_flight(key):
+            stats.cache = "coalesced"  # The completion is paid for by the first caller
+        return await _generation_flights.do(
+            key,
+            lambda: self._generate_and_cache(parameters, stats)
+        )
+
+    async def _generate_and_cache(self, parameters: Dict[str, Any], stats: CallStats) -> GeneratedRecipe:
+        recipe = await self._generate(parameters, stats)
+        await generation_cache.set(parameters, recipe)
+        return recipe
+
+    def _record_call(
+        self,
+        parameters: Dict[str, Any],
+        stats: CallStats,
+        started: float,
+        status: str,
+        streamed: bool = False
+    ) -> None:
+        llm_ledger.record(
+            user_id=parameters.get('user_id'),
+            subscription_tier=parameters.get('subscription_tier') or "free",
+            recipe_type=parameters.get('recipe_type') or "unknown",
+            model=stats.model,
+            output_format=self.output_format if stats.model else None,
+            cache=stats.cache,
+            status=status,
+            streamed=streamed,
+            prompt_tokens=stats.prompt_tokens,
+            completion_tokens=stats.completion_tokens,
+            retries=max(0, stats.attempts - 1),
+            queue_wait_ms=_ms(stats.queue_wait),
+            first_token_ms=_ms(stats.first_token),
+            latency_ms=_ms(time.monotonic() - started)
+        )
         
-    @retry(
-        stop=stop_after_attempt(3),
-        wait=wait_exponential(multiplier=1, min=4, max=10)
-    )
-    async def generate_recipe(self, parameters: Dict[str, Any]) -> Dict[str, Any]:
+    async def stream_recipe(self, parameters: Dict[str, Any]) -> AsyncIterator[JSONStreamEvent]:
+        """
+        Stream a recipe as parse events while the completion is generated.
+
+        Yields a field event per completed top-level value and an item event
+        per ingredient and instruction, then a "complete" event carrying the
+        validated document. Cache hits replay the same events. A stream the
+        consumer abandons is recorded in the ledger as cancelled.
+        """
+        stats = CallStats(cache="bypass" if parameters.get('fresh') else "miss")
+        started = time.monotonic()
+        status = "error"
+        try:
+            # Close the inner stream (and its slot) as soon as ours is closed
+            async with aclosing(self._stream_recipe(parameters, stats, started)) as events:
+                async for event in events:
+                    yield event
+            status = "ok"
+        except (asyncio.CancelledError, GeneratorExit):
+            status = "cancelled"
+            raise
+        finally:
+            self._record_call(parameters, stats, started, status, streamed=True)
+
+    async def _stream_recipe(
+        self,
+        parameters: Dict[str, Any],
+        stats: CallStats,
+        started: float
+    ) -> AsyncIterator[JSONStreamEvent]:
+        if not parameters.get('fresh'):
+            cached = await generation_cache.get_json(parameters)
+            if cached is not None:
+                stats.cache = "hit"
+                recipe = GeneratedRecipe.model_validate_json(cached)
+                for event in _replay_events(json.loads(cached)):
+                    yield event
+                yield JSONStreamEvent("complete", "recipe", recipe)
+                return
+
+        parser = IncrementalJSONParser(
+            stream_arrays=COMPACT_STREAMED_ARRAYS if self.compact else STREAMED_ARRAYS
+        )
+        backend = self._choose_backend(parameters, stats)
+        stats.attempts = 1
+        async with completion_slot(**_slot_options(parameters)) as waited:
+            stats.queue_wait = waited
+            async with self._backend_call(backend, stats):
+                stream = await self._client_for(backend).chat.completions.create(
+                    stream=True,
+                    # The final chunk carries token usage and no choices
+                    extra_body={"stream_options": {"include_usage": True}},
+                    **self._completion_kwargs(parameters, backend.model)
+                )
+                try:
+                    async for chunk in stream:
+                        usage = getattr(chunk, "usage", None)
+                        record_usage(usage, self.output_format)
+                        stats.add_usage(usage)
+                        if not chunk.choices:
+                            continue
+                        delta = chunk.choices[0].delta.content
+                        if delta:
+                            if stats.first_token is None:
+                                stats.first_token = time.monotonic() - started
+                            for event in parser.feed(delta):
+                                yield self._expand_event(event)
+                finally:
+                    await stream.close()
+
+        recipe = self._parse(parser.text)
+        if not parameters.get('fresh'):
+            await generation_cache.set(parameters, recipe)
+        yield JSONStreamEvent("complete", "recipe", recipe)
+
+    async def _generate(self, parameters: Dict[str, Any], stats: Optional[CallStats] = None) -> GeneratedRecipe:
         """Generate a recipe using OpenAI"""
+        stats = stats or CallStats()
+
+        @asynccontextmanager
+        async def admit():
+            async with completion_slot(**_slot_options(parameters)) as waited:
+                stats.queue_wait += waited
+                yield waited
+
         try:
-            system_prompt = """You are a professional chef and recipe creator. 
-            Create detailed, accurate recipes that match the given requirements exactly. 
-            The recipe should be creative but practical, with precise measurements and clear instructions.
-            Always include preparation time, cooking time, difficulty level, and full nutritional information."""
-            
-            user_prompt = self._build_recipe_prompt(parameters)
-            
-            response = await self.client.chat.completions.create(
-                model="gpt-4o-mini",  # Using latest model for best results
-                response_format={"type": "json_object"},
-                messages=[  
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                temperature=0.7 if parameters.get('recipe_type') == 'crazy' else 0.4,
-                max_tokens=4000
+            # Slots are taken by the policy, so queueing does not eat into an attempt's timeout
+            return await self.retry_policy.run(
+                lambda: self._complete(parameters, stats),
+                hedge_after=hedge_delay,
+                admit=admit
             )
             
-            recipe_data = json.loads(response.choices[0].message.content)
-            return self._validate_recipe_output(recipe_data)
-            
         except Exception as e:
             logger.error(f"Recipe generation failed: {str(e)}")
             raise
 
-    def _build_recipe_prompt(self, parameters: Dict[str, Any]) -> str:
-        """Build the recipe generation prompt based on parameters"""
-        prompt_parts = [
-            "Create a detailed recipe with the following requirements:\n",
-            f"Recipe Type: {parameters['recipe_type']}\n"
-        ]
+    async def _complete(self, parameters: Dict[str, Any], stats: CallStats) -> GeneratedRecipe:
+        """One completion attempt, parsed and validated in a single pass; the caller holds a slot"""
+        backend = self._choose_backend(parameters, stats)
+        stats.attempts += 1
+        started = time.monotonic()
+        async with self._backend_call(backend, stats):
+            response = await self._client_for(backend).chat.completions.create(
+                **self._completion_kwargs(parameters, backend.model)
+            )
+        completion_latency.observe(time.monotonic() - started)
+        record_usage(response.usage, self.output_format)
+        stats.add_usage(response.usage)
+        
+        return self._parse(response.choices[0].message.content)
+
+    def _choose_backend(self, parameters: Dict[str, Any], stats: CallStats) -> Backend:
+        backend = self.router.choose(
+            parameters.get('subscription_tier') or "free",
+            parameters.get('recipe_type') or "random",
+            exclude=stats.failed_backends
+        )
+        stats.model = backend.model
+        return backend
+
+    def _client_for(self, backend: Backend) -> AsyncOpenAI:
+        return self.client if backend.base_url is None else get_backend_client(backend)
+
+    @asynccontextmanager
+    async def _backend_call(self, backend: Backend, stats: CallStats):
+        """Report how a call to `backend` went to its circuit breaker"""
+        started = time.monotonic()
+        try:
+            yield
+        except TRANSIENT_ERRORS:
+            stats.failed_backends.add(backend.name)
+            self.router.record(backend, time.monotonic() - started, ok=False)
+            raise
+        except (asyncio.CancelledError, GeneratorExit):
+            # Cancelled by the attempt timeout (or a faster hedge): retry elsewhere, not here
+            stats.failed_backends.add(backend.name)
+            self.router.record_abandoned(backend, time.monotonic() - started)
+            raise
+        except Exception:
+            # A request the backend rejected (400, auth) says nothing about its health
+            self.router.record_abandoned(backend, 0.0)
+            raise
+        self.router.record(backend, time.monotonic() - started, ok=True)
+
+    def _parse(self, content: str) -> GeneratedRecipe:
+        """Validate a finished completion in the configured output format"""
+        if self.compact:
+            return CompactRecipe.model_validate_json(content).to_generated()
+        return GeneratedRecipe.model_validate_json(content)
+
+    def _expand_event(self, event: JSONStreamEvent) -> JSONStreamEvent:
+        """Streamed compact events under the long field names clients expect"""
+        if not self.compact:
+            return event
+        key, value = expand_field(event.key, event.value, event.index)
+        return JSONStreamEvent(event.kind, key, value, event.index)
+
+    def _completion_kwargs(self, parameters: Dict[str, Any], model: str) -> Dict[str, Any]:
+        """Chat completion arguments shared by the blocking and streaming paths"""
+        if self.compact:
+            # The schema is the output contract; the prompt only states requirements
+            system_prompt = COMPACT_SYSTEM_PROMPT
+            user_prompt = "".join(self._recipe_requirements(parameters))
+            response_format = RESPONSE_FORMAT
+        else:
+            system_prompt = SYSTEM_PROMPT
+            user_prompt = self._build_recipe_prompt(parameters)
+            response_format = {"type": "json_object"}
+
+        return {
+            "model": model,
+            "response_format": response_format,
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ],
+            "temperature": 0.7 if parameters.get('recipe_type') == 'crazy' else 0.4,
+            "max_tokens": settings.OPENAI_MAX_OUTPUT_TOKENS[self.output_format]
+        }
+
+    def _recipe_requirements(self, parameters: Dict[str, Any]) -> List[str]:
+        """One line per generation parameter"""
+        prompt_parts = [f"Recipe Type: {parameters['recipe_type']}\n"]
 
         if parameters.get('selected_ingredients'):
             prompt_parts.append(f"Must use these ingredients: {', '.join(parameters['selected_ingredients'])}\n")
@@ -64,7 +498,15 @@ class OpenAIManager:
             
         prompt_parts.extend([
             f"Servings: {parameters.get('servings', 2)}\n",
-            f"Spicy: {'Yes' if parameters.get('is_spicy') else 'No'}\n",
+            f"Spicy: {'Yes' if parameters.get('is_spicy') else 'No'}\n"
+        ])
+        return prompt_parts
+
+    def _build_recipe_prompt(self, parameters: Dict[str, Any]) -> str:
+        """Build the recipe generation prompt based on parameters"""
+        prompt_parts = [
+            "Create a detailed recipe with the following requirements:\n",
+            *self._recipe_requirements(parameters),
             "\nPlease provide the recipe in the following JSON format:",
             '''{
                 "title": "Recipe Name",
@@ -91,19 +533,6 @@ class OpenAIManager:
                 "storage_instructions": "string",
                 "leftover_ideas": ["string"]
             }'''
-        ])
+        ]
         
         return "\n".join(prompt_parts)
-
-    def _validate_recipe_output(self, recipe_data: Dict[str, Any]) -> Dict[str, Any]:
-        """Validate and clean the generated recipe data"""
-        required_fields = {
-            'title', 'description', 'prep_time', 'cook_time', 
-            'ingredients', 'instructions', 'nutritional_info'
-        }
-        
-        missing_fields = required_fields - set(recipe_data.keys())
-        if missing_fields:
-            raise ValueError(f"Missing required fields: {missing_fields}")
-
-        return recipe_data
\ No newline at end of file
@@ -1,39 +1,301 @@
-from upstash_redis import Redis
-from fastapi import Request
+from upstash_redis.asyncio import Redis
 from app.core.config import settings
-from typing import Optional
+from app.core.redis_client import redis
+from typing import Deque, Dict, NamedTuple, Optional
+from collections import deque
+import asyncio
+import logging
+import time
+import uuid
 
-redis = Redis(url=settings.UPSTASH_REDIS_REST_URL, token=settings.UPSTASH_REDIS_REST_TOKEN)
+logger = logging.getLogger(__name__)
 
-async def check_rate_limit(identifier: str, limit: int, window: int = 60) -> tuple[bool, Optional[int]]:
+# Sliding-window log: prune entries older than the window, count what is left
+# and record the hit only if it fits. Runs atomically on the server, so a
+# decision costs a single round-trip and concurrent requests cannot race.
+SLIDING_WINDOW_SCRIPT = """
+local key = KEYS[1]
+local now = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local limit = tonumber(ARGV[3])
+
+redis.call('ZREMRANGEBYSCORE', key, '-inf', now - window)
+local count = redis.call('ZCARD', key)
+local allowed = 0
+if count < limit then
+    redis.call('ZADD', key, now, ARGV[4])
+    count = count + 1
+    allowed = 1
+end
+
+local reset = now + window
+local oldest = redis.call('ZRANGE', key, 0, 0, 'WITHSCORES')
+if oldest[2] then
+    reset = tonumber(oldest[2]) + window
+end
+redis.call('PEXPIRE', key, window)
+
+return {allowed, limit - count, reset}
+"""
+
+# Global token buckets for the local-first limiter. Each worker reports how many
+# tokens it spent per key since its last sync; every bucket is refilled, charged
+# and returned in one batched call so the worker can adopt the global balance.
+TOKEN_BUCKET_SYNC_SCRIPT = """
+local now = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local balances = {}
+
+for i, key in ipairs(KEYS) do
+    local limit = tonumber(ARGV[1 + i * 2])
+    local used = tonumber(ARGV[2 + i * 2])
+    local state = redis.call('HMGET', key, 'tokens', 'ts')
+    local tokens = tonumber(state[1]) or limit
+    local ts = tonumber(state[2]) or now
+
+    tokens = math.min(limit, tokens + math.max(0, now - ts) * limit / window) - used
+    redis.call('HSET', key, 'tokens', tostring(tokens), 'ts', now)
+    redis.call('PEXPIRE', key, window)
+    balances[i] = tostring(tokens)
+end
+
+return balances
+"""
+
+# Consecutive failed syncs after which the local-first limiter stops waiting on Redis
+SYNC_FAILURES_BEFORE_LOCAL_ONLY = 3
+
+class RateLimitResult(NamedTuple):
+    allowed: bool
+    remaining: Optional[int]
+    reset: int  # Unix timestamp (seconds) when the oldest counted hit leaves the window
+
+class UpstashSlidingWindow:
+    """Sliding-window limiter backed by a Lua script on Upstash Redis"""
+
+    def __init__(self, client: Redis):
+        self.client = client
+
+    async def hit(self, key: str, limit: int, window_ms: int, now_ms: int) -> tuple[bool, int, int]:
+        allowed, remaining, reset_ms = await self.client.eval(
+            SLIDING_WINDOW_SCRIPT,
+            keys=[key],
+            args=[now_ms, window_ms, limit, f"{now_ms}-{uuid.uuid4().hex}"]
+        )
+        return bool(allowed), int(remaining), int(reset_ms)
+
+    async def reset(self, key: str) -> None:
+        await self.client.delete(key)
+
+class InMemorySlidingWindow:
+    """Process-local stand-in with the same semantics, for tests and local load testing"""
+
+    def __init__(self):
+        self._hits: Dict[str, Deque[int]] = {}
+
+    async def hit(self, key: str, limit: int, window_ms: int, now_ms: int) -> tuple[bool, int, int]:
+        # No awaits below, so the check-and-record is atomic on the event loop
+        hits = self._hits.setdefault(key, deque())
+        while hits and hits[0] <= now_ms - window_ms:
+            hits.popleft()
+
+        allowed = len(hits) < limit
+        if allowed:
+            hits.append(now_ms)
+
+        reset_ms = (hits[0] if hits else now_ms) + window_ms
+        remaining = limit - len(hits)
+        if not hits:
+            del self._hits[key]
+        return allowed, remaining, reset_ms
+
+    async def reset(self, key: str) -> None:
+        self._hits.pop(key, None)
+
+class _Bucket:
+    __slots__ = ("limit", "window_ms", "tokens", "updated_ms", "pending")
+
+    def __init__(self, limit: int, window_ms: int, now_ms: int):
+        self.limit = limit
+        self.window_ms = window_ms
+        self.tokens = float(limit)
+        self.updated_ms = now_ms
+        self.pending = 0  # Tokens spent locally that Redis has not seen yet
+
+    def refill(self, now_ms: int) -> None:
+        elapsed = max(0, now_ms - self.updated_ms)
+        self.tokens = min(self.limit, self.tokens + elapsed * self.limit / self.window_ms)
+        self.updated_ms = now_ms
+
+class LocalTokenBucketLimiter:
     """
-    Check rate limit for given identifier
-    Returns (is_allowed, remaining_requests)
+    Local-first limiter: admits requests from per-worker token buckets and
+    reconciles spent tokens with Redis in the background every sync interval.
+
+    Between syncs a worker only knows about its own traffic, so it may admit at
+    most `overshoot * limit` (minimum 1) unconfirmed requests per key. Worst-case
+    overshoot across the fleet is therefore workers * that allowance per interval.
+
+    After SYNC_FAILURES_BEFORE_LOCAL_ONLY failed syncs in a row the worker
+    fails open like the Upstash limiter: it drops its unsynced counts and
+    enforces each limit from its local buckets alone until a sync succeeds.
     """
+
+    def __init__(self, client: Redis, sync_interval_ms: int, overshoot: float):
+        self.client = client
+        self.sync_interval = sync_interval_ms / 1000
+        self.overshoot = overshoot
+        self._buckets: Dict[str, _Bucket] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._sync_failures = 0
+        self.local_only = False  # Redis unreachable: no allowance for unsynced requests
+
+    async def hit(self, key: str, limit: int, window_ms: int, now_ms: int) -> tuple[bool, int, int]:
+        bucket = self._buckets.get(key)
+        if bucket is None or bucket.limit != limit:
+            bucket = self._buckets[key] = _Bucket(limit, window_ms, now_ms)
+        bucket.refill(now_ms)
+
+        allowance = max(1, int(limit * self.overshoot))
+        allowed = bucket.tokens >= 1 and (self.local_only or bucket.pending < allowance)
+        if allowed:
+            bucket.tokens -= 1
+            bucket.pending += 1
+
+        refill_ms = max(0.0, limit - bucket.tokens) * window_ms / limit
+        return allowed, max(0, int(bucket.tokens)), now_ms + int(refill_ms)
+
+    async def sync(self, now_ms: Optional[int] = None) -> None:
+        """Push spent tokens to Redis and adopt the global balances"""
+        try:
+            await self._sync(now_ms)
+        except Exception:
+            self._sync_failures += 1
+            if self._sync_failures >= SYNC_FAILURES_BEFORE_LOCAL_ONLY:
+                if not self.local_only:
+                    logger.warning("Rate limits unsynced with Redis; enforcing them per worker")
+                self.local_only = True
+                # Redis refills its buckets meanwhile; replaying the outage's traffic would only block users
+                for bucket in self._buckets.values():
+                    bucket.pending = 0
+            raise
+        if self.local_only:
+            logger.info("Rate limits synced with Redis again")
+        self._sync_failures = 0
+        self.local_only = False
+
+    async def _sync(self, now_ms: Optional[int] = None) -> None:
+        now_ms = now_ms if now_ms is not None else int(time.time() * 1000)
+
+        # Forget buckets that are idle and full again; Redis holds nothing we need
+        for key, bucket in list(self._buckets.items()):
+            if not bucket.pending and now_ms - bucket.updated_ms > bucket.window_ms:
+                del self._buckets[key]
+        if not self._buckets:
+            return
+
+        # One call per window length keeps ARGV[2] shared by every key in the batch
+        batches: Dict[int, Dict[str, _Bucket]] = {}
+        for key, bucket in self._buckets.items():
+            batches.setdefault(bucket.window_ms, {})[key] = bucket
+
+        for window_ms, buckets in batches.items():
+            sent = {key: bucket.pending for key, bucket in buckets.items()}
+            args = [now_ms, window_ms]
+            for key, bucket in buckets.items():
+                args.extend([bucket.limit, sent[key]])
+
+            balances = await self.client.eval(
+                TOKEN_BUCKET_SYNC_SCRIPT,
+                keys=list(buckets),
+                args=args
+            )
+
+            for (key, bucket), balance in zip(buckets.items(), balances):
+                # Anything admitted while the call was in flight is still unsynced
+                bucket.pending -= sent[key]
+                caught_up_ms = max(0, bucket.updated_ms - now_ms)
+                balance = float(balance) + caught_up_ms * bucket.limit / bucket.window_ms
+                bucket.tokens = min(bucket.limit, balance) - bucket.pending
+
+    async def reset(self, key: str) -> None:
+        self._buckets.pop(key, None)
+        await self.client.delete(key)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.sync_interval)
+            try:
+                await self.sync()
+            except Exception as e:
+                # Unsynced counts stay pending and go out with the next batch
+                logger.error(f"Rate limit reconciliation failed: {e}")
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.sync()
+        except Exception as e:
+            logger.error(f"Final rate limit reconciliation failed: {e}")
+
+def _create_backend():
+    if settings.RATE_LIMIT_BACKEND == "memory":
+        return InMemorySlidingWindow()
+    if settings.RATE_LIMIT_BACKEND == "local":
+        return LocalTokenBucketLimiter(
+            redis,
+            sync_interval_ms=settings.RATE_LIMIT_SYNC_INTERVAL_MS,
+            overshoot=settings.RATE_LIMIT_OVERSHOOT
+        )
+    return UpstashSlidingWindow(redis)
+
+rate_limiter = _create_backend()
+
+def _key(identifier: str) -> str:
+    if isinstance(rate_limiter, LocalTokenBucketLimiter):
+        return f"rate:tb:{identifier}"
+    return f"rate:sw:{identifier}"
+
+def start_rate_limiter() -> None:
+    """Start background reconciliation when running the local-first limiter"""
+    if isinstance(rate_limiter, LocalTokenBucketLimiter):
+        rate_limiter.start()
+
+async def stop_rate_limiter() -> None:
+    """Flush unsynced counts before the worker exits"""
+    if isinstance(rate_limiter, LocalTokenBucketLimiter):
+        await rate_limiter.stop()
+
+async def check_rate_limit(identifier: str, limit: int, window: int = 60) -> RateLimitResult:
+    """
+    Check and record a request against the sliding window for identifier.
+    Returns (allowed, remaining_requests, reset_timestamp)
+    """
+    now_ms = int(time.time() * 1000)
     try:
-        key = f"rate:{identifier}"
-        # Get current count
-        current = await redis.get(key)
-        current = int(current) if current else 0
-        
-        if current >= limit:
-            return False, 0
-            
-        # Increment and set expiry
-        await redis.incr(key)
-        await redis.expire(key, window)
-        
-        remaining = limit - (current + 1)
-        return True, remaining
-        
+        allowed, remaining, reset_ms = await rate_limiter.hit(
+            _key(identifier), limit, window * 1000, now_ms
+        )
+        return RateLimitResult(allowed, max(0, remaining), -(-reset_ms // 1000))
+
     except Exception as e:
-        print(f"Rate limiting error: {e}")
+        logger.error(f"Rate limiting error: {e}")
         # If rate limiting fails, allow the request
-        return True, None
+        return RateLimitResult(True, None, (now_ms // 1000) + window)
 
 async def reset_rate_limit(identifier: str):
     """Reset rate limit counter for testing"""
     try:
-        await redis.del_(f"rate:{identifier}")
+        await rate_limiter.reset(_key(identifier))
     except Exception as e:
-        print(f"Error resetting rate limit: {e}")
\ No newline at end of file
+        logger.error(f"Error resetting rate limit: {e}")
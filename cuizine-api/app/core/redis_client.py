@@ -0,0 +1,5 @@
+from upstash_redis.asyncio import Redis
+from app.core.config import settings
+
+# Shared async Upstash client; main.py keeps its HTTP session open for the app lifespan
+redis = Redis(url=settings.UPSTASH_REDIS_REST_URL, token=settings.UPSTASH_REDIS_REST_TOKEN)
@@ -0,0 +1,193 @@
+from app.core.admission import AdmissionRejected
+from app.monitoring.metrics import metrics
+from contextlib import AsyncExitStack
+from typing import Any, AsyncContextManager, Awaitable, Callable, Optional
+import asyncio
+import json
+import logging
+import openai
+import random
+import time
+
+logger = logging.getLogger(__name__)
+
+retry_attempts = metrics.counter(
+    "openai_retry_attempts", "Completion retries by reason"
+)
+hedged_requests = metrics.counter(
+    "openai_hedged_requests", "Hedged completions by which request won"
+)
+
+class RetryBudgetExceeded(Exception):
+    """The overall deadline ran out before a completion succeeded"""
+
+# Errors worth retrying after a pause: the request itself was fine
+TRANSIENT_ERRORS = (
+    asyncio.TimeoutError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.RateLimitError,
+    openai.InternalServerError,
+)
+
+# The model answered, but not with a usable recipe; a fresh sample usually is
+BAD_OUTPUT_ERRORS = (
+    json.JSONDecodeError,
+    ValueError,
+)
+
+def retry_after_hint(error: BaseException) -> Optional[float]:
+    """Seconds the server asked us to wait, from Retry-After / retry-after-ms"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except ValueError:
+        return None
+    return None
+
+class RetryPolicy:
+    """
+    Retries a completion within one overall deadline.
+
+    Transient failures (timeouts, connection errors, 429 and 5xx) back off
+    with full jitter, or for as long as the server's Retry-After asks when it
+    sends one. Bad output (unparseable or incomplete JSON) is re-sampled right
+    away, at most `max_output_retries` times. Anything else, such as a 400 or
+    a shed admission, fails immediately. No attempt may run past the deadline
+    and no retry starts if its wait would.
+
+    With an `admit` context, each attempt first waits for admission (a
+    completion slot) and the attempt timeout and hedge delay only start once
+    it holds one. Time spent queueing still counts against the deadline, and
+    an attempt still queued when the deadline passes gives up instead of
+    being retried.
+
+    With a `hedge_after` delay, a second identical request is started when the
+    first has not answered by then; whichever succeeds first wins and the
+    other is cancelled.
+    """
+
+    def __init__(
+        self,
+        deadline: float,
+        attempt_timeout: float,
+        max_attempts: int = 3,
+        max_output_retries: int = 1,
+        base_delay: float = 0.5,
+        max_delay: float = 8.0
+    ):
+        self.deadline = deadline
+        self.attempt_timeout = attempt_timeout
+        self.max_attempts = max_attempts
+        self.max_output_retries = max_output_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def backoff(self, retry: int, error: BaseException) -> float:
+        hint = retry_after_hint(error)
+        if hint is not None:
+            return hint
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** retry))
+
+    async def run(
+        self,
+        attempt: Callable[[], Awaitable[Any]],
+        hedge_after: Optional[Callable[[], Optional[float]]] = None,
+        admit: Optional[Callable[[], AsyncContextManager[Any]]] = None
+    ) -> Any:
+        give_up_at = time.monotonic() + self.deadline
+        output_retries = 0
+        retries = 0
+
+        while True:
+            try:
+                async with AsyncExitStack() as admission:
+                    if admit is not None:
+                        await self._admit(admission, admit, give_up_at)
+                    remaining = give_up_at - time.monotonic()
+                    if remaining <= 0:
+                        raise RetryBudgetExceeded(f"No completion within {self.deadline}s")
+
+                    delay = hedge_after() if hedge_after else None
+                    return await asyncio.wait_for(
+                        self._attempt(attempt, delay, admit),
+                        timeout=min(self.attempt_timeout, remaining)
+                    )
+            except AdmissionRejected:
+                raise
+            except TRANSIENT_ERRORS as e:
+                retries += 1
+                if retries >= self.max_attempts:
+                    raise
+                wait = self.backoff(retries - 1, e)
+                if time.monotonic() + wait >= give_up_at:
+                    raise
+                retry_attempts.inc(reason="transient")
+                logger.warning(f"Transient completion failure, retrying in {wait:.2f}s: {e!r}")
+                await asyncio.sleep(wait)
+            except BAD_OUTPUT_ERRORS as e:
+                output_retries += 1
+                if output_retries > self.max_output_retries:
+                    raise
+                retry_attempts.inc(reason="bad_output")
+                logger.warning(f"Unusable completion, sampling again: {e}")
+
+    async def _admit(
+        self,
+        admission: AsyncExitStack,
+        admit: Callable[[], AsyncContextManager[Any]],
+        give_up_at: float
+    ) -> None:
+        """Wait for admission, but no longer than the deadline leaves"""
+        try:
+            await asyncio.wait_for(
+                admission.enter_async_context(admit()),
+                timeout=max(0.0, give_up_at - time.monotonic())
+            )
+        except asyncio.TimeoutError:
+            raise RetryBudgetExceeded(f"Still queued for a completion after {self.deadline}s") from None
+
+    async def _attempt(
+        self,
+        attempt: Callable[[], Awaitable[Any]],
+        hedge_after: Optional[float],
+        admit: Optional[Callable[[], AsyncContextManager[Any]]] = None
+    ) -> Any:
+        if hedge_after is None:
+            return await attempt()
+
+        async def hedge() -> Any:
+            # Hedges are only sent while slots are free, so this admission does not queue
+            if admit is None:
+                return await attempt()
+            async with admit():
+                return await attempt()
+
+        tasks = [asyncio.create_task(attempt())]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=hedge_after)
+            if done:
+                return tasks[0].result()
+
+            tasks.append(asyncio.create_task(hedge()))
+            pending = set(tasks)
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        hedged_requests.inc(winner="hedge" if task is tasks[1] else "primary")
+                        return task.result()
+                    error = task.exception()
+            hedged_requests.inc(winner="none")
+            raise error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
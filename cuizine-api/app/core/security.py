@@ -0,0 +1,141 @@
+from jose import jwt, JWTError
+from app.core.config import settings
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+import asyncio
+import hashlib
+import httpx
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+class TokenVerificationError(Exception):
+    """Raised when a bearer token cannot be verified"""
+
+class JWKSCache:
+    """
+    In-process cache of Clerk's signing keys.
+
+    Keys are refreshed when the cache is older than `ttl` or a token arrives
+    with a `kid` we have not seen (key rotation). Concurrent refreshes are
+    coalesced behind a lock, and unknown-kid refreshes are throttled so a
+    flood of forged tokens cannot turn into a flood of JWKS fetches.
+    """
+
+    def __init__(self, url: str, ttl: int = 3600, min_refresh_interval: float = 30):
+        self.url = url
+        self.ttl = ttl
+        self.min_refresh_interval = min_refresh_interval
+        self._keys: Dict[str, Dict[str, Any]] = {}
+        self._fetched_at = 0.0
+        self._lock = asyncio.Lock()
+        self._client: Optional[httpx.AsyncClient] = None
+
+    async def get_key(self, kid: str) -> Dict[str, Any]:
+        if kid in self._keys and time.monotonic() - self._fetched_at < self.ttl:
+            return self._keys[kid]
+
+        async with self._lock:
+            # Another request may have refreshed while we waited for the lock
+            age = time.monotonic() - self._fetched_at
+            if kid in self._keys and age < self.ttl:
+                return self._keys[kid]
+            if kid not in self._keys and age < self.min_refresh_interval and self._keys:
+                raise TokenVerificationError("Unknown signing key")
+
+            await self._refresh()
+
+        if kid not in self._keys:
+            raise TokenVerificationError("Unknown signing key")
+        return self._keys[kid]
+
+    async def _refresh(self) -> None:
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=5.0)
+        response = await self._client.get(self.url)
+        response.raise_for_status()
+        self._keys = {key["kid"]: key for key in response.json().get("keys", []) if "kid" in key}
+        self._fetched_at = time.monotonic()
+        logger.info(f"Refreshed JWKS ({len(self._keys)} keys)")
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+class VerifiedClaimsCache:
+    """Bounded LRU of verified token claims keyed by token hash"""
+
+    def __init__(self, max_size: int = 10000, ttl: int = 60):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple[float, Dict[str, Any]]]" = OrderedDict()
+
+    @staticmethod
+    def _key(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        key = self._key(token)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, claims = entry
+        if time.time() >= expires_at:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return claims
+
+    def set(self, token: str, claims: Dict[str, Any]) -> None:
+        # Never outlive the token itself
+        expires_at = time.time() + self.ttl
+        if claims.get("exp"):
+            expires_at = min(expires_at, float(claims["exp"]))
+
+        key = self._key(token)
+        self._entries[key] = (expires_at, claims)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+jwks_cache = JWKSCache(settings.CLERK_JWKS_URL, ttl=settings.CLERK_JWKS_CACHE_TTL)
+claims_cache = VerifiedClaimsCache(
+    max_size=settings.AUTH_CLAIMS_CACHE_SIZE,
+    ttl=settings.AUTH_CLAIMS_CACHE_TTL
+)
+
+async def verify_token(token: str) -> Dict[str, Any]:
+    """Verify a Clerk session token and return its claims"""
+    claims = claims_cache.get(token)
+    if claims is not None:
+        return claims
+
+    try:
+        header = jwt.get_unverified_header(token)
+    except JWTError as e:
+        raise TokenVerificationError(f"Malformed token: {e}")
+
+    kid = header.get("kid")
+    if not kid:
+        raise TokenVerificationError("Token has no key id")
+
+    key = await jwks_cache.get_key(kid)
+    try:
+        claims = jwt.decode(
+            token,
+            key,
+            algorithms=["RS256"],
+            audience=settings.CLERK_AUDIENCE,
+            issuer=settings.CLERK_ISSUER,
+            options={"verify_aud": bool(settings.CLERK_AUDIENCE)}
+        )
+    except JWTError as e:
+        raise TokenVerificationError(str(e))
+
+    claims_cache.set(token, claims)
+    return claims
@@ -0,0 +1,53 @@
+from typing import Any, Awaitable, Callable, Dict, Optional
+import asyncio
+import copy
+
+class _Flight:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+class SingleFlight:
+    """
+    Coalesce identical concurrent calls into one in-flight task.
+
+    The first caller for a key starts the work; callers arriving while it runs
+    await the same task. Every caller receives its own deep copy of the
+    result, so no one can mutate what another caller sees. The key is
+    released as soon as the task finishes, so errors are never cached. A
+    cancelled caller only detaches itself; the shared task is cancelled once
+    no caller is left waiting for it.
+    """
+
+    def __init__(self, on_coalesced: Optional[Callable[[], None]] = None):
+        self._flights: Dict[str, _Flight] = {}
+        self._on_coalesced = on_coalesced
+
+    def in_flight(self, key: str) -> bool:
+        return key in self._flights
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight(asyncio.create_task(fn()))
+            self._flights[key] = flight
+            flight.task.add_done_callback(lambda _: self._release(key, flight))
+        elif self._on_coalesced:
+            self._on_coalesced()
+
+        flight.waiters += 1
+        try:
+            result = await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                flight.task.cancel()
+                self._release(key, flight)
+
+        return copy.deepcopy(result)
+
+    def _release(self, key: str, flight: _Flight) -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
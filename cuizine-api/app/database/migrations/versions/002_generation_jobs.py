@@ -0,0 +1,43 @@
+"""generation jobs
+
+Revision ID: 002
+Revises: 001
+Create Date: 2026-10-18 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision = '002'
+down_revision = '001'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    op.create_table(
+        'generation_jobs',
+        sa.Column('id', sa.String(), nullable=False),
+        sa.Column('user_id', sa.String(), nullable=False),
+        sa.Column('status', sa.String(), nullable=False, server_default='queued'),
+        sa.Column('request', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+        sa.Column('credits_reserved', sa.Integer(), nullable=False, server_default='1'),
+        sa.Column('recipe_id', sa.String(), nullable=True),
+        sa.Column('error', sa.String(), nullable=True),
+        sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('worker_id', sa.String(), nullable=True),
+        sa.Column('locked_until', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()')),
+        sa.Column('started_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('finished_at', sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+
+    # Workers claim the oldest queued job, or a running one whose lease expired
+    op.create_index('idx_generation_jobs_claim', 'generation_jobs', ['status', 'created_at'])
+    op.create_index('idx_generation_jobs_user', 'generation_jobs', ['user_id'])
+
+def downgrade() -> None:
+    op.drop_index('idx_generation_jobs_user')
+    op.drop_index('idx_generation_jobs_claim')
+    op.drop_table('generation_jobs')
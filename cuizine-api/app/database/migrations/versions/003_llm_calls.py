@@ -0,0 +1,45 @@
+"""llm call ledger
+
+Revision ID: 003
+Revises: 002
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '003'
+down_revision = '002'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    op.create_table(
+        'llm_calls',
+        sa.Column('id', sa.String(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=False, server_default=sa.text('now()')),
+        sa.Column('user_id', sa.String(), nullable=True),
+        sa.Column('subscription_tier', sa.String(), nullable=False),
+        sa.Column('recipe_type', sa.String(), nullable=False),
+        sa.Column('model', sa.String(), nullable=True),
+        sa.Column('output_format', sa.String(), nullable=True),
+        sa.Column('cache', sa.String(), nullable=False),
+        sa.Column('status', sa.String(), nullable=False),
+        sa.Column('streamed', sa.Boolean(), nullable=False, server_default=sa.false()),
+        sa.Column('prompt_tokens', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('completion_tokens', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('retries', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('queue_wait_ms', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('first_token_ms', sa.Integer(), nullable=True),
+        sa.Column('latency_ms', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+
+    # Aggregations scan a time window, overall or for one user
+    op.create_index('idx_llm_calls_created', 'llm_calls', ['created_at'])
+    op.create_index('idx_llm_calls_user_created', 'llm_calls', ['user_id', 'created_at'])
+
+def downgrade() -> None:
+    op.drop_index('idx_llm_calls_user_created')
+    op.drop_index('idx_llm_calls_created')
+    op.drop_table('llm_calls')
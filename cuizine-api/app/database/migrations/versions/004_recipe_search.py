@@ -0,0 +1,62 @@
+"""recipe full-text search
+
+Revision ID: 004
+Revises: 003
+Create Date: 2026-10-18 15:00:00.000000
+
+Adding the stored generated column rewrites `recipes` and computes the
+vector for every existing row in the same statement; that is the backfill.
+It holds an ACCESS EXCLUSIVE lock for the rewrite; benchmarks/search_recipes.py
+reports how long that takes on a seeded table. The GIN index is then built
+concurrently so reads and writes resume meanwhile.
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision = '004'
+down_revision = '003'
+branch_labels = None
+depends_on = None
+
+# Frozen copy of RECIPE_SEARCH_FUNCTION in app.database.models as of this revision
+RECIPE_SEARCH_FUNCTION = """
+CREATE OR REPLACE FUNCTION recipe_search_vector(
+    title text, description text, ingredients jsonb, cuisine_type text[], meal_type text
+) RETURNS tsvector LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+    SELECT setweight(to_tsvector('english', coalesce(title, '')), 'A')
+        || setweight(jsonb_to_tsvector(
+            'english', coalesce(jsonb_path_query_array(ingredients, '$[*].item'), '[]'), '["string"]'
+        ), 'B')
+        || setweight(to_tsvector(
+            'english', coalesce(array_to_string(cuisine_type, ' '), '') || ' ' || coalesce(meal_type, '')
+        ), 'C')
+        || setweight(to_tsvector('english', coalesce(description, '')), 'D')
+$$
+"""
+
+def upgrade() -> None:
+    op.execute(RECIPE_SEARCH_FUNCTION)
+    op.add_column(
+        'recipes',
+        sa.Column(
+            'search_vector',
+            postgresql.TSVECTOR(),
+            sa.Computed(
+                'recipe_search_vector(title, description, ingredients, cuisine_type, meal_type)',
+                persisted=True
+            )
+        )
+    )
+
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'idx_recipes_search', 'recipes', ['search_vector'],
+            postgresql_using='gin', postgresql_concurrently=True
+        )
+    op.execute('ANALYZE recipes')
+
+def downgrade() -> None:
+    op.drop_index('idx_recipes_search')
+    op.drop_column('recipes', 'search_vector')
+    op.execute('DROP FUNCTION IF EXISTS recipe_search_vector(text, text, jsonb, text[], text)')
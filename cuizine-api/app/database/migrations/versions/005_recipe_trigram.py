@@ -0,0 +1,58 @@
+"""recipe trigram indexes
+
+Revision ID: 005
+Revises: 004
+Create Date: 2026-10-18 17:00:00.000000
+
+Needs permission to CREATE EXTENSION pg_trgm (or the extension installed
+beforehand). As in 004, adding the generated ingredient_names column
+rewrites `recipes` and fills it for every row; the trigram indexes are
+then built concurrently.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '005'
+down_revision = '004'
+branch_labels = None
+depends_on = None
+
+# Frozen copy of RECIPE_INGREDIENT_NAMES_FUNCTION in app.database.models as of this revision
+RECIPE_INGREDIENT_NAMES_FUNCTION = """
+CREATE OR REPLACE FUNCTION recipe_ingredient_names(ingredients jsonb)
+RETURNS text LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+    SELECT string_agg(item, ', ')
+    FROM jsonb_array_elements_text(coalesce(jsonb_path_query_array(ingredients, '$[*].item'), '[]')) AS item
+$$
+"""
+
+def upgrade() -> None:
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.execute(RECIPE_INGREDIENT_NAMES_FUNCTION)
+    op.add_column(
+        'recipes',
+        sa.Column(
+            'ingredient_names',
+            sa.Text(),
+            sa.Computed('recipe_ingredient_names(ingredients)', persisted=True)
+        )
+    )
+
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'idx_recipes_title_trgm', 'recipes', ['title'],
+            postgresql_using='gin', postgresql_ops={'title': 'gin_trgm_ops'},
+            postgresql_concurrently=True
+        )
+        op.create_index(
+            'idx_recipes_ingredient_names_trgm', 'recipes', ['ingredient_names'],
+            postgresql_using='gin', postgresql_ops={'ingredient_names': 'gin_trgm_ops'},
+            postgresql_concurrently=True
+        )
+    op.execute('ANALYZE recipes')
+
+def downgrade() -> None:
+    op.drop_index('idx_recipes_ingredient_names_trgm')
+    op.drop_index('idx_recipes_title_trgm')
+    op.drop_column('recipes', 'ingredient_names')
+    op.execute('DROP FUNCTION IF EXISTS recipe_ingredient_names(jsonb)')
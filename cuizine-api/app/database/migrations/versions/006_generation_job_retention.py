@@ -0,0 +1,34 @@
+"""generation job retention
+
+Revision ID: 006
+Revises: 005
+Create Date: 2026-10-18 19:00:00.000000
+
+Finished jobs are now deleted after GENERATION_JOB_RETENTION_DAYS, and the
+claim index covers only queued and running jobs, so claims no longer walk
+past finished rows. Both indexes are built and dropped concurrently.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '006'
+down_revision = '005'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'idx_generation_jobs_runnable', 'generation_jobs', ['created_at'],
+            postgresql_where=sa.text("status IN ('queued', 'running')"),
+            postgresql_concurrently=True
+        )
+        op.drop_index('idx_generation_jobs_claim', postgresql_concurrently=True)
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'idx_generation_jobs_claim', 'generation_jobs', ['status', 'created_at'],
+            postgresql_concurrently=True
+        )
+        op.drop_index('idx_generation_jobs_runnable', postgresql_concurrently=True)
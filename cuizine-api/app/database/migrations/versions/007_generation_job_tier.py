@@ -0,0 +1,26 @@
+"""generation job tier
+
+Revision ID: 007
+Revises: 006
+Create Date: 2026-10-18 21:00:00.000000
+
+Queued generations keep the subscription tier of the user who enqueued
+them, so workers schedule, route, bill and serve them from the library
+as the inline path would. Jobs queued before this are taken as "free".
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '007'
+down_revision = '006'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    op.add_column(
+        'generation_jobs',
+        sa.Column('subscription_tier', sa.String(), nullable=False, server_default='free')
+    )
+
+def downgrade() -> None:
+    op.drop_column('generation_jobs', 'subscription_tier')
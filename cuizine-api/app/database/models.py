@@ -1,13 +1,45 @@
-from sqlalchemy import Column, String, Integer, JSON, Boolean, ARRAY, DateTime, ForeignKey, Float, Table
+from sqlalchemy import Column, String, Integer, JSON, Boolean, ARRAY, DateTime, ForeignKey, Float, Index, Table
+from sqlalchemy import Computed, DDL, Text, event, text
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
-from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.dialects.postgresql import JSONB, TSVECTOR
 import uuid
-from .session import Base
+from app.core.database import Base
 
 def generate_uuid():
     return str(uuid.uuid4())
 
+# Text search configuration of recipes.search_vector; queries must use the same one
+SEARCH_CONFIG = "english"
+
+# Weighted document for recipe search: title (A), ingredient items (B), cuisine and meal type (C),
+# description (D). Wrapped in an IMMUTABLE function because a generated column may only call
+# immutable functions and Postgres marks array_to_string stable.
+RECIPE_SEARCH_FUNCTION = f"""
+CREATE OR REPLACE FUNCTION recipe_search_vector(
+    title text, description text, ingredients jsonb, cuisine_type text[], meal_type text
+) RETURNS tsvector LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+    SELECT setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(title, '')), 'A')
+        || setweight(jsonb_to_tsvector(
+            '{SEARCH_CONFIG}', coalesce(jsonb_path_query_array(ingredients, '$[*].item'), '[]'), '["string"]'
+        ), 'B')
+        || setweight(to_tsvector(
+            '{SEARCH_CONFIG}', coalesce(array_to_string(cuisine_type, ' '), '') || ' ' || coalesce(meal_type, '')
+        ), 'C')
+        || setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(description, '')), 'D')
+$$
+"""
+RECIPE_SEARCH_EXPRESSION = "recipe_search_vector(title, description, ingredients, cuisine_type, meal_type)"
+
+# Ingredient items of a recipe as one string, trigram-indexed so misspelled ingredients still match
+RECIPE_INGREDIENT_NAMES_FUNCTION = """
+CREATE OR REPLACE FUNCTION recipe_ingredient_names(ingredients jsonb)
+RETURNS text LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+    SELECT string_agg(item, ', ')
+    FROM jsonb_array_elements_text(coalesce(jsonb_path_query_array(ingredients, '$[*].item'), '[]')) AS item
+$$
+"""
+
 # Association tables
 recipe_tags = Table(
     'recipe_tags',
@@ -47,7 +79,7 @@ class Recipe(Base):
     leftover_ideas = Column(ARRAY(String))
     
     # Generation info
-    source_type = Column(String)  # 'user', 'ai', 'admin'
+    source_type = Column(String)  # 'user', 'ai', 'admin', 'library' (a user's copy of a served AI recipe)
     generated_from = Column(JSONB)  # Store original generation parameters
     creator_user_id = Column(String)  # Clerk user ID
     
@@ -58,10 +90,32 @@ class Recipe(Base):
     like_count = Column(Integer, default=0)
     save_count = Column(Integer, default=0)
     
+    # Search columns computed by Postgres. Only queries use them (as table columns), so they are
+    # left out of the mapper: never loaded, never sent back by INSERT ... RETURNING
+    search_vector = Column(TSVECTOR, Computed(RECIPE_SEARCH_EXPRESSION, persisted=True))
+    ingredient_names = Column(Text, Computed("recipe_ingredient_names(ingredients)", persisted=True))
+    
     # Relationships
     tags = relationship("Tag", secondary=recipe_tags, back_populates="recipes")
     photos = relationship("RecipePhoto", back_populates="recipe")
     shopping_lists = relationship("ShoppingList", back_populates="recipe")
+    
+    __table_args__ = (
+        Index('idx_recipes_search', 'search_vector', postgresql_using='gin'),
+        Index('idx_recipes_title_trgm', 'title', postgresql_using='gin',
+              postgresql_ops={'title': 'gin_trgm_ops'}),
+        Index('idx_recipes_ingredient_names_trgm', 'ingredient_names', postgresql_using='gin',
+              postgresql_ops={'ingredient_names': 'gin_trgm_ops'}),
+    )
+    __mapper_args__ = {"exclude_properties": ["search_vector", "ingredient_names"]}
+
+# create_all needs the trigram operators and the functions the generated columns call
+for statement in (
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    RECIPE_SEARCH_FUNCTION,
+    RECIPE_INGREDIENT_NAMES_FUNCTION
+):
+    event.listen(Recipe.__table__, "before_create", DDL(statement).execute_if(dialect="postgresql"))
 
 class RecipePhoto(Base):
     __tablename__ = "recipe_photos"
@@ -108,4 +162,55 @@ class UserPreferences(Base):
     household_size = Column(Integer)
     preferred_units = Column(String)  # 'metric' or 'imperial'
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
\ No newline at end of file
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+class GenerationJob(Base):
+    __tablename__ = "generation_jobs"
+    
+    id = Column(String, primary_key=True, default=generate_uuid)
+    user_id = Column(String, nullable=False)  # Clerk user ID
+    status = Column(String, nullable=False, default="queued")  # queued, running, succeeded, failed
+    request = Column(JSONB, nullable=False)  # RecipeGenerationRequest payload
+    credits_reserved = Column(Integer, nullable=False, default=1)
+    subscription_tier = Column(String, nullable=False, default="free")  # At enqueue; sets priority, model and library access
+    recipe_id = Column(String, nullable=True)
+    error = Column(String, nullable=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    worker_id = Column(String, nullable=True)
+    locked_until = Column(DateTime(timezone=True), nullable=True)  # Lease held by worker_id
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+    
+    __table_args__ = (
+        # Only runnable jobs, so claims stay cheap however many finished jobs are kept
+        Index('idx_generation_jobs_runnable', 'created_at',
+              postgresql_where=text("status IN ('queued', 'running')")),
+        Index('idx_generation_jobs_user', 'user_id'),
+    )
+
+class LLMCall(Base):
+    """Append-only ledger row for one generation call, written in batches"""
+    __tablename__ = "llm_calls"
+    
+    id = Column(String, primary_key=True, default=generate_uuid)
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    user_id = Column(String, nullable=True)  # Clerk user ID; null for calls outside a request
+    subscription_tier = Column(String, nullable=False)
+    recipe_type = Column(String, nullable=False)
+    model = Column(String, nullable=True)  # Null when no completion was made (cache hit)
+    output_format = Column(String, nullable=True)
+    cache = Column(String, nullable=False)  # hit, miss, coalesced, bypass, library
+    status = Column(String, nullable=False)  # ok, error, cancelled
+    streamed = Column(Boolean, nullable=False, default=False)
+    prompt_tokens = Column(Integer, nullable=False, default=0)
+    completion_tokens = Column(Integer, nullable=False, default=0)
+    retries = Column(Integer, nullable=False, default=0)
+    queue_wait_ms = Column(Integer, nullable=False, default=0)  # Waiting for a completion slot
+    first_token_ms = Column(Integer, nullable=True)  # Streams only
+    latency_ms = Column(Integer, nullable=False)
+    
+    __table_args__ = (
+        Index('idx_llm_calls_created', 'created_at'),
+        Index('idx_llm_calls_user_created', 'user_id', 'created_at'),
+    )
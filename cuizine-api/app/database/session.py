@@ -1,41 +0,0 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
-from app.core.config import settings
-from contextlib import contextmanager
-
-# Create engine with connection pooling
-engine = create_engine(
-    settings.DATABASE_URL,
-    pool_size=5,
-    max_overflow=10,
-    pool_timeout=30,
-    pool_recycle=1800  # Recycle connections after 30 minutes
-)
-
-# Create sessionmaker
-SessionLocal = sessionmaker(
-    autocommit=False,
-    autoflush=False,
-    bind=engine
-)
-
-Base = declarative_base()
-
-@contextmanager
-def get_db():
-    """Context manager for database sessions"""
-    db = SessionLocal()
-    try:
-        yield db
-        db.commit()
-    except Exception:
-        db.rollback()
-        raise
-    finally:
-        db.close()
-
-# Async version for FastAPI
-async def get_db_session():
-    """Dependency for FastAPI endpoints"""
-    with get_db() as session:
-        yield session
\ No newline at end of file
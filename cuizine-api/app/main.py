@@ -3,14 +3,21 @@ from fastapi import FastAPI, Request, Depends, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from app.core.config import settings
-from app.api.deps import get_current_user, ClerkUser, get_rate_limit
-from app.core.rate_limit import check_rate_limit
-from app.api.v1 import recipes, generator, shopping
-from app.database.session import engine, Base
+from app.api.deps import get_current_user, ClerkUser, get_rate_limit, require_admin
+from app.core.rate_limit import check_rate_limit, start_rate_limiter, stop_rate_limiter
+from app.core.redis_client import redis
+from app.core.security import jwks_cache
+from app.services.credit_ledger import credit_ledger
+from app.services.generation_queue import generation_workers
+from app.monitoring.llm_ledger import llm_ledger
+from app.services.recipe_library import recipe_library
+from app.api.v1 import recipes, generator, shopping, usage
+from app.core.database import Base, engine
 from contextlib import asynccontextmanager
 import time
 import sentry_sdk
-from openai import AsyncOpenAI
+from app.core.openai_manager import get_openai_client, close_openai_client
+from app.monitoring.metrics import metrics
 
 # Configure logging
 logging.basicConfig(
@@ -27,31 +34,45 @@ if settings.SENTRY_DSN:
         traces_sample_rate=1.0
     )
 
-# Initialize OpenAI client
-openai_client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
-
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Startup and shutdown events"""
     # Startup
     try:
         # Create database tables
-        Base.metadata.create_all(bind=engine)
+        async with engine.begin() as connection:
+            await connection.run_sync(Base.metadata.create_all)
         logger.info("Database tables created")
         
-        # Initialize OpenAI
-        await openai_client.models.list()
+        # Initialize the shared OpenAI client and warm its connection pool
+        await get_openai_client().models.list()
         logger.info("OpenAI connection verified")
         
     except Exception as e:
         logger.error(f"Startup error: {e}")
         raise
     
-    yield
+    # Keep one HTTP session open to Upstash for the lifetime of the worker
+    async with redis:
+        start_rate_limiter()
+        credit_ledger.sync.start()
+        llm_ledger.start()
+        recipe_library.start()
+        generation_workers.start()
+        try:
+            yield
+        finally:
+            await generation_workers.stop()
+            await stop_rate_limiter()
+            await credit_ledger.sync.stop()
+            await llm_ledger.stop()
+            await recipe_library.stop()
     
     # Shutdown
     try:
-        await openai_client.close()
+        await jwks_cache.close()
+        await close_openai_client()
+        await engine.dispose()
     except Exception as e:
         logger.error(f"Shutdown error: {e}")
 
@@ -81,14 +102,15 @@ async def rate_limit_middleware(request: Request, call_next):
             if not auth or not auth.startswith('Bearer '):
                 return await call_next(request)
             
-            user = await get_current_user(auth)
+            # Verifies the token once and caches the user on request.state
+            user = await get_current_user(request)
             rate_limit = await get_rate_limit(user)
             
             # Check rate limit
             identifier = f"{user.id}:{user.metadata.subscription_tier}"
-            is_allowed, remaining = await check_rate_limit(identifier, rate_limit)
+            result = await check_rate_limit(identifier, rate_limit)
             
-            if not is_allowed:
+            if not result.allowed:
                 return JSONResponse(
                     status_code=429,
                     content={
@@ -96,6 +118,12 @@ async def rate_limit_middleware(request: Request, call_next):
                         "tier": user.metadata.subscription_tier,
                         "limit": rate_limit,
                         "window": "1 minute"
+                    },
+                    headers={
+                        "Retry-After": str(max(0, result.reset - int(time.time()))),
+                        "X-RateLimit-Limit": str(rate_limit),
+                        "X-RateLimit-Remaining": "0",
+                        "X-RateLimit-Reset": str(result.reset)
                     }
                 )
             
@@ -104,8 +132,8 @@ async def rate_limit_middleware(request: Request, call_next):
             
             # Add rate limit headers
             response.headers["X-RateLimit-Limit"] = str(rate_limit)
-            response.headers["X-RateLimit-Remaining"] = str(remaining)
-            response.headers["X-RateLimit-Reset"] = str(int(time.time() + 60))
+            response.headers["X-RateLimit-Remaining"] = str(result.remaining)
+            response.headers["X-RateLimit-Reset"] = str(result.reset)
             
             return response
             
@@ -147,6 +175,11 @@ async def health_check():
         "version": "1.0.0"
     }
 
+@app.get("/metrics")
+async def get_metrics(user: ClerkUser = Depends(require_admin)):
+    """Process counters and latency histograms, for admins only"""
+    return metrics.snapshot()
+
 # Include routers
 app.include_router(
     recipes.router,
@@ -163,6 +196,11 @@ app.include_router(
     prefix="/api/v1/shopping",
     tags=["shopping-lists"]
 )
+app.include_router(
+    usage.router,
+    prefix="/api/v1/usage",
+    tags=["usage"]
+)
 
 if __name__ == "__main__":
     import uvicorn
@@ -80,7 +80,6 @@ class MealPlan(Base):
     
     # Relationships
     days = relationship("MealPlanDay", back_populates="meal_plan")
-    shopping_lists = relationship("ShoppingList", back_populates="meal_plan")
     
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
@@ -8,6 +8,7 @@ import logging
 from concurrent.futures import ThreadPoolExecutor
 import json
 from pathlib import Path
+from upstash_redis import Redis
 
 # Create necessary directories
 BASE_DIR = Path(__file__).resolve().parent.parent.parent  # Gets the project root
@@ -28,6 +29,14 @@ logging.basicConfig(
 )
 logger = logging.getLogger('clerk_manager')
 
+# Drop a user's live balance and take them off the write-behind sync queue in
+# one step, so a sync cannot push the pre-reset balance back over the reset
+# (keys match app.services.credit_ledger)
+RESET_CREDITS_SCRIPT = """
+redis.call('DEL', KEYS[1])
+redis.call('SREM', KEYS[2], ARGV[1])
+"""
+
 class ClerkSubscriptionManager:
     def __init__(self):
         self.headers = {
@@ -35,6 +44,9 @@ class ClerkSubscriptionManager:
             "Content-Type": "application/json"
         }
         self.is_running = False
+        # The API keeps live balances in a Redis ledger; drop them on reset so
+        # the next request re-seeds from the fresh Clerk metadata
+        self.redis = Redis.from_env()
 
     def get_all_users(self) -> List[Dict]:
         try:
@@ -72,6 +84,11 @@ class ClerkSubscriptionManager:
                 json={"public_metadata": new_metadata}
             )
             response.raise_for_status()
+            self.redis.eval(
+                RESET_CREDITS_SCRIPT,
+                keys=[f"credits:{user['id']}", "credits:dirty"],
+                args=[user['id']]
+            )
             logger.info(f"Successfully reset user {user['id']} ({subscription_tier})")
             return True
         except Exception as e:
@@ -0,0 +1,155 @@
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.database.models import LLMCall
+from app.monitoring.metrics import metrics
+from datetime import datetime, timezone
+from sqlalchemy import func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Any, Callable, Dict, List, Optional
+import asyncio
+import logging
+import uuid
+
+logger = logging.getLogger(__name__)
+
+ledger_written = metrics.counter(
+    "llm_ledger_written", "LLM call records written to llm_calls"
+)
+ledger_dropped = metrics.counter(
+    "llm_ledger_dropped", "LLM call records dropped, by reason"
+)
+
+# Columns the usage summaries can be grouped by
+GROUP_COLUMNS = {
+    "user": LLMCall.user_id,
+    "tier": LLMCall.subscription_tier,
+    "recipe_type": LLMCall.recipe_type,
+    "model": LLMCall.model
+}
+
+class LLMCallLedger:
+    """
+    Buffers one record per LLM call and appends them to llm_calls in batches.
+
+    `record()` only appends to an in-process buffer, so the request that made
+    the call never waits on the database. A background task inserts whatever
+    has accumulated every `interval` seconds, or as soon as `batch_size`
+    records are waiting. If the database falls behind, records past
+    `max_pending` are dropped and counted instead of growing the buffer.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], AsyncSession] = SessionLocal,
+        batch_size: int = settings.LLM_LEDGER_BATCH_SIZE,
+        interval: float = settings.LLM_LEDGER_FLUSH_INTERVAL,
+        max_pending: int = settings.LLM_LEDGER_MAX_PENDING
+    ):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_pending = max_pending
+        self._pending: List[Dict[str, Any]] = []
+        self._ready = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def record(self, **values) -> None:
+        if len(self._pending) >= self.max_pending:
+            ledger_dropped.inc(reason="buffer_full")
+            return
+        values.setdefault("id", str(uuid.uuid4()))
+        values.setdefault("created_at", datetime.now(timezone.utc))
+        self._pending.append(values)
+        if len(self._pending) >= self.batch_size:
+            self._ready.set()
+
+    async def _write(self, rows: List[Dict[str, Any]]) -> None:
+        async with self.session_factory() as db:
+            await db.execute(insert(LLMCall), rows)
+            await db.commit()
+
+    async def flush(self) -> int:
+        """Write everything buffered so far; returns the number of records written"""
+        batch, self._pending = self._pending, []
+        written = 0
+        for start in range(0, len(batch), self.batch_size):
+            rows = batch[start:start + self.batch_size]
+            try:
+                await self._write(rows)
+            except Exception as e:
+                logger.error(f"Failed to write {len(rows)} LLM call records: {e}")
+                ledger_dropped.inc(len(rows), reason="write_failed")
+                continue
+            ledger_written.inc(len(rows))
+            written += len(rows)
+        return written
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._ready.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"LLM ledger flush failed: {e}")
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+def usage_summary_statement(group_by: str, since: datetime, user_id: Optional[str] = None):
+    """Calls, token spend and latency percentiles per group since `since`"""
+    key = GROUP_COLUMNS[group_by]
+
+    def p(q: float, column):
+        return func.percentile_cont(q).within_group(column)
+
+    statement = (
+        select(
+            key.label("key"),
+            func.count().label("calls"),
+            func.count().filter(LLMCall.status != "ok").label("failed"),
+            func.count().filter(LLMCall.cache.in_(("hit", "coalesced", "library"))).label("cache_hits"),
+            func.coalesce(func.sum(LLMCall.prompt_tokens), 0).label("prompt_tokens"),
+            func.coalesce(func.sum(LLMCall.completion_tokens), 0).label("completion_tokens"),
+            p(0.5, LLMCall.latency_ms).label("latency_p50_ms"),
+            p(0.95, LLMCall.latency_ms).label("latency_p95_ms"),
+            p(0.5, LLMCall.first_token_ms).label("first_token_p50_ms"),
+            p(0.95, LLMCall.first_token_ms).label("first_token_p95_ms"),
+            p(0.95, LLMCall.queue_wait_ms).label("queue_wait_p95_ms")
+        )
+        .where(LLMCall.created_at >= since)
+        .group_by(key)
+        .order_by(func.sum(LLMCall.prompt_tokens + LLMCall.completion_tokens).desc())
+    )
+    if user_id is not None:
+        statement = statement.where(LLMCall.user_id == user_id)
+    return statement
+
+async def usage_summary(
+    db: AsyncSession,
+    group_by: str,
+    since: datetime,
+    user_id: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    rows = (await db.execute(usage_summary_statement(group_by, since, user_id))).mappings()
+    return [dict(row) for row in rows]
+
+llm_ledger = LLMCallLedger()
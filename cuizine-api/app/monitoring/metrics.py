@@ -0,0 +1,129 @@
+from bisect import bisect_left
+from threading import Lock
+from typing import Any, Dict, List, Optional, Tuple
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+
+def _label_key(labels: Dict[str, Any]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+def _label_str(key: LabelKey) -> str:
+    return ",".join(f"{k}={v}" for k, v in key)
+
+class Counter:
+    def __init__(self, name: str, description: str):
+        self.name = name
+        self.description = description
+        self._values: Dict[LabelKey, float] = {}
+        self._lock = Lock()
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(_label_key(labels), 0)
+
+    def snapshot(self) -> Dict[str, float]:
+        return {_label_str(k): v for k, v in self._values.items()}
+
+class Gauge(Counter):
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[_label_key(labels)] = value
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+class Histogram:
+    """Fixed-bucket histogram; percentiles are interpolated from bucket counts"""
+
+    def __init__(self, name: str, description: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.description = description
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[LabelKey, Dict[str, Any]] = {}
+        self._lock = Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {
+                    "count": 0,
+                    "sum": 0.0,
+                    "buckets": [0] * (len(self.buckets) + 1)
+                }
+            series["count"] += 1
+            series["sum"] += value
+            series["buckets"][bisect_left(self.buckets, value)] += 1
+
+    def count(self, **labels) -> int:
+        series = self._series.get(_label_key(labels))
+        return series["count"] if series else 0
+
+    def percentile(self, q: float, **labels) -> Optional[float]:
+        series = self._series.get(_label_key(labels))
+        return self._percentile(series, q) if series else None
+
+    def _percentile(self, series: Dict[str, Any], q: float) -> Optional[float]:
+        if not series["count"]:
+            return None
+        rank = q * series["count"]
+        seen = 0
+        for i, count in enumerate(series["buckets"]):
+            if count and seen + count >= rank:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else lower
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            _label_str(key): {
+                "count": series["count"],
+                "sum": round(series["sum"], 6),
+                "p50": self._percentile(series, 0.5),
+                "p95": self._percentile(series, 0.95),
+                "p99": self._percentile(series, 0.99)
+            }
+            for key, series in self._series.items()
+        }
+
+class MetricsRegistry:
+    """In-process metrics, exposed as JSON on /metrics"""
+
+    def __init__(self):
+        self._metrics: Dict[str, Any] = {}
+
+    def _register(self, metric):
+        return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, description: str) -> Counter:
+        return self._register(Counter(name, description))
+
+    def gauge(self, name: str, description: str) -> Gauge:
+        return self._register(Gauge(name, description))
+
+    def histogram(self, name: str, description: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, description, buckets))
+
+    def names(self) -> List[str]:
+        return sorted(self._metrics)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            name: {
+                "type": type(metric).__name__.lower(),
+                "description": metric.description,
+                "values": metric.snapshot()
+            }
+            for name, metric in sorted(self._metrics.items())
+        }
+
+metrics = MetricsRegistry()
@@ -0,0 +1,174 @@
+from decimal import Decimal
+from typing import Any, Dict, List, Literal, Optional, Tuple
+from pydantic import BaseModel, ConfigDict, Field, field_validator
+from .recipes import GeneratedRecipe, IngredientSchema, InstructionSchema
+
+# Compact output contract for recipe generation.
+#
+# Output tokens dominate generation latency, so the model answers with short
+# keys, enumerated units and difficulty, implied step numbers and no empty
+# optional fields. The contract is enforced with strict JSON-schema structured
+# outputs and expanded to GeneratedRecipe on the server.
+
+Unit = Literal[
+    "g", "kg", "ml", "l", "tsp", "tbsp", "cup", "oz", "lb", "piece",
+    "clove", "slice", "pinch", "can", "bunch", "sprig", "handful", "to taste"
+]
+Difficulty = Literal["beginner", "intermediate", "advanced"]
+
+class _Strict(BaseModel):
+    # additionalProperties: false, as strict structured outputs require
+    model_config = ConfigDict(extra="forbid")
+
+class CompactIngredient(_Strict):
+    n: str = Field(description="ingredient")
+    q: float = Field(description="amount, > 0")
+    u: Unit
+    x: Optional[str] = Field(description="short prep note or null")
+
+    @field_validator('q')
+    @classmethod
+    def positive_amount(cls, v):
+        if v <= 0:
+            raise ValueError("amount must be positive")
+        return v
+
+class CompactStep(_Strict):
+    c: str = Field(description="instruction")
+    m: Optional[int] = Field(description="minutes or null")
+
+    @field_validator('c')
+    @classmethod
+    def meaningful_step(cls, v):
+        if len(v) < 10:
+            raise ValueError("instruction too short")
+        return v
+
+class CompactNutrition(_Strict):
+    """Per serving"""
+    cal: int
+    pro: int = Field(description="protein g")
+    carb: int = Field(description="carbs g")
+    fat: int = Field(description="fat g")
+
+class CompactRecipe(_Strict):
+    t: str = Field(description="title")
+    d: str = Field(description="one-sentence description")
+    p: int = Field(description="prep minutes")
+    c: int = Field(description="cook minutes")
+    sv: int = Field(description="servings")
+    l: Difficulty
+    i: List[CompactIngredient] = Field(description="ingredients")
+    s: List[CompactStep] = Field(description="steps in order")
+    n: CompactNutrition
+    e: List[str] = Field(description="equipment")
+    h: List[str] = Field(description="tips")
+    k: Optional[str] = Field(description="storage or null")
+    lo: List[str] = Field(description="leftover ideas")
+
+    def to_generated(self) -> GeneratedRecipe:
+        """Expand to the server-side recipe shape; the values are already validated"""
+        return GeneratedRecipe.model_construct(
+            title=self.t,
+            description=self.d,
+            prep_time=self.p,
+            cook_time=self.c,
+            total_time=self.p + self.c,
+            servings=self.sv,
+            difficulty_level=self.l,
+            cuisine_type=[],
+            meal_type=None,
+            ingredients=[
+                IngredientSchema.model_construct(**expand_ingredient(i.model_dump()), category=None, is_optional=False)
+                for i in self.i
+            ],
+            instructions=[
+                InstructionSchema.model_construct(
+                    **expand_step(s.model_dump(), index),
+                    equipment_needed=None,
+                    temperature=None,
+                    tips=None
+                )
+                for index, s in enumerate(self.s)
+            ],
+            nutritional_info=expand_nutrition(self.n.model_dump()),
+            equipment_needed=self.e,
+            dietary_info={},
+            recipe_tips=self.h,
+            storage_instructions=self.k,
+            leftover_ideas=self.lo
+        )
+
+# Long names for the compact top-level keys
+COMPACT_FIELDS = {
+    "t": "title",
+    "d": "description",
+    "p": "prep_time",
+    "c": "cook_time",
+    "sv": "servings",
+    "l": "difficulty_level",
+    "i": "ingredients",
+    "s": "instructions",
+    "n": "nutritional_info",
+    "e": "equipment_needed",
+    "h": "recipe_tips",
+    "k": "storage_instructions",
+    "lo": "leftover_ideas"
+}
+
+def expand_ingredient(value: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "item": value["n"],
+        "amount": round(Decimal(str(value["q"])), 2),
+        "unit": value["u"],
+        "notes": value.get("x")
+    }
+
+def expand_step(value: Dict[str, Any], index: int) -> Dict[str, Any]:
+    minutes = value.get("m")
+    return {
+        "step_number": index + 1,
+        "content": value["c"],
+        "timing": f"{minutes} minutes" if minutes else None
+    }
+
+def expand_nutrition(value: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "calories": value["cal"],
+        "protein": value["pro"],
+        "carbs": value["carb"],
+        "fat": value["fat"]
+    }
+
+def expand_field(key: str, value: Any, index: Optional[int] = None) -> Tuple[str, Any]:
+    """Long key and JSON-ready value for one streamed compact field or array item"""
+    if key == "i" and index is not None:
+        ingredient = expand_ingredient(value)
+        return "ingredients", {**ingredient, "amount": float(ingredient["amount"])}
+    if key == "s" and index is not None:
+        return "instructions", expand_step(value, index)
+    if key == "n":
+        return "nutritional_info", expand_nutrition(value)
+    return COMPACT_FIELDS.get(key, key), value
+
+def _without_titles(schema: Any) -> Any:
+    """Drop the generated "title" annotations; they only add prompt tokens"""
+    if isinstance(schema, dict):
+        return {
+            k: _without_titles(v) for k, v in schema.items()
+            if not (k == "title" and isinstance(v, str))
+        }
+    if isinstance(schema, list):
+        return [_without_titles(v) for v in schema]
+    return schema
+
+RECIPE_OUTPUT_SCHEMA = _without_titles(CompactRecipe.model_json_schema())
+
+RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "recipe",
+        "strict": True,
+        "schema": RECIPE_OUTPUT_SCHEMA
+    }
+}
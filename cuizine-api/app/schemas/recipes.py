@@ -1,8 +1,8 @@
 # app/api/schemas/recipes.py
-from datetime import datetime
+from datetime import datetime, timezone
 from decimal import Decimal
 from typing import Any, Dict, List, Optional
-from pydantic import BaseModel, Field, field_validator
+from pydantic import AliasChoices, BaseModel, Field, field_validator
 from .base import BaseResponse, PaginatedResponse, ErrorResponse
 from enum import Enum
 
@@ -28,6 +28,12 @@ class DifficultyLevel(str, Enum):
     INTERMEDIATE = "intermediate"
     ADVANCED = "advanced"
 
+class GenerationJobStatus(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
 # Request/Response Models
 class RecipeIngredient(BaseModel):
     item: str
@@ -76,7 +82,7 @@ class IngredientSchema(BaseModel):
         }
 
 class InstructionSchema(BaseModel):
-    step_number: int = Field(..., gt=0)
+    step_number: int = Field(..., gt=0, validation_alias=AliasChoices("step_number", "step"))
     content: str = Field(..., min_length=10)
     timing: Optional[str] = None
     equipment_needed: Optional[List[str]] = None
@@ -97,6 +103,39 @@ class InstructionSchema(BaseModel):
             }
         }
 
+class GeneratedRecipe(BaseModel):
+    """
+    Recipe as returned by the model, validated in one pass from the raw
+    completion text with `model_validate_json`. The validated object feeds
+    both storage and the API response without being validated again.
+    """
+    title: str
+    description: str
+    prep_time: int
+    cook_time: int
+    total_time: Optional[int] = None
+    servings: int = 2
+    difficulty_level: Optional[str] = None
+    cuisine_type: List[str] = Field(default_factory=list)
+    meal_type: Optional[str] = None
+    ingredients: List[IngredientSchema]
+    instructions: List[InstructionSchema]
+    nutritional_info: Dict[str, Any]
+    equipment_needed: List[str] = Field(default_factory=list)
+    dietary_info: Dict[str, Any] = Field(default_factory=dict)
+    # The prompt asks for "tips"; stored and served as recipe_tips
+    recipe_tips: List[str] = Field(
+        default_factory=list,
+        validation_alias=AliasChoices("recipe_tips", "tips")
+    )
+    storage_instructions: Optional[str] = None
+    leftover_ideas: List[str] = Field(default_factory=list)
+
+    @field_validator('cuisine_type', mode='before')
+    @classmethod
+    def wrap_single_cuisine(cls, v):
+        return [v] if isinstance(v, str) else v
+
 # Update Recipe schema to use the new schemas
 class Recipe(BaseModel):
     id: str
@@ -160,6 +199,31 @@ class Recipe(BaseModel):
             leftover_ideas=db_recipe.leftover_ideas
         )
 
+    @classmethod
+    def from_generated(cls, db_recipe: Any, generated: GeneratedRecipe) -> "Recipe":
+        """Build the response for a freshly stored recipe from already validated output"""
+        return cls.model_construct(
+            id=db_recipe.id,
+            title=generated.title,
+            description=generated.description,
+            prep_time=generated.prep_time,
+            cook_time=generated.cook_time,
+            total_time=db_recipe.total_time,
+            servings=generated.servings,
+            cuisine_type=generated.cuisine_type,
+            meal_type=generated.meal_type,
+            cooking_style=db_recipe.cooking_style,
+            is_spicy=db_recipe.is_spicy,
+            ingredients=generated.ingredients,
+            instructions=generated.instructions,
+            equipment_needed=generated.equipment_needed,
+            nutritional_info=generated.nutritional_info,
+            dietary_info=generated.dietary_info,
+            recipe_tips=generated.recipe_tips,
+            storage_instructions=generated.storage_instructions,
+            leftover_ideas=generated.leftover_ideas
+        )
+
     def to_db_dict(self) -> Dict[str, Any]:
         """Convert to dictionary for DB storage"""
         return {
@@ -194,16 +258,49 @@ class RecipeGenerationRequest(BaseModel):
     max_time: Optional[int] = Field(None, ge=0, le=240)
     is_spicy: bool = False
     notes: Optional[str] = None
+    fresh: bool = Field(
+        default=False,
+        description="Always run a new generation instead of sharing a cached or in-flight one"
+    )
+
+class RecipeBatchRequest(BaseModel):
+    requests: List[RecipeGenerationRequest] = Field(..., min_length=1, max_length=10)
 
 
 class RecipeResponse(BaseResponse):
     data: Recipe
     credits_remaining: int
     generation_id: str
-    timestamp: datetime = Field(default_factory=lambda: datetime.now(datetime.UTC))
+    timestamp: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+class GenerationJobResponse(BaseResponse):
+    job_id: str
+    status: GenerationJobStatus
+    attempts: int = 0
+    data: Optional[Recipe] = None  # Set once the job succeeded
+    error: Optional[str] = None
+    credits_remaining: Optional[int] = None
+    created_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+class RecipeLookupField(str, Enum):
+    TITLE = "title"
+    INGREDIENT = "ingredient"
+
+class RecipeLookupMatch(BaseModel):
+    recipe_id: str
+    title: str
+    matched: str  # The title, or the ingredient closest to the query
+    score: float  # pg_trgm word similarity between the query and `matched`, 0-1
+
+    class Config:
+        from_attributes = True
+
+class RecipeLookupResponse(BaseResponse):
+    data: List[RecipeLookupMatch]
 
 class RecipeGenerationError(ErrorResponse):
     error_code: str
     error_details: Optional[dict] = None
-    retry_after: Optional[int] = None
+    retry_after: Optional[int] = None  # Seconds to wait before retrying a shed request
     credits_remaining: int = 0
\ No newline at end of file
@@ -0,0 +1,35 @@
+from datetime import datetime
+from pydantic import BaseModel, Field
+from typing import List, Optional
+from .base import BaseResponse
+
+class ShoppingItem(BaseModel):
+    name: str
+    amount: Optional[float] = None
+    unit: Optional[str] = None
+    category: str = "other"
+    checked: bool = False
+    notes: Optional[str] = None
+
+class ShoppingListCreate(BaseModel):
+    recipe_id: str
+    servings: Optional[int] = Field(None, ge=1, le=100)  # Scale the recipe's amounts to this many
+
+class ShoppingListMerge(BaseModel):
+    list_ids: List[str] = Field(..., min_length=2, max_length=20)
+    name: str = Field(..., min_length=1, max_length=200)
+
+class ShoppingList(BaseModel):
+    id: str
+    user_id: str
+    recipe_id: Optional[str] = None
+    name: Optional[str] = None
+    items: List[ShoppingItem]
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+class ShoppingListResponse(BaseResponse):
+    data: ShoppingList
@@ -0,0 +1,28 @@
+from datetime import datetime
+from enum import Enum
+from pydantic import BaseModel
+from typing import List, Optional
+
+class UsageGroupBy(str, Enum):
+    USER = "user"
+    TIER = "tier"
+    RECIPE_TYPE = "recipe_type"
+    MODEL = "model"
+
+class LLMUsageGroup(BaseModel):
+    key: Optional[str] = None  # Null for calls without a value, e.g. cache hits have no model
+    calls: int
+    failed: int
+    cache_hits: int  # Served from the cache, the recipe library or by joining an identical in-flight call
+    prompt_tokens: int
+    completion_tokens: int
+    latency_p50_ms: Optional[float] = None
+    latency_p95_ms: Optional[float] = None
+    first_token_p50_ms: Optional[float] = None  # Streamed calls only
+    first_token_p95_ms: Optional[float] = None
+    queue_wait_p95_ms: Optional[float] = None
+
+class LLMUsageResponse(BaseModel):
+    group_by: UsageGroupBy
+    since: datetime
+    groups: List[LLMUsageGroup]
@@ -0,0 +1,322 @@
+from upstash_redis.asyncio import Redis
+from app.core.config import settings
+from app.core.redis_client import redis
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import httpx
+import logging
+
+logger = logging.getLogger(__name__)
+
+CLERK_API_URL = "https://api.clerk.com/v1"
+CREDITS_KEY_PREFIX = "credits:"
+DIRTY_SET_KEY = "credits:dirty"
+
+# Seed the balance from the caller's token metadata the first time we see a
+# user, then take `count` credits only if the balance covers all of them.
+# Returns the new balance, or -1 when the user cannot afford the request.
+# A hash missing either counter is unseeded too: a settle that lands after the
+# monthly reset deleted the key recreates it with just the field it bumped.
+RESERVE_SCRIPT = """
+local key = KEYS[1]
+if redis.call('HEXISTS', key, 'remaining') == 0 or redis.call('HEXISTS', key, 'generated') == 0 then
+    redis.call('HSET', key, 'remaining', ARGV[1], 'generated', ARGV[2])
+end
+redis.call('EXPIRE', key, ARGV[4])
+
+local count = tonumber(ARGV[3])
+if tonumber(redis.call('HGET', key, 'remaining')) < count then
+    return -1
+end
+return redis.call('HINCRBY', key, 'remaining', -count)
+"""
+
+# Commit (bump `generated`) or refund (give `remaining` back) a reservation
+# and queue the user for Clerk sync
+SETTLE_SCRIPT = """
+local value = redis.call('HINCRBY', KEYS[1], ARGV[1], ARGV[2])
+redis.call('SADD', KEYS[2], ARGV[3])
+return value
+"""
+
+# Atomically take a batch of users off the dirty set along with their balances;
+# unseeded (deleted or partial) balances are dropped rather than synced
+POP_DIRTY_SCRIPT = """
+local ids = redis.call('SPOP', KEYS[1], ARGV[1])
+local out = {}
+for _, id in ipairs(ids) do
+    local balance = redis.call('HMGET', ARGV[2] .. id, 'remaining', 'generated')
+    if balance[1] and balance[2] then
+        table.insert(out, id)
+        table.insert(out, balance[1])
+        table.insert(out, balance[2])
+    end
+end
+return out
+"""
+
+Balance = Tuple[int, int]  # (recipes_remaining, recipes_generated)
+
+class RedisCreditStore:
+    """Credit balances as Redis hashes, updated with server-side scripts"""
+
+    def __init__(self, client: Redis, ttl: int):
+        self.client = client
+        self.ttl = ttl
+
+    async def reserve(self, user_id: str, seed: Balance, count: int) -> Optional[int]:
+        remaining = await self.client.eval(
+            RESERVE_SCRIPT,
+            keys=[CREDITS_KEY_PREFIX + user_id],
+            args=[seed[0], seed[1], count, self.ttl]
+        )
+        remaining = int(remaining)
+        return remaining if remaining >= 0 else None
+
+    async def settle(self, user_id: str, field: str, count: int) -> int:
+        value = await self.client.eval(
+            SETTLE_SCRIPT,
+            keys=[CREDITS_KEY_PREFIX + user_id, DIRTY_SET_KEY],
+            args=[field, count, user_id]
+        )
+        return int(value)
+
+    async def get(self, user_id: str) -> Optional[Balance]:
+        remaining, generated = await self.client.hmget(
+            CREDITS_KEY_PREFIX + user_id, "remaining", "generated"
+        )
+        if remaining is None or generated is None:
+            return None
+        return int(remaining), int(generated)
+
+    async def pop_dirty(self, limit: int) -> Dict[str, Balance]:
+        flat = await self.client.eval(
+            POP_DIRTY_SCRIPT,
+            keys=[DIRTY_SET_KEY],
+            args=[limit, CREDITS_KEY_PREFIX]
+        )
+        return {
+            flat[i]: (int(flat[i + 1]), int(flat[i + 2]))
+            for i in range(0, len(flat), 3)
+        }
+
+    async def mark_dirty(self, user_ids: List[str]) -> None:
+        if user_ids:
+            await self.client.sadd(DIRTY_SET_KEY, *user_ids)
+
+class InMemoryCreditStore:
+    """Process-local stand-in with the same semantics, for tests and local runs"""
+
+    def __init__(self):
+        self._balances: Dict[str, List[int]] = {}
+        self._dirty: set = set()
+
+    async def reserve(self, user_id: str, seed: Balance, count: int) -> Optional[int]:
+        # No awaits below, so the check-and-take is atomic on the event loop
+        balance = self._balances.setdefault(user_id, list(seed))
+        if balance[0] < count:
+            return None
+        balance[0] -= count
+        return balance[0]
+
+    async def settle(self, user_id: str, field: str, count: int) -> int:
+        balance = self._balances[user_id]
+        index = 0 if field == "remaining" else 1
+        balance[index] += count
+        self._dirty.add(user_id)
+        return balance[index]
+
+    async def get(self, user_id: str) -> Optional[Balance]:
+        balance = self._balances.get(user_id)
+        return tuple(balance) if balance else None
+
+    async def pop_dirty(self, limit: int) -> Dict[str, Balance]:
+        batch = {}
+        while self._dirty and len(batch) < limit:
+            user_id = self._dirty.pop()
+            batch[user_id] = tuple(self._balances[user_id])
+        return batch
+
+    async def mark_dirty(self, user_ids: List[str]) -> None:
+        self._dirty.update(user_ids)
+
+class ClerkMetadataSync:
+    """
+    Write-behind worker that copies ledger balances to Clerk public metadata.
+
+    Every interval it drains up to `batch_size` dirty users and PATCHes their
+    metadata over one pooled HTTP client. Clerk deep-merges public_metadata, so
+    only the two counters are sent and no read is needed. However many
+    generations a user ran in the interval, they cost one PATCH.
+    """
+
+    def __init__(self, store, interval: float, batch_size: int, concurrency: int):
+        self.store = store
+        self.interval = interval
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self._client: Optional[httpx.AsyncClient] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=CLERK_API_URL,
+                headers={
+                    "Authorization": f"Bearer {settings.CLERK_SECRET_KEY}",
+                    "Content-Type": "application/json"
+                },
+                limits=httpx.Limits(
+                    max_connections=self.concurrency,
+                    max_keepalive_connections=self.concurrency
+                ),
+                timeout=10.0
+            )
+        return self._client
+
+    async def _push(self, user_id: str, balance: Balance) -> bool:
+        try:
+            response = await self._get_client().patch(
+                f"/users/{user_id}/metadata",
+                json={"public_metadata": {
+                    "recipes_remaining": balance[0],
+                    "recipes_generated": balance[1]
+                }}
+            )
+            response.raise_for_status()
+            return True
+        except Exception as e:
+            logger.error(f"Failed to sync credits for user {user_id}: {e}")
+            return False
+
+    async def flush(self) -> int:
+        """Sync every dirty user; returns the number of users pushed to Clerk"""
+        pushed = 0
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def push(user_id: str, balance: Balance) -> bool:
+            async with semaphore:
+                return await self._push(user_id, balance)
+
+        while True:
+            batch = await self.store.pop_dirty(self.batch_size)
+            if not batch:
+                return pushed
+
+            results = await asyncio.gather(*[
+                push(user_id, balance) for user_id, balance in batch.items()
+            ])
+            failed = [user_id for user_id, ok in zip(batch, results) if not ok]
+            pushed += len(batch) - len(failed)
+
+            if failed:
+                # Retry on the next tick rather than hammering a failing API
+                await self.store.mark_dirty(failed)
+                return pushed
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                pushed = await self.flush()
+                if pushed:
+                    logger.info(f"Synced credits for {pushed} users to Clerk")
+            except Exception as e:
+                logger.error(f"Credit sync failed: {e}")
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.flush()
+        finally:
+            if self._client is not None:
+                await self._client.aclose()
+                self._client = None
+
+@dataclass
+class Reservation:
+    user_id: str
+    count: int
+    remaining: int  # Balance right after the reservation was taken
+    settled: bool = False
+
+class CreditLedger:
+    """
+    API-owned recipe credits; Clerk metadata is a lagging copy.
+
+    Callers reserve credits before doing paid work, then commit them once the
+    work succeeded or refund them if it failed. The reservation is an atomic
+    conditional decrement, so concurrent requests can never overdraw a balance.
+    """
+
+    def __init__(self, store, sync: ClerkMetadataSync):
+        self.store = store
+        self.sync = sync
+
+    async def reserve(
+        self,
+        user_id: str,
+        remaining: int,
+        generated: int = 0,
+        count: int = 1
+    ) -> Optional[Reservation]:
+        """Take `count` credits, seeding the ledger from token metadata if needed"""
+        balance = await self.store.reserve(user_id, (remaining, generated), count)
+        if balance is None:
+            return None
+        return Reservation(user_id=user_id, count=count, remaining=balance)
+
+    async def commit(self, reservation: Reservation, used: Optional[int] = None) -> None:
+        """Record the reserved credits as spent, refunding any that went unused"""
+        if reservation.settled:
+            return
+        reservation.settled = True
+
+        used = reservation.count if used is None else used
+        if used:
+            await self.store.settle(reservation.user_id, "generated", used)
+        if reservation.count - used:
+            reservation.remaining = await self.store.settle(
+                reservation.user_id, "remaining", reservation.count - used
+            )
+
+    async def refund(self, reservation: Reservation) -> None:
+        """Give reserved credits back after a failed generation"""
+        if reservation.settled:
+            return
+        reservation.settled = True
+        try:
+            await self.store.settle(reservation.user_id, "remaining", reservation.count)
+        except Exception as e:
+            logger.error(f"Failed to refund {reservation.count} credits to {reservation.user_id}: {e}")
+
+    async def get_remaining(self, user_id: str, default: int) -> int:
+        balance = await self.store.get(user_id)
+        return balance[0] if balance else default
+
+def _create_store():
+    if settings.CREDIT_LEDGER_BACKEND == "memory":
+        return InMemoryCreditStore()
+    return RedisCreditStore(redis, ttl=settings.CREDIT_LEDGER_TTL)
+
+_store = _create_store()
+credit_ledger = CreditLedger(
+    _store,
+    ClerkMetadataSync(
+        _store,
+        interval=settings.CREDIT_SYNC_INTERVAL,
+        batch_size=settings.CREDIT_SYNC_BATCH_SIZE,
+        concurrency=settings.CREDIT_SYNC_CONCURRENCY
+    )
+)
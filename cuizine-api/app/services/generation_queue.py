@@ -0,0 +1,377 @@
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.core.openai_manager import close_openai_client
+from app.core.redis_client import redis
+from app.database.models import GenerationJob
+from app.monitoring.llm_ledger import llm_ledger
+from app.monitoring.metrics import metrics
+from app.schemas.recipes import RecipeGenerationRequest
+from app.services.credit_ledger import Reservation, credit_ledger
+from app.services.recipe_library import recipe_library
+from app.services.recipe_generator import RecipeGeneratorService
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import and_, delete, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Any, Callable, Dict, List, Optional
+import asyncio
+import logging
+import os
+import socket
+import time
+
+logger = logging.getLogger(__name__)
+
+jobs_finished = metrics.counter(
+    "generation_jobs_finished", "Queued generations by outcome"
+)
+job_queue_wait = metrics.histogram(
+    "generation_job_queue_wait_seconds", "Time a queued generation waited to be claimed"
+)
+jobs_pruned = metrics.counter(
+    "generation_jobs_pruned", "Finished jobs deleted after GENERATION_JOB_RETENTION_DAYS"
+)
+
+PRUNE_INTERVAL = 3600  # Seconds between deletions of expired finished jobs
+PRUNE_BATCH_SIZE = 1000
+
+class LeaseLost(Exception):
+    """Another worker took over the job, or its lease could not be renewed in time"""
+
+@dataclass
+class ClaimedJob:
+    id: str
+    user_id: str
+    request: Dict[str, Any]
+    credits_reserved: int
+    attempts: int
+    subscription_tier: str
+
+    @property
+    def reservation(self) -> Reservation:
+        # The ledger only needs the user and count to settle a reservation
+        return Reservation(user_id=self.user_id, count=self.credits_reserved, remaining=0)
+
+class GenerationJobQueue:
+    """
+    Durable queue of recipe generations stored in the generation_jobs table.
+
+    Workers claim the oldest queued job with SELECT ... FOR UPDATE SKIP LOCKED,
+    so any number of processes can poll the table without handing the same
+    job to two of them. A claim holds a lease that its worker renews while
+    the job runs; a running job whose lease ran out (its worker died) is
+    claimed again, up to `max_attempts` times. Renewing and finishing a job
+    are conditional on the worker still holding it, so credits are settled
+    exactly once. Finished jobs are deleted after `retention`.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], AsyncSession] = SessionLocal,
+        lease: int = settings.GENERATION_JOB_LEASE,
+        max_attempts: int = settings.GENERATION_JOB_MAX_ATTEMPTS,
+        retention: timedelta = timedelta(days=settings.GENERATION_JOB_RETENTION_DAYS)
+    ):
+        self.session_factory = session_factory
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.retention = retention
+
+    async def enqueue(
+        self,
+        db: AsyncSession,
+        user_id: str,
+        request: RecipeGenerationRequest,
+        subscription_tier: str,
+        credits_reserved: int = 1
+    ) -> GenerationJob:
+        job = GenerationJob(
+            user_id=user_id,
+            status="queued",
+            request=request.model_dump(mode="json"),
+            credits_reserved=credits_reserved,
+            subscription_tier=subscription_tier,
+            attempts=0
+        )
+        db.add(job)
+        await db.commit()
+        await db.refresh(job)
+        return job
+
+    async def get(self, db: AsyncSession, job_id: str, user_id: str) -> Optional[GenerationJob]:
+        return await db.scalar(
+            select(GenerationJob).where(
+                GenerationJob.id == job_id,
+                GenerationJob.user_id == user_id
+            )
+        )
+
+    def claim_statement(self, now: datetime):
+        return (
+            select(GenerationJob)
+            .where(or_(
+                GenerationJob.status == "queued",
+                and_(GenerationJob.status == "running", GenerationJob.locked_until < now)
+            ))
+            .order_by(GenerationJob.created_at)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+        )
+
+    async def claim(self, worker_id: str) -> Optional[ClaimedJob]:
+        """Take the next runnable job, or None when the queue is empty"""
+        async with self.session_factory() as db:
+            now = datetime.now(timezone.utc)
+            job = await db.scalar(self.claim_statement(now))
+            if job is None:
+                await db.rollback()
+                return None
+
+            if job.status == "queued" and job.created_at is not None:
+                job_queue_wait.observe((now - job.created_at).total_seconds())
+
+            job.status = "running"
+            job.attempts += 1
+            job.worker_id = worker_id
+            job.locked_until = now + timedelta(seconds=self.lease)
+            job.started_at = job.started_at or now
+            claimed = ClaimedJob(
+                id=job.id,
+                user_id=job.user_id,
+                request=job.request,
+                credits_reserved=job.credits_reserved,
+                attempts=job.attempts,
+                subscription_tier=job.subscription_tier
+            )
+            await db.commit()
+            return claimed
+
+    async def _update_held(self, job: ClaimedJob, holder: str, **values) -> bool:
+        """Update a job worker `holder` still holds; False if it lost the lease"""
+        async with self.session_factory() as db:
+            result = await db.execute(
+                update(GenerationJob)
+                .where(
+                    GenerationJob.id == job.id,
+                    GenerationJob.worker_id == holder,
+                    GenerationJob.status == "running"
+                )
+                .values(**values)
+            )
+            await db.commit()
+            return result.rowcount == 1
+
+    async def _finish(self, job: ClaimedJob, worker_id: str, **values) -> bool:
+        return await self._update_held(job, worker_id, worker_id=None, locked_until=None, **values)
+
+    async def renew(self, job: ClaimedJob, worker_id: str) -> bool:
+        """Extend this worker's lease on a running job; False if it lost it"""
+        return await self._update_held(
+            job, worker_id, locked_until=datetime.now(timezone.utc) + timedelta(seconds=self.lease)
+        )
+
+    async def prune(self) -> int:
+        """Delete jobs that finished more than `retention` ago, in batches"""
+        cutoff = datetime.now(timezone.utc) - self.retention
+        expired = (
+            select(GenerationJob.id)
+            .where(
+                GenerationJob.status.in_(("succeeded", "failed")),
+                GenerationJob.finished_at < cutoff
+            )
+            .limit(PRUNE_BATCH_SIZE)
+        )
+        deleted = 0
+        while True:
+            async with self.session_factory() as db:
+                result = await db.execute(
+                    delete(GenerationJob)
+                    .where(GenerationJob.id.in_(expired.scalar_subquery()))
+                    .execution_options(synchronize_session=False)
+                )
+                await db.commit()
+            deleted += result.rowcount
+            if result.rowcount < PRUNE_BATCH_SIZE:
+                return deleted
+
+    async def complete(self, job: ClaimedJob, worker_id: str, recipe_id: str) -> bool:
+        return await self._finish(
+            job, worker_id,
+            status="succeeded",
+            recipe_id=recipe_id,
+            finished_at=datetime.now(timezone.utc)
+        )
+
+    async def fail(self, job: ClaimedJob, worker_id: str, error: str) -> bool:
+        return await self._finish(
+            job, worker_id,
+            status="failed",
+            error=error,
+            finished_at=datetime.now(timezone.utc)
+        )
+
+    async def release(self, job: ClaimedJob, worker_id: str) -> bool:
+        """Put a job back in the queue for another attempt"""
+        return await self._finish(job, worker_id, status="queued")
+
+class GenerationWorkerPool:
+    """
+    Runs queued generations with `concurrency` workers in this process.
+
+    Each worker claims a job, runs RecipeGeneratorService.generate_recipe with
+    its own DB session and settles the credit reserved at enqueue time. The
+    job's lease is renewed every third of it while the generation runs; a
+    worker that loses the job (or cannot renew before the lease runs out)
+    cancels its generation before storing anything, leaving the job to the
+    worker that reclaimed it. Failed
+    attempts go back to the queue until the job runs out of attempts, at which
+    point the credit is refunded. Jobs interrupted by shutdown are released
+    for another process to pick up.
+    """
+
+    def __init__(self, queue: GenerationJobQueue, concurrency: int, poll_interval: float):
+        self.queue = queue
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self._prefix = f"{socket.gethostname()}:{os.getpid()}"
+        self._tasks: List[asyncio.Task] = []
+
+    async def run_once(self, worker_id: str) -> bool:
+        """Claim and run one job; returns False when there was nothing to do"""
+        job = await self.queue.claim(worker_id)
+        if job is None:
+            return False
+
+        if job.attempts > self.queue.max_attempts:
+            await self._give_up(job, worker_id, "Generation exceeded its retry budget")
+            return True
+
+        try:
+            request = RecipeGenerationRequest(**job.request)
+            recipe = await self._generate(job, worker_id, request)
+        except LeaseLost:
+            logger.warning(f"Generation job {job.id} was reclaimed; abandoned attempt {job.attempts}")
+            jobs_finished.inc(outcome="abandoned")
+            return True
+        except asyncio.CancelledError:
+            await self.queue.release(job, worker_id)
+            raise
+        except Exception as e:
+            logger.error(f"Generation job {job.id} attempt {job.attempts} failed: {e}")
+            if job.attempts < self.queue.max_attempts:
+                await self.queue.release(job, worker_id)
+                jobs_finished.inc(outcome="retried")
+            else:
+                await self._give_up(job, worker_id, "Failed to generate recipe")
+            return True
+
+        if await self.queue.complete(job, worker_id, recipe.id):
+            await credit_ledger.commit(job.reservation)
+            jobs_finished.inc(outcome="succeeded")
+        else:
+            logger.warning(f"Generation job {job.id} was reclaimed before it finished")
+        return True
+
+    async def _generate(self, job: ClaimedJob, worker_id: str, request: RecipeGenerationRequest):
+        """Generate and store the job's recipe while holding its lease; LeaseLost once it is gone"""
+        async def generate():
+            async with self.queue.session_factory() as db:
+                # The enqueuing user's tier, so the job is routed, served and billed as it would be inline
+                service = RecipeGeneratorService(db, subscription_tier=job.subscription_tier, background=True)
+                return await service.generate_recipe(request, job.user_id)
+
+        generation = asyncio.create_task(generate())
+        heartbeat = asyncio.create_task(self._heartbeat(job, worker_id))
+        try:
+            await asyncio.wait({generation, heartbeat}, return_when=asyncio.FIRST_COMPLETED)
+            if generation.done():
+                return generation.result()
+            return heartbeat.result()  # Only ever raises LeaseLost
+        finally:
+            generation.cancel()
+            heartbeat.cancel()
+            await asyncio.gather(generation, heartbeat, return_exceptions=True)
+
+    async def _heartbeat(self, job: ClaimedJob, worker_id: str) -> None:
+        held_until = time.monotonic() + self.queue.lease
+        while True:
+            await asyncio.sleep(self.queue.lease / 3)
+            try:
+                renewed = await self.queue.renew(job, worker_id)
+            except Exception as e:
+                if time.monotonic() >= held_until:
+                    raise LeaseLost(job.id) from e
+                logger.warning(f"Failed to renew the lease of generation job {job.id}: {e}")
+                continue
+            if not renewed:
+                raise LeaseLost(job.id)
+            held_until = time.monotonic() + self.queue.lease
+
+    async def _give_up(self, job: ClaimedJob, worker_id: str, error: str) -> None:
+        if await self.queue.fail(job, worker_id, error):
+            await credit_ledger.refund(job.reservation)
+            jobs_finished.inc(outcome="failed")
+
+    async def _worker(self, worker_id: str) -> None:
+        while True:
+            try:
+                if await self.run_once(worker_id):
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Generation worker {worker_id} error: {e}")
+            await asyncio.sleep(self.poll_interval)
+
+    async def _prune(self) -> None:
+        while True:
+            try:
+                deleted = await self.queue.prune()
+                if deleted:
+                    jobs_pruned.inc(deleted)
+                    logger.info(f"Pruned {deleted} finished generation jobs")
+            except Exception as e:
+                logger.error(f"Generation job pruning failed: {e}")
+            await asyncio.sleep(PRUNE_INTERVAL)
+
+    def start(self) -> None:
+        if not self._tasks and self.concurrency:
+            self._tasks = [
+                asyncio.create_task(self._worker(f"{self._prefix}:{i}"))
+                for i in range(self.concurrency)
+            ]
+            self._tasks.append(asyncio.create_task(self._prune()))
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+generation_queue = GenerationJobQueue()
+generation_workers = GenerationWorkerPool(
+    generation_queue,
+    concurrency=settings.GENERATION_WORKERS,
+    poll_interval=settings.GENERATION_JOB_POLL_INTERVAL
+)
+
+async def run_workers() -> None:
+    """Run a dedicated worker process: python -m app.services.generation_queue"""
+    async with redis:
+        llm_ledger.start()
+        recipe_library.start()
+        generation_workers.start()
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await generation_workers.stop()
+            await llm_ledger.stop()
+            await recipe_library.stop()
+            await close_openai_client()
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    asyncio.run(run_workers())
@@ -1,10 +1,12 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Dict, List
 from datetime import datetime, timedelta
 import logging
 from uuid import uuid4
 
-from app.database.models import Recipe as DBRecipe, MealPlan as DBMealPlan, MealPlanDay as DBMealPlanDay
+from app.database.models import Recipe as DBRecipe
+from app.models.meal_plans import MealPlan as DBMealPlan, MealPlanDay as DBMealPlanDay
 from app.schemas.meal_plans import MealPlan as MealPlanSchema
 from app.schemas.recipes import Recipe as RecipeSchema
 from app.services.recipe_generator import RecipeGeneratorService
@@ -12,7 +14,7 @@ from app.services.recipe_generator import RecipeGeneratorService
 logger = logging.getLogger(__name__)
 
 class MealPlanGenerator:
-    def __init__(self, db: Session):
+    def __init__(self, db: AsyncSession):
         self.db = db
         self.recipe_generator = RecipeGeneratorService(db)
 
@@ -38,7 +40,7 @@ class MealPlanGenerator:
                 
                 # Generate meals considering inventory
                 for meal_type in ['breakfast', 'lunch', 'dinner']:
-                    suitable_recipes = self._get_suitable_recipes(
+                    suitable_recipes = await self._get_suitable_recipes(
                         meal_type=meal_type,
                         inventory=inventory
                     )
@@ -66,27 +68,27 @@ class MealPlanGenerator:
             meal_plan.generation_status = "completed"
             
             self.db.add(meal_plan)
-            self.db.commit()
-            self.db.refresh(meal_plan)
+            await self.db.commit()
+            await self.db.refresh(meal_plan, attribute_names=["days"])
             
             return MealPlanSchema.from_orm(meal_plan)
             
         except Exception as e:
             logger.error(f"Meal plan generation failed: {str(e)}")
-            self.db.rollback()
+            await self.db.rollback()
             raise
 
-    def _get_suitable_recipes(
+    async def _get_suitable_recipes(
         self,
         meal_type: str,
         inventory: Dict[str, float]
     ) -> List[DBRecipe]:
         """Get recipes suitable for the meal type and available ingredients"""
-        query = self.db.query(DBRecipe).filter(
+        query = select(DBRecipe).where(
             DBRecipe.meal_type == meal_type
         )
         
-        return query.all()
+        return (await self.db.scalars(query)).all()
 
     def _optimize_ingredient_usage(self, 
         available_recipes: List[DBRecipe], 
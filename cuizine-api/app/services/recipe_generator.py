@@ -1,100 +1,305 @@
-from typing import Dict, Any, Optional
-from sqlalchemy.orm import Session
+from typing import Dict, Any, AsyncIterator, List, Optional
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.database import release_connection
 from app.core.openai_manager import OpenAIManager
-from app.models.recipes import Recipe, Tag, UserPreferences
+from app.utils.json_stream import JSONStreamEvent
+from app.models.recipes import Recipe
+from app.database.models import Tag, UserPreferences
+from app.services.recipe_library import recipe_library
 from app.schemas.recipes import ( 
     Recipe as RecipeSchema,
+    GeneratedRecipe,
     RecipeGenerationRequest,
     IngredientSchema,
     InstructionSchema
 )
+from dataclasses import dataclass
+import asyncio
 import logging
+import time
 from uuid import uuid4
 
 logger = logging.getLogger(__name__)
 
+# Content a library recipe hands on to the copy stored for the user it is served to
+LIBRARY_COPIED_COLUMNS = (
+    "title", "description", "difficulty_level", "prep_time", "cook_time", "total_time", "servings",
+    "cuisine_type", "meal_type", "cooking_style", "preparation_method", "is_spicy", "ingredients",
+    "instructions", "equipment_needed", "nutritional_info", "dietary_info", "recipe_tips",
+    "storage_instructions", "scaling_notes", "leftover_ideas"
+)
+
+@dataclass
+class BatchItemResult:
+    index: int  # Position in the submitted batch
+    db_recipe: Optional[Recipe] = None
+    recipe: Optional[RecipeSchema] = None
+    error: Optional[str] = None
+
 class RecipeGeneratorService:
-    def __init__(self, db: Session):
+    def __init__(self, db: AsyncSession, subscription_tier: str = "free", background: bool = False):
         self.db = db
         self.openai = OpenAIManager()
+        # Scheduling for OpenAI capacity: tier sets priority, background work is never shed
+        self.subscription_tier = subscription_tier
+        self.background = background
 
     async def generate_recipe(
         self,
         request: RecipeGenerationRequest,
         user_id: str
     ) -> RecipeSchema:
-        """Generate a new recipe based on user requirements"""
+        """
+        Generate a new recipe based on user requirements.
+
+        A stored recipe from the library that matches the request closely
+        enough is served instead, without a completion, as a copy owned by
+        this user (see `_serve_from_library`). The session's
+        connection is returned to the pool for the length of the completion
+        and checked out again to store the recipe.
+        """
         try:
-            user_prefs = self._get_user_preferences(user_id)
-            generation_params = self._prepare_generation_params(request, user_prefs)
-            recipe_data = await self.openai.generate_recipe(generation_params)
-            
-            # Convert raw ingredients and instructions to schemas for validation
-            ingredients = [IngredientSchema(**ing) for ing in recipe_data["ingredients"]]
-            instructions = [InstructionSchema(**inst) for inst in recipe_data["instructions"]]
-            
-            # Store validated data
-            db_recipe = self._store_recipe(
-                {
-                    **recipe_data,
-                    "ingredients": [ing.dict() for ing in ingredients],
-                    "instructions": [inst.dict() for inst in instructions]
-                },
-                user_id,
-                request
-            )
-            
-            # Convert to response schema using new from_db_model method
-            return RecipeSchema.from_db_model(db_recipe)
+            user_prefs = await self._get_user_preferences(user_id)
+            generation_params = self._prepare_generation_params(request, user_prefs, user_id)
+            served = await self._serve_from_library(generation_params, request, user_id)
+            if served is not None:
+                return served
+            await release_connection(self.db)
+            generated = await self.openai.generate_recipe(generation_params)
+            return await self._save_recipe(generated, user_id, request)
             
         except Exception as e:
             logger.error(f"Recipe generation failed: {str(e)}")
             raise
 
-    # _get_user_preferences and _prepare_generation_params remain the same
+    async def stream_recipe(
+        self,
+        request: RecipeGenerationRequest,
+        user_id: str
+    ) -> AsyncIterator[JSONStreamEvent]:
+        """
+        Stream a new recipe as it is generated.
+
+        Parse events are passed through as they arrive; the recipe is stored
+        only once the stream has finished, and the final "complete" event
+        carries the stored recipe schema.
+        """
+        user_prefs = await self._get_user_preferences(user_id)
+        generation_params = self._prepare_generation_params(request, user_prefs, user_id)
+        await release_connection(self.db)
+
+        async for event in self.openai.stream_recipe(generation_params):
+            if event.kind == "complete":
+                event = JSONStreamEvent(
+                    "complete", event.key, await self._save_recipe(event.value, user_id, request)
+                )
+            yield event
+
+    async def generate_batch(
+        self,
+        requests: List[RecipeGenerationRequest],
+        user_id: str,
+        concurrency: int
+    ) -> AsyncIterator[BatchItemResult]:
+        """
+        Generate several recipes with at most `concurrency` completions in flight.
+
+        Results are yielded as each generation finishes, in completion order.
+        A recipe is stored before its result is yielded, so whatever the
+        consumer has seen is saved even if it stops early; one that fails to
+        insert is yielded as a failure.
+        """
+        user_prefs = await self._get_user_preferences(user_id)
+        await release_connection(self.db)
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def run(index: int, request: RecipeGenerationRequest) -> BatchItemResult:
+            async with semaphore:
+                try:
+                    generated = await self.openai.generate_recipe(
+                        self._prepare_generation_params(request, user_prefs, user_id)
+                    )
+                    db_recipe = self._build_recipe(generated, user_id, request)
+                    return BatchItemResult(
+                        index, db_recipe, RecipeSchema.from_generated(db_recipe, generated)
+                    )
+                except Exception as e:
+                    logger.error(f"Batch recipe {index} failed: {str(e)}")
+                    return BatchItemResult(index, error=str(e))
+
+        tasks = [asyncio.create_task(run(i, r)) for i, r in enumerate(requests)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                result = await next_done
+                if result.db_recipe is not None:
+                    result = await self._store_batch_result(result)
+                yield result
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _store_batch_result(self, result: BatchItemResult) -> BatchItemResult:
+        try:
+            await self._persist(result.db_recipe)
+        except Exception as e:
+            logger.error(f"Failed to store batch recipe {result.index}: {str(e)}")
+            await self.db.rollback()
+            return BatchItemResult(result.index, error=str(e))
+        return result
 
-    def _store_recipe(
+    async def _save_recipe(
         self,
-        recipe_data: Dict[str, Any],
+        generated: GeneratedRecipe,
+        user_id: str,
+        request: RecipeGenerationRequest
+    ) -> RecipeSchema:
+        """Store a generated recipe and return its schema"""
+        db_recipe = await self._store_recipe(generated, user_id, request)
+        
+        # The output was validated when it was parsed; build the response from it as is
+        return RecipeSchema.from_generated(db_recipe, generated)
+
+    async def _serve_from_library(
+        self,
+        parameters: Dict[str, Any],
+        request: RecipeGenerationRequest,
+        user_id: str
+    ) -> Optional[RecipeSchema]:
+        """
+        A stored recipe matching the request, if the library may answer it.
+
+        The user gets a copy of the matched recipe as their own: a new row
+        with source_type "library", created by them and generated_from their
+        request, so it is listed, regenerated and deleted like a generation.
+        The original and its author's stats are left alone, and copies are
+        never indexed, so the library only ever serves AI originals.
+        """
+        if not recipe_library.serves(parameters):
+            return None
+        started = time.monotonic()
+        match = recipe_library.match(parameters, max_time=request.max_time, exclude_user=user_id)
+        original = await self.db.get(Recipe, match[0]) if match else None
+        if match and original is None:
+            recipe_library.discard(match[0])  # Deleted since it was indexed
+        if original is None:
+            recipe_library.record_lookup(parameters, "miss", time.monotonic() - started)
+            return None
+
+        recipe = Recipe(
+            id=str(uuid4()),
+            **{column: getattr(original, column) for column in LIBRARY_COPIED_COLUMNS},
+            source_type="library",
+            generated_from=request.model_dump(mode="json"),
+            creator_user_id=user_id
+        )
+        self.db.add(recipe)
+        await self.db.commit()
+
+        recipe_library.record_lookup(parameters, "served", time.monotonic() - started)
+        logger.info(
+            f"Served library recipe {original.id} (score {match[1]:.2f}) to user {user_id} as {recipe.id}"
+        )
+        return RecipeSchema.from_db_model(recipe)
+
+    async def _get_user_preferences(self, user_id: str) -> Optional[UserPreferences]:
+        """Get stored preferences for a user, if any"""
+        return await self.db.scalar(
+            select(UserPreferences).where(UserPreferences.user_id == user_id)
+        )
+
+    def _prepare_generation_params(
+        self,
+        request: RecipeGenerationRequest,
+        user_prefs: Optional[UserPreferences],
+        user_id: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Map the request and stored preferences onto prompt parameters"""
+        dietary_restrictions = list(request.dietary_restrictions)
+        if user_prefs and user_prefs.dietary_restrictions:
+            dietary_restrictions.extend(
+                r for r in user_prefs.dietary_restrictions if r not in dietary_restrictions
+            )
+
+        return {
+            "recipe_type": request.recipe_type,
+            "selected_ingredients": request.ingredients,
+            "meal_type": request.meal_type,
+            "cuisine": request.cuisine_type,
+            "dietary_restrictions": dietary_restrictions,
+            "servings": request.servings,
+            "is_spicy": request.is_spicy,
+            "fresh": request.fresh,
+            "subscription_tier": self.subscription_tier,
+            "background": self.background,
+            "user_id": user_id  # Attribution in the LLM call ledger; not part of the prompt
+        }
+
+    async def get_recipe_parameters(self, recipe_id: str) -> Optional[Dict[str, Any]]:
+        """Get the request a recipe was generated from"""
+        recipe = await self.db.get(Recipe, recipe_id)
+        if not recipe or not recipe.generated_from:
+            return None
+        return recipe.generated_from
+
+    async def _store_recipe(
+        self,
+        generated: GeneratedRecipe,
         user_id: str,
         original_request: RecipeGenerationRequest
     ) -> Recipe:
         """Store generated recipe in database"""
+        recipe = self._build_recipe(generated, user_id, original_request)
+        await self._persist(recipe)
+        return recipe
+
+    async def _persist(self, recipe: Recipe) -> None:
+        """Insert a built recipe and make it available to the library"""
+        self.db.add(recipe)
+        await self.db.commit()
+        recipe_library.add(recipe)
+
+    def _build_recipe(
+        self,
+        generated: GeneratedRecipe,
+        user_id: str,
+        original_request: RecipeGenerationRequest
+    ) -> Recipe:
+        """Build an unsaved recipe row from validated model output"""
+        # One JSON-mode dump gives the column-ready lists (Decimal amounts become strings)
+        components = generated.model_dump(mode="json", include={"ingredients", "instructions"})
+        
         recipe = Recipe(
             id=str(uuid4()),
-            title=recipe_data["title"],
-            description=recipe_data["description"],
-            prep_time=recipe_data["prep_time"],
-            cook_time=recipe_data["cook_time"],
-            total_time=recipe_data["prep_time"] + recipe_data["cook_time"],
-            servings=recipe_data["servings"],
-            difficulty_level=recipe_data["difficulty_level"],
-            cuisine_type=recipe_data.get("cuisine_type", []),
-            meal_type=recipe_data.get("meal_type"),
+            title=generated.title,
+            description=generated.description,
+            prep_time=generated.prep_time,
+            cook_time=generated.cook_time,
+            total_time=generated.prep_time + generated.cook_time,
+            servings=generated.servings,
+            difficulty_level=generated.difficulty_level,
+            cuisine_type=generated.cuisine_type,
+            meal_type=generated.meal_type,
             cooking_style=original_request.cooking_style,
             is_spicy=original_request.is_spicy,
-            ingredients=recipe_data["ingredients"],  # Now validated via IngredientSchema
-            instructions=recipe_data["instructions"],  # Now validated via InstructionSchema
-            nutritional_info=recipe_data["nutritional_info"],
-            equipment_needed=recipe_data.get("equipment_needed", []),
-            dietary_info=recipe_data.get("dietary_info", {}),
-            recipe_tips=recipe_data.get("recipe_tips", []),
-            storage_instructions=recipe_data.get("storage_instructions"),
-            leftover_ideas=recipe_data.get("leftover_ideas", []),
+            ingredients=components["ingredients"],
+            instructions=components["instructions"],
+            nutritional_info=generated.nutritional_info,
+            equipment_needed=generated.equipment_needed,
+            dietary_info=generated.dietary_info,
+            recipe_tips=generated.recipe_tips,
+            storage_instructions=generated.storage_instructions,
+            leftover_ideas=generated.leftover_ideas,
             source_type="ai",
-            generated_from=original_request.dict(),
+            generated_from=original_request.model_dump(mode="json"),
             creator_user_id=user_id
         )
         
-        self._add_recipe_tags(recipe, recipe_data)
-        
-        self.db.add(recipe)
-        self.db.commit()
-        self.db.refresh(recipe)
+        self._add_recipe_tags(recipe, generated)
         
         return recipe
 
-    def _add_recipe_tags(self, recipe: Recipe, recipe_data: Dict[str, Any]) -> None:
+    def _add_recipe_tags(self, recipe: Recipe, generated: GeneratedRecipe) -> None:
         """Add tags to recipe"""
         # Method remains the same
         ...
@@ -102,7 +307,7 @@ class RecipeGeneratorService:
     async def get_recipe(self, recipe_id: str) -> Optional[RecipeSchema]:
         """Get a recipe by ID"""
         try:
-            recipe = self.db.query(Recipe).filter(Recipe.id == recipe_id).first()
+            recipe = await self.db.get(Recipe, recipe_id)
             if not recipe:
                 return None
             return RecipeSchema.from_db_model(recipe)
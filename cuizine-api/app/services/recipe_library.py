@@ -0,0 +1,331 @@
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.core.openai_manager import completion_latency
+from app.models.recipes import Recipe
+from app.monitoring.llm_ledger import llm_ledger
+from app.monitoring.metrics import metrics
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime
+from sqlalchemy import desc, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import load_only
+from typing import Any, Callable, Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+import asyncio
+import itertools
+import logging
+import random
+import re
+
+logger = logging.getLogger(__name__)
+
+library_lookups = metrics.counter(
+    "recipe_library_lookups", "Library lookups before a generation, by tier, recipe_type and outcome"
+)
+library_lookup_seconds = metrics.histogram(
+    "recipe_library_lookup_seconds", "Time to find and load a library recipe",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25)
+)
+library_saved_seconds = metrics.counter(
+    "recipe_library_saved_seconds", "Estimated generation time saved by serving library recipes"
+)
+library_size = metrics.gauge(
+    "recipe_library_size", "Recipes in the in-process library index"
+)
+
+# Share of the match score per feature; dietary needs, spiciness, servings and time are hard filters
+INGREDIENT_WEIGHT = 0.7
+CUISINE_WEIGHT = 0.15
+MEAL_TYPE_WEIGHT = 0.15
+
+# Entries scored for a request naming no ingredients, newest first; the rest are never looked at
+UNFILTERED_SCAN = 1000
+
+# Only what LibraryEntry.from_row reads is loaded when (re)building the index
+INDEXED_COLUMNS = (
+    Recipe.id, Recipe.ingredients, Recipe.generated_from, Recipe.cuisine_type, Recipe.meal_type,
+    Recipe.dietary_info, Recipe.servings, Recipe.total_time, Recipe.is_spicy,
+    Recipe.creator_user_id, Recipe.created_at
+)
+
+_WORD = re.compile(r"[a-z]+")
+
+def _tokens(text: str) -> FrozenSet[str]:
+    """Words of an ingredient name with a naive plural strip, so "tomatoes" matches "tomato" """
+    words = set()
+    for word in _WORD.findall(text.casefold()):
+        if len(word) > 3 and word.endswith("es") and word[-3] in "hosx":
+            word = word[:-2]
+        elif len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        words.add(word)
+    return frozenset(words)
+
+def _label(value: Any) -> str:
+    return re.sub(r"[\s-]+", "_", str(value).strip().casefold())
+
+@dataclass(frozen=True)
+class LibraryEntry:
+    recipe_id: str
+    ingredients: Tuple[FrozenSet[str], ...]  # Token set per ingredient
+    cuisines: FrozenSet[str]
+    meal_type: Optional[str]
+    dietary: FrozenSet[str]  # Restrictions it was generated for plus flags set in dietary_info
+    servings: Optional[int]
+    total_time: Optional[int]
+    is_spicy: bool
+    creator_user_id: Optional[str]
+
+    @classmethod
+    def from_row(cls, recipe: Recipe) -> "LibraryEntry":
+        requested = recipe.generated_from or {}
+        dietary = {_label(r) for r in requested.get("dietary_restrictions") or []}
+        dietary.update(_label(k) for k, v in (recipe.dietary_info or {}).items() if v is True)
+        items = [i.get("item", "") for i in recipe.ingredients or [] if isinstance(i, dict)]
+        # Compact output leaves cuisine and meal type unset, so fall back to what was asked for
+        cuisines = recipe.cuisine_type or requested.get("cuisine_type") or []
+        meal_type = recipe.meal_type or requested.get("meal_type")
+        return cls(
+            recipe_id=recipe.id,
+            ingredients=tuple(t for t in map(_tokens, items) if t),
+            cuisines=frozenset(_label(c) for c in ([cuisines] if isinstance(cuisines, str) else cuisines)),
+            meal_type=_label(meal_type) if meal_type else None,
+            dietary=frozenset(dietary),
+            servings=recipe.servings,
+            total_time=recipe.total_time,
+            is_spicy=bool(recipe.is_spicy),
+            creator_user_id=recipe.creator_user_id
+        )
+
+    def covers(self, ingredient: FrozenSet[str]) -> bool:
+        return any(ingredient <= own for own in self.ingredients)
+
+@dataclass(frozen=True)
+class LibraryQuery:
+    """Generation parameters normalised once per lookup"""
+    ingredients: Tuple[FrozenSet[str], ...]
+    cuisine: Optional[str]
+    meal_type: Optional[str]
+    dietary: FrozenSet[str]
+    servings: int
+    is_spicy: bool
+    max_time: Optional[int]
+
+    @classmethod
+    def from_parameters(cls, parameters: Dict[str, Any], max_time: Optional[int] = None) -> "LibraryQuery":
+        cuisine = parameters.get("cuisine")
+        meal_type = parameters.get("meal_type")
+        return cls(
+            ingredients=tuple(t for t in map(_tokens, parameters.get("selected_ingredients") or []) if t),
+            cuisine=_label(cuisine) if cuisine else None,
+            meal_type=_label(meal_type) if meal_type else None,
+            dietary=frozenset(_label(r) for r in parameters.get("dietary_restrictions") or []),
+            servings=int(parameters.get("servings") or 2),
+            is_spicy=bool(parameters.get("is_spicy")),
+            max_time=max_time
+        )
+
+class RecipeLibrary:
+    """
+    In-process index of stored AI recipes, consulted before paying for a generation.
+
+    Entries are keyed by ingredient word, so a lookup only scores recipes
+    sharing a word with the request. Dietary restrictions, spiciness,
+    servings and `max_time` must be met outright; the score then weighs the
+    share of requested ingredients the recipe uses, and whether cuisine and
+    meal type match when they were asked for. A recipe scoring at least
+    `min_score` may be served; one of the best `top_k` is picked at random
+    so repeated requests do not all get the same dish.
+
+    Only requests from `tiers` for `recipe_types` are looked up, and never
+    ones asking for a `fresh` generation. The index holds the newest
+    `max_entries` AI recipes, which bounds both its memory and the scoring
+    done on the event loop per lookup; requests without ingredients score
+    only the newest UNFILTERED_SCAN. It is loaded on start and then picks up
+    new rows every `refresh_interval` seconds, dropping the oldest; recipes
+    generated by this worker are added as they are stored.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], AsyncSession] = SessionLocal,
+        min_score: float = settings.RECIPE_LIBRARY_MIN_SCORE,
+        top_k: int = settings.RECIPE_LIBRARY_TOP_K,
+        refresh_interval: float = settings.RECIPE_LIBRARY_REFRESH_INTERVAL,
+        tiers: Iterable[str] = settings.RECIPE_LIBRARY_TIERS,
+        recipe_types: Iterable[str] = settings.RECIPE_LIBRARY_RECIPE_TYPES,
+        enabled: bool = settings.RECIPE_LIBRARY_ENABLED,
+        max_entries: int = settings.RECIPE_LIBRARY_MAX_ENTRIES
+    ):
+        self.session_factory = session_factory
+        self.tiers = frozenset(tiers)
+        self.recipe_types = frozenset(recipe_types)
+        self.enabled = enabled
+        self.min_score = min_score
+        self.top_k = top_k
+        self.refresh_interval = refresh_interval
+        self.max_entries = max_entries
+        self._entries: Dict[str, LibraryEntry] = {}  # Oldest first
+        self._by_word: Dict[str, Set[str]] = defaultdict(set)
+        self._loaded_until: Optional[datetime] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def add(self, recipe: Recipe) -> None:
+        if not self.enabled:
+            return
+        entry = LibraryEntry.from_row(recipe)
+        self.discard(entry.recipe_id)
+        self._entries[entry.recipe_id] = entry
+        for ingredient in entry.ingredients:
+            for word in ingredient:
+                self._by_word[word].add(entry.recipe_id)
+        while len(self._entries) > self.max_entries:
+            self.discard(next(iter(self._entries)))
+        library_size.set(len(self._entries))
+
+    def discard(self, recipe_id: str) -> None:
+        entry = self._entries.pop(recipe_id, None)
+        if entry is None:
+            return
+        for ingredient in entry.ingredients:
+            for word in ingredient:
+                ids = self._by_word.get(word)
+                if ids is not None:
+                    ids.discard(recipe_id)
+                    if not ids:
+                        del self._by_word[word]
+        library_size.set(len(self._entries))
+
+    def score(self, entry: LibraryEntry, query: "LibraryQuery") -> float:
+        """Match score in [0, 1]; 0 when a hard requirement is not met"""
+        if not query.dietary <= entry.dietary:
+            return 0.0
+        if query.is_spicy != entry.is_spicy or query.servings != entry.servings:
+            return 0.0
+        if query.max_time is not None and (entry.total_time is None or entry.total_time > query.max_time):
+            return 0.0
+
+        wanted = query.ingredients
+        coverage = sum(1 for w in wanted if entry.covers(w)) / len(wanted) if wanted else 1.0
+        return (
+            INGREDIENT_WEIGHT * coverage
+            + CUISINE_WEIGHT * (query.cuisine is None or query.cuisine in entry.cuisines)
+            + MEAL_TYPE_WEIGHT * (query.meal_type is None or query.meal_type == entry.meal_type)
+        )
+
+    def match(
+        self,
+        parameters: Dict[str, Any],
+        max_time: Optional[int] = None,
+        exclude_user: Optional[str] = None
+    ) -> Optional[Tuple[str, float]]:
+        """A (recipe_id, score) good enough to serve for these generation parameters"""
+        query = LibraryQuery.from_parameters(parameters, max_time)
+        if query.ingredients:
+            candidates = set()
+            for ingredient in query.ingredients:
+                for word in ingredient:
+                    candidates.update(self._by_word.get(word, ()))
+        else:
+            candidates = itertools.islice(reversed(self._entries), UNFILTERED_SCAN)
+
+        scored = []
+        for recipe_id in candidates:
+            entry = self._entries[recipe_id]
+            if exclude_user is not None and entry.creator_user_id == exclude_user:
+                continue  # Never hand users back their own recipe as a new one
+            score = self.score(entry, query)
+            if score >= self.min_score:
+                scored.append((score, recipe_id))
+        if not scored:
+            return None
+        scored.sort(reverse=True)
+        score, recipe_id = random.choice(scored[:self.top_k])
+        return recipe_id, score
+
+    def serves(self, parameters: Dict[str, Any]) -> bool:
+        """Whether this request may be answered from the library at all"""
+        return (
+            self.enabled
+            and not parameters.get("fresh")
+            and (parameters.get("subscription_tier") or "free") in self.tiers
+            and parameters.get("recipe_type") in self.recipe_types
+        )
+
+    def record_lookup(self, parameters: Dict[str, Any], outcome: str, elapsed: float) -> None:
+        tier = parameters.get("subscription_tier") or "free"
+        recipe_type = parameters.get("recipe_type") or "unknown"
+        library_lookups.inc(tier=tier, recipe_type=recipe_type, outcome=outcome)
+        if outcome != "served":
+            return
+
+        library_lookup_seconds.observe(elapsed)
+        typical = completion_latency.percentile(0.5)
+        if typical is not None:
+            library_saved_seconds.inc(max(0.0, typical - elapsed), tier=tier)
+        # A generation answered without an LLM call still shows up in usage reports
+        llm_ledger.record(
+            user_id=parameters.get("user_id"),
+            subscription_tier=tier,
+            recipe_type=recipe_type,
+            model=None,
+            output_format=None,
+            cache="library",
+            status="ok",
+            streamed=False,
+            prompt_tokens=0,
+            completion_tokens=0,
+            retries=0,
+            queue_wait_ms=0,
+            first_token_ms=None,
+            latency_ms=round(elapsed * 1000)
+        )
+
+    async def _load(self, since: Optional[datetime]) -> List[Recipe]:
+        """The newest `max_entries` AI recipes stored since `since`, oldest first"""
+        statement = select(Recipe).options(load_only(*INDEXED_COLUMNS)).where(Recipe.source_type == "ai")
+        if since is not None:
+            # Rows sharing the last timestamp are read again; re-adding one is harmless
+            statement = statement.where(Recipe.created_at >= since)
+        statement = statement.order_by(desc(Recipe.created_at)).limit(self.max_entries)
+        async with self.session_factory() as db:
+            rows = (await db.scalars(statement)).all()
+            db.expunge_all()
+        return list(reversed(rows))
+
+    async def refresh(self) -> int:
+        """Index recipes stored since the last refresh (the newest `max_entries` the first time)"""
+        rows = await self._load(self._loaded_until)
+        for row in rows:
+            self.add(row)
+            if row.created_at is not None:
+                self._loaded_until = max(self._loaded_until or row.created_at, row.created_at)
+        return len(rows)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                added = await self.refresh()
+                if added:
+                    logger.info(f"Recipe library indexed {added} recipes ({len(self)} total)")
+            except Exception as e:
+                logger.error(f"Recipe library refresh failed: {e}")
+            await asyncio.sleep(self.refresh_interval)
+
+    def start(self) -> None:
+        if self._task is None and self.enabled:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+recipe_library = RecipeLibrary()
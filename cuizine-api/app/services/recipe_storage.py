@@ -1,46 +1,70 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import desc, or_
-from app.database.models import Recipe, Tag, RecipePhoto
+from sqlalchemy import ColumnElement, Text, desc, func, literal, literal_column, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.database.models import SEARCH_CONFIG, Recipe, Tag, RecipePhoto
+from app.schemas.recipes import RecipeLookupField
+from dataclasses import dataclass
 from typing import List, Optional, Dict, Any
 from datetime import datetime, timedelta
 import logging
 
 logger = logging.getLogger(__name__)
 
+INGREDIENT_ITEMS = literal_column("'$[*].item'::jsonpath")
+
+@dataclass
+class FuzzyMatch:
+    recipe_id: str
+    title: str
+    matched: str  # The title, or the ingredient closest to the query
+    score: float  # pg_trgm word similarity, 0-1
+
 class RecipeStorageService:
-    def __init__(self, db: Session):
+    def __init__(self, db: AsyncSession):
         self.db = db
 
-    def get_recipe(self, recipe_id: str) -> Optional[Recipe]:
+    async def get_recipe(self, recipe_id: str) -> Optional[Recipe]:
         """Get a recipe by ID"""
-        return self.db.query(Recipe).filter(Recipe.id == recipe_id).first()
+        return await self.db.get(Recipe, recipe_id)
 
-    def get_user_recipes(
+    async def get_user_recipes(
         self,
         user_id: str,
         skip: int = 0,
         limit: int = 20,
         filters: Optional[Dict[str, Any]] = None
     ) -> List[Recipe]:
-        """Get recipes for a user with filters"""
-        query = self.db.query(Recipe).filter(Recipe.creator_user_id == user_id)
+        """
+        Get recipes for a user with filters.
+
+        `title` and `ingredient` filters match fuzzily, so "zuchini" finds
+        zucchini recipes.
+        """
+        query = select(Recipe).where(Recipe.creator_user_id == user_id)
         
         if filters:
+            if filters.get('title'):
+                query = query.where(await self._similar_to(filters['title'], Recipe.title))
+            if filters.get('ingredient'):
+                query = query.where(
+                    await self._similar_to(filters['ingredient'], Recipe.__table__.c.ingredient_names)
+                )
             if filters.get('cuisine_type'):
-                query = query.filter(Recipe.cuisine_type.contains([filters['cuisine_type']]))
+                query = query.where(Recipe.cuisine_type.contains([filters['cuisine_type']]))
             if filters.get('meal_type'):
-                query = query.filter(Recipe.meal_type == filters['meal_type'])
+                query = query.where(Recipe.meal_type == filters['meal_type'])
             if filters.get('difficulty_level'):
-                query = query.filter(Recipe.difficulty_level == filters['difficulty_level'])
+                query = query.where(Recipe.difficulty_level == filters['difficulty_level'])
             if filters.get('max_time'):
-                query = query.filter(Recipe.total_time <= filters['max_time'])
+                query = query.where(Recipe.total_time <= filters['max_time'])
 
-        return query.order_by(desc(Recipe.created_at)).offset(skip).limit(limit).all()
+        query = query.order_by(desc(Recipe.created_at)).offset(skip).limit(limit)
+        return (await self.db.scalars(query)).all()
 
-    def save_recipe(self, recipe: Recipe) -> Recipe:
+    async def save_recipe(self, recipe: Recipe) -> Recipe:
         """Save or update a recipe"""
         if recipe.id:
-            existing = self.get_recipe(recipe.id)
+            existing = await self.get_recipe(recipe.id)
             if existing:
                 # Update existing recipe
                 for key, value in recipe.__dict__.items():
@@ -49,11 +73,11 @@ class RecipeStorageService:
                 recipe = existing
             
         self.db.add(recipe)
-        self.db.commit()
-        self.db.refresh(recipe)
+        await self.db.commit()
+        await self.db.refresh(recipe)
         return recipe
 
-    def add_recipe_photo(
+    async def add_recipe_photo(
         self,
         recipe_id: str,
         user_id: str,
@@ -69,37 +93,106 @@ class RecipeStorageService:
         )
         
         self.db.add(photo)
-        self.db.commit()
-        self.db.refresh(photo)
+        await self.db.commit()
+        await self.db.refresh(photo)
         return photo
 
-    def search_recipes(
+    async def search_recipes(
         self,
         query: str,
         filters: Optional[Dict[str, Any]] = None,
         skip: int = 0,
         limit: int = 20
     ) -> List[Recipe]:
-        """Search recipes with filters"""
-        search = self.db.query(Recipe)
+        """
+        Full-text search over title, ingredients, cuisine / meal type and
+        description, best matches first.
+
+        `query` takes web search syntax ("quoted phrases", or, -excluded) and
+        is matched against the GIN-indexed `search_vector`. A blank query
+        returns the newest recipes passing the filters.
+        """
+        search = select(Recipe)
+        order = [desc(Recipe.created_at)]
         
-        # Add search conditions
-        search = search.filter(
-            or_(
-                Recipe.title.ilike(f"%{query}%"),
-                Recipe.description.ilike(f"%{query}%")
-            )
-        )
+        if query.strip():
+            document = Recipe.__table__.c.search_vector
+            terms = func.websearch_to_tsquery(SEARCH_CONFIG, query)
+            search = search.where(document.op("@@")(terms))
+            order.insert(0, desc(func.ts_rank(document, terms)))
         
         if filters:
             # Apply filters
             for key, value in filters.items():
                 if hasattr(Recipe, key) and value is not None:
-                    search = search.filter(getattr(Recipe, key) == value)
+                    search = search.where(getattr(Recipe, key) == value)
                     
-        return search.order_by(desc(Recipe.created_at)).offset(skip).limit(limit).all()
+        search = search.order_by(*order).offset(skip).limit(limit)
+        return (await self.db.scalars(search)).all()
+
+    async def fuzzy_lookup(
+        self,
+        text: str,
+        field: RecipeLookupField = RecipeLookupField.TITLE,
+        limit: int = 10,
+        min_score: float = settings.FUZZY_MATCH_THRESHOLD
+    ) -> List[FuzzyMatch]:
+        """
+        Recipes with a title (or an ingredient) close to `text`, best first.
+
+        Scores are pg_trgm word similarity: how well `text` matches the
+        closest stretch of the title or ingredient list, so "parmesian"
+        scores high against "Roma tomatoes, parmesan, basil". Candidates come
+        from the trigram GIN index on that column; only the returned rows are
+        searched for the ingredient that matched.
+        """
+        if field is RecipeLookupField.INGREDIENT:
+            column = Recipe.__table__.c.ingredient_names
+        else:
+            column = Recipe.title
+        score = func.word_similarity(text, column)
+        candidates = (
+            select(Recipe.id, Recipe.title, Recipe.ingredients, score.label("score"))
+            .where(await self._similar_to(text, column, min_score))
+            .order_by(desc(score), Recipe.id)
+            .limit(limit)
+            .subquery()
+        )
+
+        matched = candidates.c.title
+        if field is RecipeLookupField.INGREDIENT:
+            item = func.jsonb_array_elements_text(
+                func.jsonb_path_query_array(candidates.c.ingredients, INGREDIENT_ITEMS)
+            ).table_valued("value").render_derived()
+            matched = (
+                select(item.c.value)
+                .order_by(desc(func.word_similarity(text, item.c.value)))
+                .limit(1)
+                .scalar_subquery()
+            )
+
+        rows = await self.db.execute(
+            select(candidates.c.id, candidates.c.title, matched, candidates.c.score)
+            .order_by(desc(candidates.c.score), candidates.c.id)
+        )
+        return [FuzzyMatch(recipe_id, title, best, score) for recipe_id, title, best, score in rows]
+
+    async def _similar_to(
+        self,
+        text: str,
+        column: ColumnElement,
+        min_score: float = settings.FUZZY_MATCH_THRESHOLD
+    ) -> ColumnElement:
+        """
+        A `text <% column` predicate, which the trigram indexes can answer.
+        The operator's cut-off is a setting, applied to this transaction only.
+        """
+        await self.db.execute(
+            select(func.set_config("pg_trgm.word_similarity_threshold", str(min_score), True))
+        )
+        return literal(text, Text).op("<%")(column)
 
-    def get_popular_recipes(
+    async def get_popular_recipes(
         self,
         limit: int = 10,
         timeframe_days: int = 30
@@ -107,19 +200,20 @@ class RecipeStorageService:
         """Get popular recipes within timeframe"""
         cutoff = datetime.now(datetime.UTC) - timedelta(days=timeframe_days)
         
-        return self.db.query(Recipe)\
-            .filter(Recipe.created_at >= cutoff)\
-            .order_by(desc(Recipe.view_count))\
-            .limit(limit)\
-            .all()
+        return (await self.db.scalars(
+            select(Recipe)
+            .where(Recipe.created_at >= cutoff)
+            .order_by(desc(Recipe.view_count))
+            .limit(limit)
+        )).all()
 
-    def delete_recipe(self, recipe_id: str, user_id: str) -> bool:
+    async def delete_recipe(self, recipe_id: str, user_id: str) -> bool:
         """Delete a recipe"""
-        recipe = self.get_recipe(recipe_id)
+        recipe = await self.get_recipe(recipe_id)
         
         if not recipe or recipe.creator_user_id != user_id:
             return False
             
-        self.db.delete(recipe)
-        self.db.commit()
+        await self.db.delete(recipe)
+        await self.db.commit()
         return True
\ No newline at end of file
@@ -1,6 +1,6 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.database.models import ShoppingList, Recipe
-from app.models.recipes import RecipeIngredient
 from typing import List, Dict, Any, Optional
 import logging
 from datetime import datetime
@@ -9,7 +9,7 @@ from uuid import uuid4
 logger = logging.getLogger(__name__)
 
 class ShoppingListService:
-    def __init__(self, db: Session):
+    def __init__(self, db: AsyncSession):
         self.db = db
 
     async def create_list_from_recipe(
@@ -20,7 +20,7 @@ class ShoppingListService:
     ) -> ShoppingList:
         """Create a shopping list from a recipe"""
         try:
-            recipe = self.db.query(Recipe).filter(Recipe.id == recipe_id).first()
+            recipe = await self.db.get(Recipe, recipe_id)
             if not recipe:
                 raise ValueError("Recipe not found")
 
@@ -43,14 +43,14 @@ class ShoppingListService:
             )
 
             self.db.add(shopping_list)
-            self.db.commit()
-            self.db.refresh(shopping_list)
+            await self.db.commit()
+            await self.db.refresh(shopping_list)
 
             return shopping_list
 
         except Exception as e:
             logger.error(f"Error creating shopping list: {str(e)}")
-            self.db.rollback()
+            await self.db.rollback()
             raise
 
     async def merge_lists(
@@ -62,10 +62,12 @@ class ShoppingListService:
         """Merge multiple shopping lists into one"""
         try:
             # Get all lists and verify ownership
-            lists = self.db.query(ShoppingList).filter(
-                ShoppingList.id.in_(list_ids),
-                ShoppingList.user_id == user_id
-            ).all()
+            lists = (await self.db.scalars(
+                select(ShoppingList).where(
+                    ShoppingList.id.in_(list_ids),
+                    ShoppingList.user_id == user_id
+                )
+            )).all()
 
             if len(lists) != len(list_ids):
                 raise ValueError("One or more lists not found or unauthorized")
@@ -90,14 +92,14 @@ class ShoppingListService:
             )
 
             self.db.add(merged_list)
-            self.db.commit()
-            self.db.refresh(merged_list)
+            await self.db.commit()
+            await self.db.refresh(merged_list)
 
             return merged_list
 
         except Exception as e:
             logger.error(f"Error merging shopping lists: {str(e)}")
-            self.db.rollback()
+            await self.db.rollback()
             raise
 
     def _process_recipe_ingredients(
@@ -148,12 +150,13 @@ class ShoppingListService:
         limit: int = 20
     ) -> List[ShoppingList]:
         """Get all shopping lists for a user"""
-        return self.db.query(ShoppingList)\
-            .filter(ShoppingList.user_id == user_id)\
-            .order_by(ShoppingList.created_at.desc())\
-            .offset(skip)\
-            .limit(limit)\
-            .all()
+        return (await self.db.scalars(
+            select(ShoppingList)
+            .where(ShoppingList.user_id == user_id)
+            .order_by(ShoppingList.created_at.desc())
+            .offset(skip)
+            .limit(limit)
+        )).all()
 
     async def update_list_items(
         self,
@@ -162,10 +165,12 @@ class ShoppingListService:
         updates: List[Dict[str, Any]]
     ) -> ShoppingList:
         """Update shopping list items"""
-        shopping_list = self.db.query(ShoppingList).filter(
-            ShoppingList.id == list_id,
-            ShoppingList.user_id == user_id
-        ).first()
+        shopping_list = await self.db.scalar(
+            select(ShoppingList).where(
+                ShoppingList.id == list_id,
+                ShoppingList.user_id == user_id
+            )
+        )
 
         if not shopping_list:
             raise ValueError("Shopping list not found or unauthorized")
@@ -182,17 +187,19 @@ class ShoppingListService:
         shopping_list.items = list(items_dict.values())
         shopping_list.updated_at = datetime.utcnow()
 
-        self.db.commit()
-        self.db.refresh(shopping_list)
+        await self.db.commit()
+        await self.db.refresh(shopping_list)
 
         return shopping_list
 
     async def delete_list(self, list_id: str, user_id: str) -> bool:
         """Delete a shopping list"""
-        result = self.db.query(ShoppingList).filter(
-            ShoppingList.id == list_id,
-            ShoppingList.user_id == user_id
-        ).delete()
+        result = await self.db.execute(
+            delete(ShoppingList).where(
+                ShoppingList.id == list_id,
+                ShoppingList.user_id == user_id
+            )
+        )
 
-        self.db.commit()
-        return result > 0
\ No newline at end of file
+        await self.db.commit()
+        return result.rowcount > 0
\ No newline at end of file
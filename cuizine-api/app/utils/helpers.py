@@ -0,0 +1,38 @@
+from starlette.requests import Request
+from typing import Any, Awaitable, TypeVar
+import asyncio
+import json
+
+T = TypeVar("T")
+
+class ClientDisconnected(Exception):
+    """The client went away before the response was ready"""
+
+def format_sse(event: str, data: Any) -> str:
+    """Encode one Server-Sent Events message with a JSON payload"""
+    payload = json.dumps(data, default=str)
+    return f"event: {event}\ndata: {payload}\n\n"
+
+async def cancel_on_disconnect(request: Request, work: Awaitable[T], poll_interval: float = 0.5) -> T:
+    """
+    Await `work` in its own task, cancelling it if the client disconnects.
+
+    The connection is checked every `poll_interval` seconds while the work
+    runs; a disconnect cancels the task, waits for it to unwind and raises
+    ClientDisconnected. Work that finished first always wins.
+    """
+    task = asyncio.ensure_future(work)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=poll_interval)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+                if not task.cancelled() and task.exception() is None:
+                    return task.result()
+                raise ClientDisconnected()
+    finally:
+        if not task.done():
+            task.cancel()
@@ -0,0 +1,116 @@
+from dataclasses import dataclass
+from typing import Any, Iterable, List, Optional
+import json
+
+@dataclass
+class JSONStreamEvent:
+    kind: str  # "field" for a completed top-level value, "item" for an array element, "complete" for the whole document
+    key: str
+    value: Any
+    index: Optional[int] = None
+
+class IncrementalJSONParser:
+    """
+    Incremental parser for a streamed top-level JSON object.
+
+    Feed it text as it arrives; it returns an event for every top-level field
+    whose value has been fully received and, for keys in `stream_arrays`, one
+    event per array element as soon as that element is complete. Streamed
+    arrays are not repeated as a field event. `result()` parses the whole
+    document once the stream has ended.
+    """
+
+    def __init__(self, stream_arrays: Iterable[str] = ()):
+        self.stream_arrays = set(stream_arrays)
+        self._text = ""
+        self._pos = 0
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escape = False
+        self._phase = "start"  # start -> key -> colon -> value -> ... -> done
+        self._key: Optional[str] = None
+        self._key_start = 0
+        self._value_start = 0
+        self._item_start: Optional[int] = None
+        self._item_index = 0
+
+    @property
+    def text(self) -> str:
+        """Everything fed so far"""
+        return self._text
+
+    @property
+    def done(self) -> bool:
+        return self._phase == "done"
+
+    def feed(self, chunk: str) -> List[JSONStreamEvent]:
+        self._text += chunk
+        events: List[JSONStreamEvent] = []
+        text = self._text
+
+        while self._pos < len(text):
+            i = self._pos
+            c = text[i]
+            self._pos += 1
+            depth = len(self._stack)
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    if depth == 1 and self._phase == "key":
+                        self._key = json.loads(text[self._key_start:i + 1])
+                        self._phase = "colon"
+                continue
+
+            if c == '"':
+                self._in_string = True
+                if depth == 1 and self._phase == "key":
+                    self._key_start = i
+            elif c == ":" and depth == 1 and self._phase == "colon":
+                self._phase = "value"
+                self._value_start = i + 1
+            elif c in "{[":
+                self._stack.append(c)
+                if depth == 0:
+                    self._phase = "key"
+                elif depth == 1 and c == "[" and self._key in self.stream_arrays:
+                    self._item_start = i + 1
+                    self._item_index = 0
+            elif c in "}]":
+                if depth == 2 and c == "]" and self._item_start is not None:
+                    self._emit_item(events, i)
+                    self._item_start = None
+                elif depth == 1 and self._phase == "value":
+                    self._emit_field(events, i)
+                self._stack.pop()
+                if depth == 1:
+                    self._phase = "done"
+            elif c == ",":
+                if depth == 1 and self._phase == "value":
+                    self._emit_field(events, i)
+                    self._phase = "key"
+                elif depth == 2 and self._item_start is not None:
+                    self._emit_item(events, i)
+                    self._item_start = i + 1
+
+        return events
+
+    def _emit_field(self, events: List[JSONStreamEvent], end: int) -> None:
+        if self._key in self.stream_arrays:
+            return
+        raw = self._text[self._value_start:end].strip()
+        if raw:
+            events.append(JSONStreamEvent("field", self._key, json.loads(raw)))
+
+    def _emit_item(self, events: List[JSONStreamEvent], end: int) -> None:
+        raw = self._text[self._item_start:end].strip()
+        if raw:
+            events.append(JSONStreamEvent("item", self._key, json.loads(raw), self._item_index))
+            self._item_index += 1
+
+    def result(self) -> Any:
+        return json.loads(self._text)
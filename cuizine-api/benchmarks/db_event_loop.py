@@ -0,0 +1,133 @@
+"""
+Concurrent request throughput with blocking Sessions versus AsyncSessions.
+
+Each simulated request runs one query that takes --latency-ms in the
+database, the way a slow recipe or ledger query would. In "sync" mode the
+query goes through a plain Session inside the coroutine, as the API did
+before the move to AsyncSession, so every query stalls the event loop. In
+"async" mode it goes through an AsyncSession and the loop keeps serving
+other requests while the query waits. Both modes use a pool of --pool-size
+connections. All requests arrive at once; reports wall time, requests per
+second and latency percentiles measured from their arrival.
+
+By default this uses a throwaway SQLite file with a `sleep(ms)` function
+registered on every connection (async mode needs aiosqlite installed). Pass
+--database-url to run against Postgres instead, where `pg_sleep` is used.
+
+Run from cuizine-api/:
+    python benchmarks/db_event_loop.py [--requests 200] [--concurrency 50]
+        [--latency-ms 20] [--pool-size 10] [--database-url postgresql://...]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, event, text  # noqa: E402
+from sqlalchemy.engine import make_url  # noqa: E402
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool  # noqa: E402
+from app.core.database import async_database_url  # noqa: E402
+
+def _register_sleep(dbapi_connection, connection_record) -> None:
+    # Under aiosqlite the function runs on the connection's own thread, off the event loop
+    dbapi_connection.create_function("sleep", 1, lambda ms: time.sleep(ms / 1000) or ms)
+
+def engines(database_url: str, pool_size: int):
+    """(sync engine, async engine, statement) for a URL"""
+    url = make_url(database_url)
+    options = {"pool_size": pool_size, "max_overflow": 0}
+    if url.get_backend_name() == "sqlite":
+        # SQLite dialects default to unbounded pools; bound both like a Postgres pool
+        sync_engine = create_engine(
+            url.set(drivername="sqlite+pysqlite"), poolclass=QueuePool, **options
+        )
+        async_engine = create_async_engine(
+            url.set(drivername="sqlite+aiosqlite"), poolclass=AsyncAdaptedQueuePool, **options
+        )
+        event.listen(sync_engine, "connect", _register_sleep)
+        event.listen(async_engine.sync_engine, "connect", _register_sleep)
+        return sync_engine, async_engine, text("SELECT sleep(:ms)")
+    sync_engine = create_engine(url, **options)
+    async_engine = create_async_engine(async_database_url(database_url), **options)
+    return sync_engine, async_engine, text("SELECT pg_sleep(:ms / 1000.0)")
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+async def drive(requests: int, concurrency: int, handler: Callable) -> Tuple[float, List[float]]:
+    gate = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+
+    started = time.monotonic()
+
+    async def one() -> None:
+        # Latency counts from the burst start, so time spent behind a blocked loop shows up
+        async with gate:
+            await handler()
+            latencies.append(time.monotonic() - started)
+
+    await asyncio.gather(*(one() for _ in range(requests)))
+    return time.monotonic() - started, latencies
+
+async def run(args: argparse.Namespace, database_url: str) -> Dict[str, Tuple[float, List[float]]]:
+    sync_engine, async_engine, statement = engines(database_url, args.pool_size)
+    params = {"ms": args.latency_ms}
+    SyncSession = sessionmaker(sync_engine)
+    AsyncSessionLocal = async_sessionmaker(async_engine)
+
+    async def sync_request() -> None:
+        with SyncSession() as db:
+            db.execute(statement, params)
+
+    async def async_request() -> None:
+        async with AsyncSessionLocal() as db:
+            await db.execute(statement, params)
+
+    results = {}
+    try:
+        for name, handler in (("sync", sync_request), ("async", async_request)):
+            await drive(args.pool_size, args.pool_size, handler)  # Open the pool's connections first
+            results[name] = await drive(args.requests, args.concurrency, handler)
+    finally:
+        sync_engine.dispose()
+        await async_engine.dispose()
+    return results
+
+def report(name: str, elapsed: float, latencies: List[float]) -> None:
+    print(
+        f"{name:>5}: {len(latencies)} requests in {elapsed:.2f}s "
+        f"({len(latencies) / elapsed:.0f} req/s), latency "
+        f"mean={statistics.mean(latencies) * 1000:.1f}ms "
+        f"p50={percentile(latencies, 0.5) * 1000:.1f}ms "
+        f"p99={percentile(latencies, 0.99) * 1000:.1f}ms"
+    )
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--latency-ms", type=int, default=20)
+    parser.add_argument("--pool-size", type=int, default=10)
+    parser.add_argument("--database-url", default="")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database_url = args.database_url or f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        results = await run(args, database_url)
+
+    for name, (elapsed, latencies) in results.items():
+        report(name, elapsed, latencies)
+    speedup = results["sync"][0] / results["async"][0]
+    print(f"async/sync throughput: {speedup:.1f}x")
+
+if __name__ == "__main__":
+    asyncio.run(main())
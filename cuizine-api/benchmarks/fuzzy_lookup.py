@@ -0,0 +1,115 @@
+"""
+Fuzzy recipe lookup on a seeded table: trigram indexes versus none.
+
+Seeds --rows synthetic recipes the way benchmarks/search_recipes.py does,
+applies migration 005 (the generated ingredient_names column and the
+pg_trgm GIN indexes on it and on title), reporting how long each step took,
+and times RecipeStorageService.fuzzy_lookup for misspelled titles and
+ingredients. Reports p50/p95 latency per lookup against the 20ms target and
+the best match found. With --no-index the indexes are skipped, to show the
+sequential scan they replace.
+
+Needs a Postgres DATABASE_URL (or --database-url) where pg_trgm can be
+created; everything happens in the --schema schema, which is dropped
+afterwards unless --keep is given.
+
+Run from cuizine-api/:
+    python benchmarks/fuzzy_lookup.py [--rows 1000000] [--repeat 20]
+        [--schema recipe_lookup_bench] [--keep] [--no-index] [--database-url postgresql://...]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text  # noqa: E402
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession  # noqa: E402
+from app.core.config import settings  # noqa: E402
+from app.database.models import RECIPE_INGREDIENT_NAMES_FUNCTION  # noqa: E402
+from app.schemas.recipes import RecipeLookupField  # noqa: E402
+from app.services.recipe_storage import RecipeStorageService  # noqa: E402
+from search_recipes import bench_engine, seed, timed  # noqa: E402
+
+TARGET_MS = 20
+
+LOOKUPS = [
+    (RecipeLookupField.TITLE, "chiken curry"),
+    (RecipeLookupField.TITLE, "risoto"),
+    (RecipeLookupField.TITLE, "smokey tacos"),
+    (RecipeLookupField.TITLE, "honey glazed salmon"),  # Spelled right
+    (RecipeLookupField.INGREDIENT, "parmesian"),
+    (RecipeLookupField.INGREDIENT, "zuchini"),
+    (RecipeLookupField.INGREDIENT, "chickpease"),
+    (RecipeLookupField.INGREDIENT, "shitake"),
+    (RecipeLookupField.INGREDIENT, "xyzzyq")         # No matches
+]
+
+async def migrate(engine: AsyncEngine, indexes: bool = True) -> None:
+    """The steps of migration 005, timed one by one"""
+    async def run(*statements: str) -> None:
+        async with engine.connect() as connection:
+            await connection.execution_options(isolation_level="AUTOCOMMIT")
+            for statement in statements:
+                await connection.execute(text(statement))
+
+    await run("CREATE EXTENSION IF NOT EXISTS pg_trgm", RECIPE_INGREDIENT_NAMES_FUNCTION)
+    await timed("backfill (ADD COLUMN ingredient_names)", run(
+        "ALTER TABLE recipes ADD COLUMN ingredient_names text "
+        "GENERATED ALWAYS AS (recipe_ingredient_names(ingredients)) STORED"
+    ))
+    if indexes:
+        await timed("title trigram index", run(
+            "CREATE INDEX CONCURRENTLY idx_recipes_title_trgm ON recipes USING gin (title gin_trgm_ops)"
+        ))
+        await timed("ingredient_names trigram index", run(
+            "CREATE INDEX CONCURRENTLY idx_recipes_ingredient_names_trgm "
+            "ON recipes USING gin (ingredient_names gin_trgm_ops)"
+        ))
+    await run("ANALYZE recipes")
+
+async def measure(engine: AsyncEngine, repeat: int) -> None:
+    print(f"\nfuzzy_lookup, word similarity >= {settings.FUZZY_MATCH_THRESHOLD}")
+    async with AsyncSession(engine) as db:
+        for field, query in LOOKUPS:
+            samples = []
+            for _ in range(repeat):
+                started = time.monotonic()
+                matches = await RecipeStorageService(db).fuzzy_lookup(query, field)
+                samples.append((time.monotonic() - started) * 1000)
+                await db.rollback()
+            samples.sort()
+            p95 = samples[min(len(samples) - 1, int(0.95 * len(samples)))]
+            best = f"{matches[0].matched!r} ({matches[0].score:.2f})" if matches else "-"
+            print(
+                f"  {field.value:>10} {query!r:22} {len(matches):>3} rows  "
+                f"p50={statistics.median(samples):7.1f}ms  p95={p95:7.1f}ms  "
+                f"{'ok  ' if p95 <= TARGET_MS else 'SLOW'}  best={best}"
+            )
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--schema", default="recipe_lookup_bench")
+    parser.add_argument("--keep", action="store_true", help="Keep the seeded schema")
+    parser.add_argument("--no-index", action="store_true", help="Skip the trigram indexes")
+    parser.add_argument("--database-url", default=settings.DATABASE_URL)
+    args = parser.parse_args()
+
+    engine = bench_engine(args.database_url, args.schema)
+    try:
+        await seed(engine, args.schema, args.rows)
+        await migrate(engine, indexes=not args.no_index)
+        await measure(engine, args.repeat)
+    finally:
+        if not args.keep:
+            async with engine.begin() as connection:
+                await connection.execute(text(f'DROP SCHEMA IF EXISTS "{args.schema}" CASCADE'))
+        await engine.dispose()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,115 @@
+"""
+Replay stored generation parameters against each recipe output format.
+
+Every parameter set is sent once per format, alternating formats so both see
+the same API conditions. Reports prompt tokens, completion tokens and latency
+per format, plus completions that failed validation.
+
+Parameters come from the `generated_from` column of recent AI recipes, or
+from a JSONL file of RecipeGenerationRequest bodies. This calls the real API
+(or --base-url) with the settings from the environment / .env.
+
+Run from cuizine-api/:
+    python benchmarks/replay_generations.py [--limit 50] [--file requests.jsonl]
+        [--formats verbose,compact] [--base-url http://localhost:8080/v1]
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+from typing import Any, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from openai import AsyncOpenAI  # noqa: E402
+from sqlalchemy import select  # noqa: E402
+from app.core.config import settings  # noqa: E402
+from app.core.database import SessionLocal  # noqa: E402
+from app.core.openai_manager import OpenAIManager  # noqa: E402
+from app.models.recipes import Recipe  # noqa: E402
+from app.schemas.recipes import RecipeGenerationRequest  # noqa: E402
+from app.services.recipe_generator import RecipeGeneratorService  # noqa: E402
+
+async def load_requests(path: str, limit: int) -> List[RecipeGenerationRequest]:
+    if path:
+        with open(path) as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+    else:
+        async with SessionLocal() as db:
+            rows = (await db.scalars(
+                select(Recipe.generated_from)
+                .where(Recipe.source_type == "ai", Recipe.generated_from.isnot(None))
+                .order_by(Recipe.created_at.desc())
+                .limit(limit)
+            )).all()
+    return [RecipeGenerationRequest(**row) for row in rows[:limit]]
+
+async def replay(manager: OpenAIManager, parameters: Dict[str, Any]) -> Dict[str, Any]:
+    started = time.monotonic()
+    backend = manager.router.choose(parameters["subscription_tier"], parameters["recipe_type"])
+    response = await manager.client.chat.completions.create(
+        **manager._completion_kwargs(parameters, backend.model)
+    )
+    sample = {
+        "latency": time.monotonic() - started,
+        "prompt_tokens": response.usage.prompt_tokens,
+        "completion_tokens": response.usage.completion_tokens,
+        "valid": True
+    }
+    try:
+        manager._parse(response.choices[0].message.content)
+    except ValueError:
+        sample["valid"] = False
+    return sample
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+def report(name: str, samples: List[Dict[str, Any]]) -> None:
+    print(f"{name}: {len(samples)} completions, {sum(not s['valid'] for s in samples)} invalid")
+    for key, spec, unit in (("prompt_tokens", "8.0f", ""), ("completion_tokens", "8.0f", ""), ("latency", "7.2f", "s")):
+        values = [s[key] for s in samples]
+        print(
+            f"  {key:>17}: mean {statistics.mean(values):{spec}}{unit}"
+            f"  p50 {percentile(values, 0.5):{spec}}{unit}"
+            f"  p95 {percentile(values, 0.95):{spec}}{unit}"
+        )
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--file", default="")
+    parser.add_argument("--formats", default="verbose,compact")
+    parser.add_argument("--base-url", default=None)
+    args = parser.parse_args()
+
+    requests = await load_requests(args.file, args.limit)
+    if not requests:
+        sys.exit("No stored generation parameters to replay")
+
+    client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY, base_url=args.base_url, max_retries=2)
+    formats = args.formats.split(",")
+    managers = {name: OpenAIManager(client=client, output_format=name) for name in formats}
+    service = RecipeGeneratorService(db=None)
+    samples: Dict[str, List[Dict[str, Any]]] = {name: [] for name in formats}
+
+    for i, request in enumerate(requests):
+        parameters = service._prepare_generation_params(request, None)
+        # Alternate which format goes first so neither always gets the warmer connection
+        for name in formats[i % len(formats):] + formats[:i % len(formats)]:
+            try:
+                samples[name].append(await replay(managers[name], parameters))
+            except Exception as e:
+                print(f"{name} request {i} failed: {e!r}", file=sys.stderr)
+
+    await client.close()
+    for name in formats:
+        if samples[name]:
+            report(name, samples[name])
+
+if __name__ == "__main__":
+    asyncio.run(main())
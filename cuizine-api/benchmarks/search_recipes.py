@@ -0,0 +1,231 @@
+"""
+Recipe search on a seeded table: ILIKE scans versus the full-text index.
+
+Creates a scratch schema, seeds --rows synthetic recipes into a `recipes`
+table shaped like the app's, and times the old `title/description ILIKE`
+search for a set of queries. It then applies migration 004 (the generated
+search_vector column, whose ADD COLUMN is the backfill, and its GIN index),
+reporting how long each step took, and times RecipeStorageService
+.search_recipes for the same queries. Reports p50/p95 latency per query.
+
+Needs a Postgres DATABASE_URL (or --database-url); everything happens in
+the --schema schema, which is dropped afterwards unless --keep is given.
+Other benchmarks reuse the seeded schema with --keep.
+
+Run from cuizine-api/:
+    python benchmarks/search_recipes.py [--rows 1000000] [--repeat 20]
+        [--schema recipe_search_bench] [--keep] [--database-url postgresql://...]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from typing import Awaitable, Callable, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import String, bindparam, desc, or_, select, text  # noqa: E402
+from sqlalchemy.dialects.postgresql import ARRAY  # noqa: E402
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine  # noqa: E402
+from app.core.config import settings  # noqa: E402
+from app.core.database import async_database_url  # noqa: E402
+from app.database.models import RECIPE_SEARCH_EXPRESSION, RECIPE_SEARCH_FUNCTION, Recipe  # noqa: E402
+from app.services.recipe_storage import RecipeStorageService  # noqa: E402
+
+INGREDIENTS = [
+    "chicken thighs", "chicken breast", "ground beef", "pork shoulder", "salmon fillet", "shrimp",
+    "cod", "tofu", "tempeh", "chickpeas", "black beans", "red lentils", "eggs", "bacon", "chorizo",
+    "lamb shoulder", "duck breast", "mussels", "scallops", "tuna steak", "turkey mince", "halloumi",
+    "parmesan", "mozzarella", "feta", "cheddar", "ricotta", "greek yogurt", "heavy cream", "butter",
+    "coconut milk", "olive oil", "sesame oil", "soy sauce", "fish sauce", "miso paste", "tahini",
+    "garlic", "ginger", "shallots", "red onion", "leeks", "scallions", "zucchini", "eggplant",
+    "bell pepper", "jalapeno", "poblano", "cherry tomatoes", "roma tomatoes", "spinach", "kale",
+    "arugula", "bok choy", "broccoli", "cauliflower", "brussels sprouts", "carrots", "parsnips",
+    "sweet potato", "russet potatoes", "butternut squash", "pumpkin", "mushrooms", "shiitake",
+    "asparagus", "green beans", "peas", "corn", "avocado", "cucumber", "radishes", "beetroot",
+    "fennel", "celery", "cabbage", "lemon", "lime", "orange zest", "mango", "pineapple", "apples",
+    "pears", "blueberries", "strawberries", "raspberries", "bananas", "dates", "raisins", "almonds",
+    "walnuts", "pecans", "pistachios", "cashews", "peanuts", "sesame seeds", "pumpkin seeds",
+    "basmati rice", "jasmine rice", "arborio rice", "quinoa", "couscous", "bulgur", "farro",
+    "spaghetti", "penne", "rigatoni", "orzo", "rice noodles", "udon", "ramen noodles", "tortillas",
+    "pita", "sourdough", "breadcrumbs", "flour", "cornmeal", "oats", "honey", "maple syrup",
+    "brown sugar", "dark chocolate", "cocoa powder", "vanilla", "cinnamon", "cumin", "coriander",
+    "smoked paprika", "turmeric", "garam masala", "chili flakes", "oregano", "thyme", "rosemary",
+    "sage", "basil", "cilantro", "parsley", "dill", "mint", "saffron", "star anise", "cardamom"
+]
+DISHES = [
+    "curry", "stew", "soup", "salad", "tacos", "burrito bowl", "stir fry", "risotto", "pasta bake",
+    "traybake", "skewers", "frittata", "omelette", "pancakes", "porridge", "flatbread", "pizza",
+    "noodle bowl", "fried rice", "casserole", "gratin", "chili", "tagine", "pie", "sandwich",
+    "wraps", "dumplings", "sliders", "crumble", "smoothie bowl"
+]
+STYLES = [
+    "Spicy", "Smoky", "Creamy", "Crispy", "Zesty", "Hearty", "Quick", "Slow-cooked", "Roasted",
+    "Grilled", "Herby", "Garlicky", "Sticky", "Golden", "Rustic", "Weeknight", "One-pot", "Sheet-pan",
+    "Lemony", "Charred", "Honey-glazed", "Fiery", "Light", "Comforting", "Fragrant"
+]
+CUISINES = [
+    "Italian", "Mexican", "Thai", "Indian", "Japanese", "Chinese", "French", "Greek", "Moroccan",
+    "Korean", "Vietnamese", "Spanish", "Lebanese", "American", "Ethiopian"
+]
+MEAL_TYPES = ["breakfast", "lunch", "dinner", "snack", "dessert"]
+
+QUERIES = [
+    "chicken",                      # Common word, many matches to rank
+    "saffron",                      # Rare word
+    "spicy chicken curry",          # Several words, all required
+    '"coconut milk"',               # Phrase
+    "pasta -mushrooms",             # Exclusion
+    "thai or vietnamese noodles",   # Alternatives
+    "zucchini frittata",
+    "xyzzy"                         # No matches
+]
+
+SEED = text("""
+INSERT INTO recipes (
+    id, title, description, servings, total_time, cuisine_type, meal_type, is_spicy,
+    ingredients, instructions, source_type, creator_user_id, created_at
+)
+SELECT
+    'bench-' || g,
+    style || ' ' || main || ' ' || dish,
+    'A ' || lower(style) || ' ' || cuisine || ' ' || dish || ' with ' || main || ' and ' || side || '.',
+    2 + (g % 4),
+    10 + (g % 90),
+    ARRAY[cuisine],
+    (:meal_types)[1 + (g % array_length(:meal_types, 1))],
+    style IN ('Spicy', 'Fiery'),
+    (SELECT jsonb_agg(jsonb_build_object('item', item, 'amount', 1, 'unit', 'cup'))
+     FROM (SELECT main AS item UNION ALL SELECT side
+           UNION ALL SELECT (:ingredients)[1 + floor(random() * array_length(:ingredients, 1))::int]
+           FROM generate_series(1, 2 + (g % 6))) picked),
+    '[{"step_number": 1, "content": "Cook everything together"}]'::jsonb,
+    'ai',
+    'user_' || (g % 50000),
+    now() - (g % 730) * interval '1 day'
+FROM (
+    SELECT
+        g,
+        (:styles)[1 + floor(random() * array_length(:styles, 1))::int] AS style,
+        (:ingredients)[1 + floor(random() * array_length(:ingredients, 1))::int] AS main,
+        (:ingredients)[1 + floor(random() * array_length(:ingredients, 1))::int] AS side,
+        (:dishes)[1 + floor(random() * array_length(:dishes, 1))::int] AS dish,
+        (:cuisines)[1 + floor(random() * array_length(:cuisines, 1))::int] AS cuisine
+    FROM generate_series(CAST(:start AS int), CAST(:stop AS int)) g
+) picks
+""").bindparams(
+    bindparam("ingredients", INGREDIENTS, type_=ARRAY(String)),
+    bindparam("dishes", DISHES, type_=ARRAY(String)),
+    bindparam("styles", STYLES, type_=ARRAY(String)),
+    bindparam("cuisines", CUISINES, type_=ARRAY(String)),
+    bindparam("meal_types", MEAL_TYPES, type_=ARRAY(String))
+)
+
+def bench_engine(database_url: str, schema: str) -> AsyncEngine:
+    return create_async_engine(
+        async_database_url(database_url),
+        connect_args={"server_settings": {"search_path": schema}}
+    )
+
+async def timed(label: str, work: Awaitable) -> None:
+    started = time.monotonic()
+    await work
+    print(f"{label}: {time.monotonic() - started:.1f}s")
+
+async def seed(engine: AsyncEngine, schema: str, rows: int, batch_size: int = 100_000) -> None:
+    """Recreate `schema` with a recipes table holding `rows` synthetic recipes and no search columns"""
+    async with engine.begin() as connection:
+        await connection.execute(text(f'DROP SCHEMA IF EXISTS "{schema}" CASCADE'))
+        await connection.execute(text(f'CREATE SCHEMA "{schema}"'))
+        await connection.run_sync(Recipe.__table__.create)
+        # The table as it was before migrations 004 and 005; their column indexes go with the columns
+        await connection.execute(text("ALTER TABLE recipes DROP COLUMN search_vector, DROP COLUMN ingredient_names"))
+        await connection.execute(text("DROP INDEX idx_recipes_title_trgm"))
+
+    async def insert() -> None:
+        for start in range(1, rows + 1, batch_size):
+            async with engine.begin() as connection:
+                await connection.execute(SEED, {"start": start, "stop": min(rows, start + batch_size - 1)})
+
+    await timed(f"seeded {rows} recipes", insert())
+    async with engine.connect() as connection:
+        await connection.execution_options(isolation_level="AUTOCOMMIT")
+        await connection.execute(text("VACUUM ANALYZE recipes"))
+
+async def migrate(engine: AsyncEngine) -> None:
+    """The steps of migration 004, timed one by one"""
+    async def run(*statements: str) -> None:
+        async with engine.connect() as connection:
+            await connection.execution_options(isolation_level="AUTOCOMMIT")
+            for statement in statements:
+                await connection.execute(text(statement))
+
+    await run(RECIPE_SEARCH_FUNCTION)
+    await timed("backfill (ADD COLUMN search_vector)", run(
+        f"ALTER TABLE recipes ADD COLUMN search_vector tsvector "
+        f"GENERATED ALWAYS AS ({RECIPE_SEARCH_EXPRESSION}) STORED"
+    ))
+    await timed("GIN index", run(
+        "CREATE INDEX CONCURRENTLY idx_recipes_search ON recipes USING gin (search_vector)"
+    ))
+    await run("ANALYZE recipes")
+
+async def ilike_search(db: AsyncSession, query: str, limit: int = 20) -> List[Recipe]:
+    """search_recipes as it was before full-text search"""
+    return (await db.scalars(
+        select(Recipe)
+        .where(or_(Recipe.title.ilike(f"%{query}%"), Recipe.description.ilike(f"%{query}%")))
+        .order_by(desc(Recipe.created_at))
+        .limit(limit)
+    )).all()
+
+async def fulltext_search(db: AsyncSession, query: str) -> List[Recipe]:
+    return await RecipeStorageService(db).search_recipes(query)
+
+async def measure(
+    engine: AsyncEngine,
+    name: str,
+    search: Callable[[AsyncSession, str], Awaitable[List[Recipe]]],
+    repeat: int
+) -> None:
+    print(f"\n{name}")
+    async with AsyncSession(engine, expire_on_commit=False) as db:
+        for query in QUERIES:
+            samples = []
+            for _ in range(repeat):
+                started = time.monotonic()
+                results = await search(db, query)
+                samples.append((time.monotonic() - started) * 1000)
+                db.expunge_all()
+            samples.sort()
+            print(
+                f"  {query!r:32} {len(results):>3} rows  "
+                f"p50={statistics.median(samples):8.1f}ms  "
+                f"p95={samples[min(len(samples) - 1, int(0.95 * len(samples)))]:8.1f}ms"
+            )
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--schema", default="recipe_search_bench")
+    parser.add_argument("--keep", action="store_true", help="Keep the seeded schema")
+    parser.add_argument("--database-url", default=settings.DATABASE_URL)
+    args = parser.parse_args()
+
+    engine = bench_engine(args.database_url, args.schema)
+    try:
+        await seed(engine, args.schema, args.rows)
+        await measure(engine, "ILIKE on title / description, newest first", ilike_search, args.repeat)
+        await migrate(engine)
+        await measure(engine, "websearch_to_tsquery on search_vector, by ts_rank", fulltext_search, args.repeat)
+    finally:
+        if not args.keep:
+            async with engine.begin() as connection:
+                await connection.execute(text(f'DROP SCHEMA IF EXISTS "{args.schema}" CASCADE'))
+        await engine.dispose()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,91 @@
+"""Local JWKS endpoint and token factory for auth tests"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jose import jwk, jwt
+import json
+import threading
+import time
+
+class SigningKey:
+    def __init__(self, kid: str):
+        self.kid = kid
+        private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        self.private_pem = private_key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.PKCS8,
+            serialization.NoEncryption()
+        ).decode()
+        public_pem = private_key.public_key().public_bytes(
+            serialization.Encoding.PEM,
+            serialization.PublicFormat.SubjectPublicKeyInfo
+        ).decode()
+        self.public_jwk = {
+            **jwk.construct(public_pem, "RS256").to_dict(),
+            "kid": kid,
+            "use": "sig"
+        }
+
+class FakeJWKSServer:
+    """Serves /.well-known/jwks.json from a background thread and counts fetches"""
+
+    def __init__(self):
+        self.keys: List[SigningKey] = [SigningKey("key-1")]
+        self.requests = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server.requests += 1
+                body = json.dumps({"keys": [k.public_jwk for k in server.keys]}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address
+        return f"http://{host}:{port}/.well-known/jwks.json"
+
+    def __enter__(self) -> "FakeJWKSServer":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def rotate(self, kid: str) -> SigningKey:
+        key = SigningKey(kid)
+        self.keys.append(key)
+        return key
+
+    def issue(
+        self,
+        sub: str = "user_1",
+        metadata: Optional[Dict[str, Any]] = None,
+        key: Optional[SigningKey] = None,
+        issuer: str = "https://clerk.test",
+        audience: str = "cuizine-test",
+        expires_in: int = 300
+    ) -> str:
+        key = key or self.keys[0]
+        now = int(time.time())
+        claims = {
+            "sub": sub,
+            "iss": issuer,
+            "aud": audience,
+            "iat": now,
+            "exp": now + expires_in,
+            "metadata": metadata or {"subscription_tier": "free", "recipes_remaining": 5}
+        }
+        return jwt.encode(claims, key.private_pem, algorithm="RS256", headers={"kid": key.kid})
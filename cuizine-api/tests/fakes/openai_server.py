@@ -0,0 +1,137 @@
+"""Local OpenAI chat completions endpoint with scripted latency and faults"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+import json
+import threading
+import time
+
+RECIPE = {
+    "title": "Pantry Pasta",
+    "description": "Quick weeknight pasta",
+    "prep_time": 5,
+    "cook_time": 10,
+    "servings": 2,
+    "difficulty_level": "beginner",
+    "ingredients": [{"amount": 200, "unit": "g", "item": "pasta"}],
+    "instructions": [{"step_number": 1, "content": "Boil the pasta"}],
+    "nutritional_info": {"calories": 500, "protein": 15, "carbs": 80, "fat": 10}
+}
+
+# The same recipe in the compact structured-output contract
+COMPACT_RECIPE = {
+    "t": "Pantry Pasta",
+    "d": "Quick weeknight pasta",
+    "p": 5,
+    "c": 10,
+    "sv": 2,
+    "l": "beginner",
+    "i": [{"n": "pasta", "q": 200, "u": "g", "x": None}],
+    "s": [{"c": "Boil the pasta", "m": 10}],
+    "n": {"cal": 500, "pro": 15, "carb": 80, "fat": 10},
+    "e": [],
+    "h": [],
+    "k": None,
+    "lo": []
+}
+
+class Fault:
+    """What the server does with one request: wait, then fail or answer"""
+
+    def __init__(
+        self,
+        delay: float = 0.0,
+        status: int = 200,
+        headers: Optional[Dict[str, str]] = None,
+        content: Optional[str] = None
+    ):
+        self.delay = delay
+        self.status = status
+        self.headers = headers or {}
+        self.content = content
+
+class FakeOpenAIServer:
+    """
+    Serves POST /v1/chat/completions from a background thread.
+
+    Each request takes the next scripted Fault; once the script runs out it
+    answers immediately with a valid recipe, in the compact contract when
+    the request asked for a JSON schema. Requests are handled on their own
+    threads, so slow and fast responses overlap like the real API.
+    """
+
+    def __init__(
+        self,
+        faults: Optional[List[Fault]] = None,
+        recipe: Dict[str, Any] = RECIPE,
+        compact_recipe: Dict[str, Any] = COMPACT_RECIPE
+    ):
+        self.faults = list(faults or [])
+        self.recipe = recipe
+        self.compact_recipe = compact_recipe
+        self.requests: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                with server._lock:
+                    server.requests.append(body)
+                    fault = server.faults.pop(0) if server.faults else Fault()
+
+                time.sleep(fault.delay)
+                if fault.status == 200:
+                    recipe = server.recipe
+                    if body.get("response_format", {}).get("type") == "json_schema":
+                        recipe = server.compact_recipe
+                    content = fault.content if fault.content is not None else json.dumps(recipe)
+                    payload = {
+                        "id": f"chatcmpl-{len(server.requests)}",
+                        "object": "chat.completion",
+                        "created": int(time.time()),
+                        "model": body.get("model", "gpt-4o-mini"),
+                        "choices": [{
+                            "index": 0,
+                            "message": {"role": "assistant", "content": content},
+                            "finish_reason": "stop"
+                        }],
+                        "usage": {"prompt_tokens": 100, "completion_tokens": 200, "total_tokens": 300}
+                    }
+                else:
+                    payload = {"error": {"message": "Injected fault", "type": "server_error"}}
+
+                data = json.dumps(payload).encode()
+                try:
+                    self.send_response(fault.status)
+                    for name, value in fault.headers.items():
+                        self.send_header(name, value)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # The client gave up (timeout or lost hedge)
+
+            def log_message(self, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._httpd.daemon_threads = True
+        self._thread = threading.Thread(
+            target=self._httpd.serve_forever,
+            kwargs={"poll_interval": 0.05},
+            daemon=True
+        )
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address
+        return f"http://{host}:{port}/v1"
+
+    def __enter__(self) -> "FakeOpenAIServer":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
@@ -0,0 +1,118 @@
+import asyncio
+import pytest
+from unittest.mock import patch
+from app.core import admission as admission_module
+from app.core.admission import AdmissionRejected, PriorityAdmission
+
+HEADSTARTS = {"free": 0.0, "pro": 15.0, "premium": 30.0}
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+@pytest.fixture
+def clock():
+    clock = FakeClock()
+    with patch.object(admission_module.time, 'monotonic', clock.monotonic):
+        yield clock
+
+async def queue_up(admission, tiers, order, clock=None, spacing=0.0):
+    """Start one waiter per tier, `spacing` seconds apart, recording admission order"""
+    async def wait(name, tier):
+        await admission.acquire(tier)
+        order.append(name)
+
+    tasks = []
+    for name, tier in tiers:
+        tasks.append(asyncio.create_task(wait(name, tier)))
+        await asyncio.sleep(0)
+        if clock:
+            clock.now += spacing
+    return tasks
+
+async def drain(admission, tasks):
+    for _ in tasks:
+        admission.release()
+        await asyncio.sleep(0)
+    await asyncio.gather(*tasks)
+
+@pytest.mark.asyncio
+async def test_higher_tier_is_admitted_first(clock):
+    admission = PriorityAdmission(capacity=1, headstarts=HEADSTARTS, max_wait=600)
+    await admission.acquire("free")
+    order = []
+
+    tasks = await queue_up(
+        admission,
+        [("free", "free"), ("pro", "pro"), ("premium", "premium")],
+        order, clock, spacing=1.0
+    )
+    await drain(admission, tasks)
+
+    assert order == ["premium", "pro", "free"]
+
+@pytest.mark.asyncio
+async def test_waiting_free_request_ages_past_new_premium(clock):
+    admission = PriorityAdmission(capacity=1, headstarts=HEADSTARTS, max_wait=600)
+    await admission.acquire("free")
+    order = []
+
+    # The free request has waited longer than premium's 30s head start
+    tasks = await queue_up(
+        admission, [("free", "free"), ("premium", "premium")], order, clock, spacing=31.0
+    )
+    await drain(admission, tasks)
+
+    assert order == ["free", "premium"]
+
+@pytest.mark.asyncio
+async def test_sheds_when_estimated_wait_is_too_long(clock):
+    admission = PriorityAdmission(
+        capacity=1, headstarts=HEADSTARTS, max_wait=10, initial_service_time=4
+    )
+    await admission.acquire("free")
+    order = []
+    tasks = await queue_up(admission, [("free_1", "free"), ("free_2", "free")], order)
+
+    # Two free requests already wait; a third would queue for ~12s
+    with pytest.raises(AdmissionRejected) as rejected:
+        await admission.acquire("free")
+    # Premium jumps the queue, so it is still admitted
+    premium = asyncio.create_task(admission.acquire("premium"))
+    await asyncio.sleep(0)
+
+    assert rejected.value.retry_after == 12
+    assert admission.waiting == 3
+    premium.cancel()
+    await drain(admission, tasks)
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_frees_its_place():
+    admission = PriorityAdmission(capacity=1, headstarts=HEADSTARTS, max_wait=600)
+    await admission.acquire("free")
+    order = []
+    tasks = await queue_up(admission, [("first", "free"), ("second", "free")], order)
+
+    tasks[0].cancel()
+    await asyncio.sleep(0)
+    admission.release()
+    await tasks[1]
+
+    assert order == ["second"]
+    assert admission.in_use == 1
+    assert admission.waiting == 0
+
+@pytest.mark.asyncio
+async def test_service_time_tracks_slot_hold_time():
+    admission = PriorityAdmission(
+        capacity=2, headstarts=HEADSTARTS, max_wait=600, initial_service_time=5
+    )
+    await admission.acquire("free")
+
+    admission.release(held=10)
+
+    assert admission.service_time == 6
+    assert admission.estimated_wait("free") == 0
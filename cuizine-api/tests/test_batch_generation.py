@@ -0,0 +1,103 @@
+import asyncio
+import pytest
+from unittest.mock import MagicMock, patch
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.schemas.recipes import GeneratedRecipe, RecipeGenerationRequest
+from app.services.recipe_generator import RecipeGeneratorService
+
+def recipe_data(title):
+    return {
+        "title": title,
+        "description": "Generated",
+        "prep_time": 5,
+        "cook_time": 10,
+        "servings": 2,
+        "difficulty_level": "beginner",
+        "ingredients": [{"amount": 1, "unit": "cup", "item": "rice"}],
+        "instructions": [{"step_number": 1, "content": "Cook the rice"}],
+        "nutritional_info": {"calories": 300}
+    }
+
+class FakeOpenAI:
+    def __init__(self, delays, fail=()):
+        self.delays = delays
+        self.fail = set(fail)
+        self.running = 0
+        self.peak = 0
+
+    async def generate_recipe(self, parameters):
+        index = int(parameters["selected_ingredients"][0])
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+        try:
+            await asyncio.sleep(self.delays[index])
+            if index in self.fail:
+                raise ValueError("Missing required fields")
+            return GeneratedRecipe.model_validate(recipe_data(f"Recipe {index}"))
+        finally:
+            self.running -= 1
+
+def make_service(openai):
+    db = MagicMock(spec=AsyncSession)
+    db.in_transaction.return_value = False  # Preferences are patched, so nothing has queried yet
+    service = RecipeGeneratorService(db)
+    service.openai = openai
+    return service, db
+
+def batch(size):
+    return [RecipeGenerationRequest(recipe_type="random", ingredients=[str(i)]) for i in range(size)]
+
+@pytest.mark.asyncio
+async def test_batch_streams_in_completion_order_with_bounded_fan_out():
+    openai = FakeOpenAI(delays=[0.04, 0.01, 0.05, 0.0])
+    service, db = make_service(openai)
+
+    with patch.object(service, '_get_user_preferences', return_value=None):
+        results = [r async for r in service.generate_batch(batch(4), "user_1", concurrency=2)]
+
+    assert openai.peak == 2
+    assert [r.index for r in results] == [1, 0, 3, 2]
+    assert results[0].recipe.title == "Recipe 1"
+    # Each recipe is stored before its result is handed out
+    assert [c.args[0].title for c in db.add.call_args_list] == [f"Recipe {r.index}" for r in results]
+    assert db.commit.await_count == 4
+
+@pytest.mark.asyncio
+async def test_batch_stores_only_successful_recipes():
+    openai = FakeOpenAI(delays=[0.0, 0.0, 0.0], fail={1})
+    service, db = make_service(openai)
+
+    with patch.object(service, '_get_user_preferences', return_value=None):
+        results = [r async for r in service.generate_batch(batch(3), "user_1", concurrency=3)]
+
+    failed = [r for r in results if r.error]
+    assert [r.index for r in failed] == [1]
+    stored = [c.args[0] for c in db.add.call_args_list]
+    assert sorted(r.title for r in stored) == ["Recipe 0", "Recipe 2"]
+    assert all(r.creator_user_id == "user_1" for r in stored)
+
+@pytest.mark.asyncio
+async def test_batch_closed_early_keeps_what_it_handed_out():
+    openai = FakeOpenAI(delays=[0.0, 0.05, 0.05])
+    service, db = make_service(openai)
+
+    with patch.object(service, '_get_user_preferences', return_value=None):
+        results = service.generate_batch(batch(3), "user_1", concurrency=3)
+        first = await results.__anext__()
+        await results.aclose()
+
+    assert first.recipe.title == "Recipe 0"
+    assert [c.args[0].title for c in db.add.call_args_list] == ["Recipe 0"]
+    db.commit.assert_awaited_once()
+
+@pytest.mark.asyncio
+async def test_batch_recipe_that_fails_to_insert_is_reported_as_failed():
+    openai = FakeOpenAI(delays=[0.0, 0.01])
+    service, db = make_service(openai)
+    db.commit.side_effect = [RuntimeError("connection lost"), None]
+
+    with patch.object(service, '_get_user_preferences', return_value=None):
+        results = [r async for r in service.generate_batch(batch(2), "user_1", concurrency=2)]
+
+    assert [(r.index, r.recipe is not None) for r in results] == [(0, False), (1, True)]
+    db.rollback.assert_awaited_once()
@@ -0,0 +1,160 @@
+import asyncio
+import httpx
+import pytest
+from unittest.mock import AsyncMock, patch
+from app.services.credit_ledger import (
+    ClerkMetadataSync,
+    CreditLedger,
+    InMemoryCreditStore,
+    RedisCreditStore
+)
+
+@pytest.fixture
+def store():
+    return InMemoryCreditStore()
+
+@pytest.fixture
+def sync(store):
+    return ClerkMetadataSync(store, interval=0.01, batch_size=2, concurrency=2)
+
+@pytest.fixture
+def ledger(store, sync):
+    return CreditLedger(store, sync)
+
+async def spend(ledger, user_id, remaining, count=1):
+    reservation = await ledger.reserve(user_id, remaining=remaining, count=count)
+    await ledger.commit(reservation)
+    return reservation
+
+class TestCreditLedger:
+    @pytest.mark.asyncio
+    async def test_seeds_from_token_then_decrements(self, ledger):
+        first = await spend(ledger, "user_1", remaining=5)
+        # A stale token must not reset the ledger balance
+        second = await spend(ledger, "user_1", remaining=5)
+
+        assert first.remaining == 4
+        assert second.remaining == 3
+
+    @pytest.mark.asyncio
+    async def test_reserve_fails_without_credits(self, ledger):
+        await spend(ledger, "user_1", remaining=1)
+
+        assert await ledger.reserve("user_1", remaining=1) is None
+
+    @pytest.mark.asyncio
+    async def test_batch_reservation_is_all_or_nothing(self, ledger, store):
+        assert await ledger.reserve("user_1", remaining=2, count=3) is None
+        assert await store.get("user_1") == (2, 0)
+
+    @pytest.mark.asyncio
+    async def test_refund_restores_balance(self, ledger, store):
+        reservation = await ledger.reserve("user_1", remaining=5)
+
+        await ledger.refund(reservation)
+        await ledger.refund(reservation)  # Settling twice is a no-op
+
+        assert await store.get("user_1") == (5, 0)
+
+    @pytest.mark.asyncio
+    async def test_partial_commit_refunds_unused(self, ledger, store):
+        reservation = await ledger.reserve("user_1", remaining=5, count=3)
+
+        await ledger.commit(reservation, used=2)
+
+        assert await store.get("user_1") == (3, 2)
+        assert reservation.remaining == 3
+
+    @pytest.mark.asyncio
+    async def test_concurrent_generations_never_overdraw(self, ledger, store):
+        balances = []
+
+        async def generate(i: int):
+            reservation = await ledger.reserve("user_1", remaining=3)
+            if reservation is None:
+                return "rejected"
+            balances.append(reservation.remaining)
+            await asyncio.sleep(0.01)  # The OpenAI call
+            if i % 4 == 0:
+                await ledger.refund(reservation)
+                return "failed"
+            await ledger.commit(reservation)
+            return "ok"
+
+        results = await asyncio.gather(*[generate(i) for i in range(10)])
+        remaining, generated = await store.get("user_1")
+
+        assert min(balances) >= 0
+        assert remaining >= 0
+        assert generated == results.count("ok")
+        assert remaining + generated == 3
+
+    @pytest.mark.asyncio
+    async def test_get_remaining_defaults_to_token(self, ledger):
+        assert await ledger.get_remaining("user_1", default=5) == 5
+
+class TestClerkMetadataSync:
+    @pytest.mark.asyncio
+    async def test_aggregates_per_user(self, ledger, sync):
+        for _ in range(10):
+            await spend(ledger, "user_1", remaining=20)
+        await spend(ledger, "user_2", remaining=5)
+
+        with patch.object(sync, '_push', AsyncMock(return_value=True)) as push:
+            pushed = await sync.flush()
+
+        assert pushed == 2
+        assert push.await_count == 2
+        pushed_balances = {call.args[0]: call.args[1] for call in push.await_args_list}
+        assert pushed_balances["user_1"] == (10, 10)
+
+    @pytest.mark.asyncio
+    async def test_failed_push_is_retried(self, ledger, sync, store):
+        await spend(ledger, "user_1", remaining=5)
+
+        with patch.object(sync, '_push', AsyncMock(return_value=False)):
+            assert await sync.flush() == 0
+        with patch.object(sync, '_push', AsyncMock(return_value=True)) as push:
+            assert await sync.flush() == 1
+
+        push.assert_awaited_once_with("user_1", (4, 1))
+
+    @pytest.mark.asyncio
+    async def test_push_sends_counters_only(self, sync):
+        requests = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            requests.append(request)
+            return httpx.Response(200, json={})
+
+        sync._client = httpx.AsyncClient(
+            base_url="https://clerk.test/v1",
+            transport=httpx.MockTransport(handler)
+        )
+        assert await sync._push("user_1", (3, 2))
+
+        assert requests[0].method == "PATCH"
+        assert requests[0].url.path == "/v1/users/user_1/metadata"
+        assert requests[0].read() == (
+            b'{"public_metadata": {"recipes_remaining": 3, "recipes_generated": 2}}'
+        )
+        await sync._client.aclose()
+
+@pytest.mark.asyncio
+async def test_redis_reserve_uses_one_script_call():
+    client = AsyncMock()
+    client.eval.side_effect = [4, -1]
+    store = RedisCreditStore(client, ttl=60)
+
+    assert await store.reserve("user_1", (5, 0), 1) == 4
+    assert await store.reserve("user_1", (5, 0), 5) is None
+    assert client.eval.call_args.kwargs["keys"] == ["credits:user_1"]
+
+@pytest.mark.asyncio
+async def test_redis_partial_balance_reads_as_unseeded():
+    # A refund that landed after the monthly reset deleted the hash
+    client = AsyncMock()
+    client.hmget.return_value = ["1", None]
+    store = RedisCreditStore(client, ttl=60)
+
+    assert await store.get("user_1") is None
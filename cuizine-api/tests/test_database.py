@@ -0,0 +1,82 @@
+import asyncio
+import pytest
+from unittest.mock import MagicMock, patch
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from app.core.database import (
+    InstrumentedPool,
+    observe_pool,
+    pool_checked_out,
+    pool_checkout_wait,
+    pool_hold_time,
+    pool_limits
+)
+from app.schemas.recipes import GeneratedRecipe, RecipeGenerationRequest
+from app.services.recipe_generator import RecipeGeneratorService
+
+RECIPE = {
+    "title": "Rice",
+    "description": "Generated",
+    "prep_time": 5,
+    "cook_time": 10,
+    "servings": 2,
+    "difficulty_level": "beginner",
+    "ingredients": [{"amount": 1, "unit": "cup", "item": "rice"}],
+    "instructions": [{"step_number": 1, "content": "Cook the rice"}],
+    "nutritional_info": {"calories": 300}
+}
+
+@pytest.mark.asyncio
+async def test_connection_is_released_for_the_completion():
+    db = MagicMock(spec=AsyncSession)
+    db.in_transaction.return_value = True
+    db.scalar.return_value = None
+    service = RecipeGeneratorService(db)
+    commits_during_completion = []
+
+    async def generate_recipe(parameters):
+        commits_during_completion.append(db.commit.await_count)
+        return GeneratedRecipe.model_validate(RECIPE)
+
+    service.openai = MagicMock(generate_recipe=generate_recipe)
+    request = RecipeGenerationRequest(recipe_type="random", ingredients=["rice"])
+
+    with patch("app.services.recipe_generator.recipe_library") as library:
+        library.serves.return_value = False
+        recipe = await service.generate_recipe(request, "user_1")
+
+    # The preferences read was committed before the call; storing the recipe commits again
+    assert commits_during_completion == [1]
+    assert db.commit.await_count == 2
+    assert recipe.title == "Rice"
+
+@pytest.mark.asyncio
+async def test_pool_reports_checkout_wait_and_hold_time():
+    pytest.importorskip("aiosqlite")
+    engine = observe_pool(create_async_engine(
+        "sqlite+aiosqlite://", poolclass=InstrumentedPool, pool_size=1, max_overflow=0
+    ))
+    waits, holds = pool_checkout_wait.count(), pool_hold_time.count()
+
+    async def hold():
+        async with engine.connect() as connection:
+            await connection.execute(text("SELECT 1"))
+            assert pool_checked_out.value() == 1
+            await asyncio.sleep(0.05)
+
+    try:
+        await asyncio.gather(hold(), hold())
+    finally:
+        await engine.dispose()
+
+    assert pool_checkout_wait.count() - waits == 2
+    assert pool_hold_time.count() - holds == 2
+    # The second checkout queued behind the first connection's 50 ms hold
+    assert pool_checkout_wait.percentile(1.0) >= 0.025
+    assert pool_checked_out.value() == 0
+
+def test_pool_covers_workers_within_the_connection_budget():
+    # 4 generation workers + 2 background tasks + 10 for requests, out of 40 for one process
+    assert pool_limits(max_connections=40, processes=1, generation_workers=4, request_connections=10) == (16, 24)
+    # Four processes share 40 connections: each keeps its 10 open and may not overflow
+    assert pool_limits(max_connections=40, processes=4, generation_workers=4, request_connections=10) == (10, 0)
@@ -0,0 +1,75 @@
+import asyncio
+import pytest
+from unittest.mock import MagicMock, patch
+from app.api.deps import ClerkUser, UserMetadata
+from app.api.v1 import generator
+from app.schemas.recipes import RecipeGenerationRequest
+from app.services.credit_ledger import ClerkMetadataSync, CreditLedger, InMemoryCreditStore
+from app.utils.helpers import ClientDisconnected, cancel_on_disconnect
+
+class FakeRequest:
+    """Reports a disconnect from the `after`-th check on"""
+
+    def __init__(self, after):
+        self.after = after
+        self.checks = 0
+
+    async def is_disconnected(self):
+        self.checks += 1
+        return self.checks >= self.after
+
+@pytest.mark.asyncio
+async def test_disconnect_cancels_the_work():
+    cancelled = asyncio.Event()
+
+    async def work():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    with pytest.raises(ClientDisconnected):
+        await cancel_on_disconnect(FakeRequest(after=2), work(), poll_interval=0.01)
+
+    assert cancelled.is_set()
+
+@pytest.mark.asyncio
+async def test_finished_work_wins_over_a_disconnect():
+    async def work():
+        return "recipe"
+
+    request = FakeRequest(after=1)
+    assert await cancel_on_disconnect(request, work(), poll_interval=0.01) == "recipe"
+    assert request.checks == 0
+
+@pytest.mark.asyncio
+async def test_endpoint_refunds_and_stores_nothing_when_the_client_leaves():
+    store = InMemoryCreditStore()
+    ledger = CreditLedger(store, ClerkMetadataSync(store, interval=60, batch_size=10, concurrency=1))
+    user = ClerkUser(id="user_1", metadata=UserMetadata(recipes_remaining=3))
+    db = MagicMock()
+    completed = []
+
+    async def slow_generation(self, request, user_id):
+        await asyncio.sleep(10)
+        completed.append(request)
+
+    before = generator.generations_cancelled.value(endpoint="generate")
+    with patch.object(generator, "credit_ledger", ledger), \
+         patch.object(generator.RecipeGeneratorService, "generate_recipe", slow_generation), \
+         patch.object(generator.settings, "DISCONNECT_POLL_INTERVAL", 0.01):
+        response = await generator.generate_recipe_endpoint(
+            RecipeGenerationRequest(recipe_type="random", ingredients=["rice"]),
+            FakeRequest(after=2),
+            queue=False,
+            idempotency_key=None,
+            user=user,
+            db=db
+        )
+
+    assert response.status_code == 499
+    assert completed == []
+    db.add.assert_not_called()
+    assert await ledger.get_remaining("user_1", 0) == 3
+    assert generator.generations_cancelled.value(endpoint="generate") == before + 1
@@ -0,0 +1,104 @@
+import json
+import pytest
+from unittest.mock import AsyncMock, patch
+from app.core import openai_manager
+from app.core.generation_cache import GenerationCache, cache_key
+from app.core.openai_manager import OpenAIManager
+from app.schemas.recipes import GeneratedRecipe
+
+TTLS = {"random": 60, "custom": 60, "crazy": 0}
+
+PARAMS = {
+    "recipe_type": "random",
+    "selected_ingredients": ["Chicken", "rice"],
+    "meal_type": "Dinner",
+    "cuisine": "thai",
+    "dietary_restrictions": ["gluten-free", "dairy-free"],
+    "servings": 2,
+    "is_spicy": True
+}
+
+@pytest.fixture
+def cache():
+    return GenerationCache(None, max_size=2, ttls=TTLS)
+
+class TestCacheKey:
+    def test_normalises_order_and_case(self):
+        reordered = {
+            **PARAMS,
+            "selected_ingredients": ["RICE", " chicken "],
+            "meal_type": "dinner",
+            "dietary_restrictions": ["dairy-free", "Gluten-Free"]
+        }
+
+        assert cache_key(reordered) == cache_key(PARAMS)
+
+    def test_distinguishes_inputs(self):
+        assert cache_key({**PARAMS, "servings": 4}) != cache_key(PARAMS)
+        assert cache_key({**PARAMS, "is_spicy": False}) != cache_key(PARAMS)
+
+class TestGenerationCache:
+    @pytest.mark.asyncio
+    async def test_local_hit_returns_copy(self, cache):
+        await cache.set(PARAMS, {"title": "Pad Thai"})
+
+        hit = await cache.get(PARAMS)
+        hit["title"] = "mutated"
+
+        assert (await cache.get(PARAMS)) == {"title": "Pad Thai"}
+
+    @pytest.mark.asyncio
+    async def test_never_caches_crazy(self, cache):
+        crazy = {**PARAMS, "recipe_type": "crazy"}
+
+        await cache.set(crazy, {"title": "Chocolate Curry"})
+
+        assert await cache.get(crazy) is None
+
+    @pytest.mark.asyncio
+    async def test_lru_is_bounded(self, cache):
+        for servings in (1, 2, 3):
+            await cache.set({**PARAMS, "servings": servings}, {"servings": servings})
+
+        assert await cache.get({**PARAMS, "servings": 1}) is None
+        assert await cache.get({**PARAMS, "servings": 3}) == {"servings": 3}
+
+    @pytest.mark.asyncio
+    async def test_redis_tier_uses_type_ttl(self):
+        client = AsyncMock()
+        client.get.return_value = json.dumps({"title": "Shared"})
+        cache = GenerationCache(client, max_size=2, ttls=TTLS)
+
+        assert await cache.get(PARAMS) == {"title": "Shared"}
+        await cache.set(PARAMS, {"title": "Shared"})
+
+        client.get.assert_awaited_once()
+        assert client.set.call_args.kwargs["ex"] == 60
+
+    @pytest.mark.asyncio
+    async def test_redis_failure_is_a_miss(self):
+        client = AsyncMock()
+        client.get.side_effect = Exception("timeout")
+        cache = GenerationCache(client, max_size=2, ttls=TTLS)
+
+        assert await cache.get(PARAMS) is None
+
+@pytest.mark.asyncio
+async def test_hit_skips_completion(cache):
+    recipe = GeneratedRecipe(
+        title="Pad Thai",
+        description="Stir-fried noodles",
+        prep_time=10,
+        cook_time=10,
+        ingredients=[{"item": "rice noodles", "amount": 200, "unit": "g"}],
+        instructions=[{"step_number": 1, "content": "Soak the noodles"}],
+        nutritional_info={"calories": 600}
+    )
+    with patch.object(openai_manager, 'generation_cache', cache), \
+         patch.object(OpenAIManager, '_generate', AsyncMock(return_value=recipe)) as generate:
+        manager = OpenAIManager(client=AsyncMock())
+        first = await manager.generate_recipe(PARAMS)
+        second = await manager.generate_recipe({**PARAMS, "selected_ingredients": ["rice", "chicken"]})
+
+    assert first == second == recipe
+    generate.assert_awaited_once()
@@ -0,0 +1,212 @@
+import asyncio
+import pytest
+from contextlib import nullcontext
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy.dialects import postgresql
+from app.api.deps import ClerkUser, UserMetadata, verify_subscription_access
+from app.api.v1 import generator
+from app.core.database import get_db
+from app.services import generation_queue as queue_module
+from app.services.credit_ledger import CreditLedger, InMemoryCreditStore
+from app.services.generation_queue import (
+    ClaimedJob,
+    GenerationJobQueue,
+    GenerationWorkerPool
+)
+
+class FakeJobQueue(GenerationJobQueue):
+    """Keeps job rows in a dict; the SQL itself is covered by the compile test"""
+
+    def __init__(self, max_attempts=2, lease=60):
+        super().__init__(session_factory=nullcontext, lease=lease, max_attempts=max_attempts)
+        self.rows = {}
+        self.renewals = 0
+
+    def add(self, job_id, attempts=0, subscription_tier="free"):
+        self.rows[job_id] = {
+            "status": "queued", "attempts": attempts, "worker_id": None, "subscription_tier": subscription_tier
+        }
+
+    async def claim(self, worker_id):
+        for job_id, row in self.rows.items():
+            if row["status"] == "queued":
+                row.update(status="running", worker_id=worker_id, attempts=row["attempts"] + 1)
+                return ClaimedJob(
+                    id=job_id,
+                    user_id="user_1",
+                    request={"recipe_type": "random"},
+                    credits_reserved=1,
+                    attempts=row["attempts"],
+                    subscription_tier=row["subscription_tier"]
+                )
+        return None
+
+    async def _update_held(self, job, holder, **values):
+        row = self.rows[job.id]
+        if row["worker_id"] != holder or row["status"] != "running":
+            return False
+        if "locked_until" in values and "status" not in values:
+            self.renewals += 1
+        row.update(**values)
+        return True
+
+@pytest.fixture
+def ledger():
+    ledger = CreditLedger(InMemoryCreditStore(), sync=None)
+    with patch.object(queue_module, 'credit_ledger', ledger):
+        yield ledger
+
+def service_returning(generate):
+    return lambda db, **options: SimpleNamespace(generate_recipe=generate)
+
+def test_claim_skips_locked_rows():
+    sql = str(GenerationJobQueue().claim_statement(datetime.now(timezone.utc)).compile(
+        dialect=postgresql.dialect()
+    ))
+
+    assert "FOR UPDATE SKIP LOCKED" in sql
+    assert "ORDER BY generation_jobs.created_at" in sql
+
+@pytest.mark.asyncio
+async def test_successful_job_commits_reserved_credit(ledger):
+    queue = FakeJobQueue()
+    queue.add("job_1")
+    await ledger.reserve("user_1", remaining=5)
+    generate = AsyncMock(return_value=SimpleNamespace(id="recipe_1"))
+    pool = GenerationWorkerPool(queue, concurrency=1, poll_interval=0.01)
+
+    with patch.object(queue_module, 'RecipeGeneratorService', service_returning(generate)):
+        assert await pool.run_once("worker_1")
+        assert not await pool.run_once("worker_1")
+
+    assert queue.rows["job_1"]["status"] == "succeeded"
+    assert queue.rows["job_1"]["recipe_id"] == "recipe_1"
+    assert await ledger.store.get("user_1") == (4, 1)
+
+@pytest.mark.asyncio
+async def test_job_runs_with_the_tier_it_was_enqueued_with(ledger):
+    queue = FakeJobQueue()
+    queue.add("job_1", subscription_tier="premium")
+    await ledger.reserve("user_1", remaining=5)
+    services = []
+
+    def service(db, **options):
+        services.append(options)
+        return SimpleNamespace(generate_recipe=AsyncMock(return_value=SimpleNamespace(id="recipe_1")))
+
+    pool = GenerationWorkerPool(queue, concurrency=1, poll_interval=0.01)
+    with patch.object(queue_module, 'RecipeGeneratorService', service):
+        await pool.run_once("worker_1")
+
+    assert services == [{"subscription_tier": "premium", "background": True}]
+
+@pytest.mark.asyncio
+async def test_failed_job_is_retried_then_refunded(ledger):
+    queue = FakeJobQueue(max_attempts=2)
+    queue.add("job_1")
+    await ledger.reserve("user_1", remaining=5)
+    generate = AsyncMock(side_effect=RuntimeError("OpenAI down"))
+    pool = GenerationWorkerPool(queue, concurrency=1, poll_interval=0.01)
+
+    with patch.object(queue_module, 'RecipeGeneratorService', service_returning(generate)):
+        await pool.run_once("worker_1")
+        assert queue.rows["job_1"]["status"] == "queued"
+        await pool.run_once("worker_2")
+
+    assert generate.await_count == 2
+    assert queue.rows["job_1"]["status"] == "failed"
+    assert await ledger.store.get("user_1") == (5, 0)
+
+@pytest.mark.asyncio
+async def test_reclaimed_job_does_not_settle_twice(ledger):
+    queue = FakeJobQueue()
+    queue.add("job_1")
+    await ledger.reserve("user_1", remaining=5)
+    pool = GenerationWorkerPool(queue, concurrency=1, poll_interval=0.01)
+
+    async def generate(request, user_id):
+        # The lease ran out and another worker took the job over
+        queue.rows["job_1"]["worker_id"] = "worker_2"
+        return SimpleNamespace(id="recipe_1")
+
+    with patch.object(queue_module, 'RecipeGeneratorService', service_returning(generate)):
+        await pool.run_once("worker_1")
+
+    assert queue.rows["job_1"]["status"] == "running"
+    assert await ledger.store.get("user_1") == (4, 0)
+
+@pytest.mark.asyncio
+async def test_running_job_keeps_renewing_its_lease(ledger):
+    queue = FakeJobQueue(lease=0.03)
+    queue.add("job_1")
+    await ledger.reserve("user_1", remaining=5)
+    pool = GenerationWorkerPool(queue, concurrency=1, poll_interval=0.01)
+
+    async def generate(request, user_id):
+        await asyncio.sleep(0.1)  # Outlives the lease several times over
+        return SimpleNamespace(id="recipe_1")
+
+    with patch.object(queue_module, 'RecipeGeneratorService', service_returning(generate)):
+        await pool.run_once("worker_1")
+
+    assert queue.renewals >= 2
+    assert queue.rows["job_1"]["status"] == "succeeded"
+    assert await ledger.store.get("user_1") == (4, 1)
+
+@pytest.mark.asyncio
+async def test_job_taken_over_mid_generation_is_abandoned_before_storing(ledger):
+    queue = FakeJobQueue(lease=0.03)
+    queue.add("job_1")
+    await ledger.reserve("user_1", remaining=5)
+    pool = GenerationWorkerPool(queue, concurrency=1, poll_interval=0.01)
+    stored = []
+
+    async def generate(request, user_id):
+        queue.rows["job_1"]["worker_id"] = "worker_2"
+        await asyncio.sleep(1)
+        stored.append(user_id)
+        return SimpleNamespace(id="recipe_1")
+
+    with patch.object(queue_module, 'RecipeGeneratorService', service_returning(generate)):
+        assert await pool.run_once("worker_1")
+
+    assert stored == []
+    assert queue.rows["job_1"] == {
+        "status": "running", "attempts": 1, "worker_id": "worker_2", "subscription_tier": "free"
+    }
+    assert await ledger.store.get("user_1") == (4, 0)
+
+def test_claim_only_looks_at_runnable_jobs():
+    sql = str(GenerationJobQueue().claim_statement(datetime.now(timezone.utc)).compile(
+        dialect=postgresql.dialect()
+    ))
+    # The claim matches the runnable-jobs partial index predicate
+    assert "generation_jobs.status = %(status_1)s OR generation_jobs.status = %(status_2)s" in sql
+
+def test_queued_generation_points_at_its_polling_route():
+    app = FastAPI()
+    app.include_router(generator.router, prefix="/api/v1/generator")  # As app.main mounts it
+    app.dependency_overrides[verify_subscription_access] = lambda: ClerkUser(
+        id="user_1", metadata=UserMetadata(subscription_tier="premium", recipes_remaining=3)
+    )
+    app.dependency_overrides[get_db] = lambda: MagicMock()
+    job = SimpleNamespace(
+        id="job_1", status="queued", attempts=0, error=None, recipe_id=None,
+        created_at=None, finished_at=None
+    )
+    queue = SimpleNamespace(enqueue=AsyncMock(return_value=job), get=AsyncMock(return_value=job))
+
+    with patch.object(generator, "credit_ledger", CreditLedger(InMemoryCreditStore(), sync=None)), \
+         patch.object(generator, "generation_queue", queue):
+        client = TestClient(app)
+        queued = client.post("/api/v1/generator/generate?queue=true", json={"recipe_type": "random"})
+        polled = client.get(queued.headers["Location"])
+
+    assert queued.status_code == 202
+    assert polled.status_code == 200
+    assert polled.json()["job_id"] == "job_1"
+    assert queue.enqueue.await_args.args[3] == "premium"
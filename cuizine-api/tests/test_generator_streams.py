@@ -0,0 +1,97 @@
+import pytest
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.api.deps import ClerkUser, UserMetadata
+from app.api.v1 import generator
+from app.schemas.recipes import RecipeBatchRequest, RecipeGenerationRequest
+from app.services.recipe_generator import BatchItemResult
+from app.services.credit_ledger import ClerkMetadataSync, CreditLedger, InMemoryCreditStore
+from app.utils.json_stream import JSONStreamEvent
+
+class Sessions:
+    """Stands in for SessionLocal, tracking which sessions are still open"""
+
+    def __init__(self):
+        self.open = []
+        self.closed = []
+
+    def __call__(self):
+        db = MagicMock(spec=AsyncSession)
+
+        async def enter():
+            self.open.append(db)
+            return db
+
+        async def exit(*exc_info):
+            self.open.remove(db)
+            self.closed.append(db)
+            return False
+
+        db.__aenter__.side_effect = enter
+        db.__aexit__.side_effect = exit
+        return db
+
+def make_ledger():
+    store = InMemoryCreditStore()
+    return CreditLedger(store, ClerkMetadataSync(store, interval=60, batch_size=10, concurrency=1))
+
+def user():
+    return ClerkUser(id="user_1", metadata=UserMetadata(recipes_remaining=3))
+
+def response(**fields):
+    return SimpleNamespace(model_dump=lambda mode: {"generation_id": fields["generation_id"]})
+
+async def body(streaming_response):
+    return "".join([chunk async for chunk in streaming_response.body_iterator])
+
+@pytest.mark.asyncio
+async def test_stream_stores_through_a_session_it_owns():
+    sessions = Sessions()
+    saved_with = []
+
+    async def stream_recipe(self, request, user_id):
+        yield JSONStreamEvent("field", "title", "Rice bowl")
+        # Stored while the stream is running, long after the endpoint returned
+        assert self.db in sessions.open
+        saved_with.append(self.db)
+        yield JSONStreamEvent("complete", "recipe", SimpleNamespace(id="recipe_1"))
+
+    ledger = make_ledger()
+    with patch.object(generator, "credit_ledger", ledger), \
+         patch.object(generator, "SessionLocal", sessions), \
+         patch.object(generator, "RecipeResponse", response), \
+         patch.object(generator.RecipeGeneratorService, "stream_recipe", stream_recipe):
+        streaming = await generator.stream_recipe_endpoint(
+            RecipeGenerationRequest(recipe_type="random", ingredients=["rice"]), user=user()
+        )
+        assert sessions.closed == sessions.open == []
+        text = await body(streaming)
+
+    assert "event: recipe" in text
+    assert sessions.closed == saved_with
+    assert await ledger.get_remaining("user_1", 0) == 2
+
+@pytest.mark.asyncio
+async def test_batch_left_early_charges_only_the_recipes_it_stored():
+    sessions = Sessions()
+
+    async def generate_batch(self, requests, user_id, concurrency):
+        assert self.db in sessions.open
+        yield BatchItemResult(0, recipe=SimpleNamespace(model_dump=lambda mode: {"id": "recipe_0"}))
+        yield BatchItemResult(1, error="Failed")
+        yield BatchItemResult(2, recipe=SimpleNamespace(model_dump=lambda mode: {"id": "recipe_2"}))
+
+    ledger = make_ledger()
+    requests = [RecipeGenerationRequest(recipe_type="random", ingredients=["rice"])] * 3
+    with patch.object(generator, "credit_ledger", ledger), \
+         patch.object(generator, "SessionLocal", sessions), \
+         patch.object(generator.RecipeGeneratorService, "generate_batch", generate_batch):
+        streaming = await generator.generate_batch_endpoint(RecipeBatchRequest(requests=requests), user=user())
+        events = streaming.body_iterator
+        assert (await events.__anext__()).startswith("event: recipe")
+        await events.aclose()  # The client went away after the first recipe
+
+    assert len(sessions.closed) == 1 and sessions.open == []
+    assert await ledger.get_remaining("user_1", 0) == 2
+    assert await ledger.store.get("user_1") == (2, 1)
@@ -0,0 +1,198 @@
+import asyncio
+import json
+import pytest
+from types import SimpleNamespace
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import JSONResponse
+from fastapi.testclient import TestClient
+from unittest.mock import MagicMock, patch
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.api.deps import ClerkUser, UserMetadata, get_current_user
+from app.api.v1 import generator, shopping
+from app.core.database import get_db
+from app.core.idempotency import REPLAYED_HEADER, Idempotency, InMemoryIdempotencyStore, request_fingerprint
+from app.schemas.recipes import RecipeGenerationRequest
+from app.services.credit_ledger import ClerkMetadataSync, CreditLedger, InMemoryCreditStore
+
+def make_idempotency(store=None, poll_interval=0.01, lock_ttl=5):
+    return Idempotency(store or InMemoryIdempotencyStore(), ttl=60, lock_ttl=lock_ttl, poll_interval=poll_interval)
+
+class Handler:
+    def __init__(self, delay=0.0, fail=0):
+        self.delay = delay
+        self.fail = fail
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.calls <= self.fail:
+            raise HTTPException(status_code=500, detail="Failed to generate recipe")
+        return {"call": self.calls}
+
+class Sessions:
+    """Stands in for SessionLocal, remembering the sessions it opened"""
+
+    def __init__(self):
+        self.opened = []
+
+    def __call__(self):
+        db = MagicMock(spec=AsyncSession)
+        db.__aenter__.return_value = db
+        self.opened.append(db)
+        return db
+
+def run(idempotency, handler, key="key-1", body=None):
+    return idempotency.run("generate", "user_1", key, request_fingerprint(body or {"a": 1}), handler)
+
+@pytest.mark.asyncio
+async def test_concurrent_retry_attaches_to_the_running_request():
+    idempotency = make_idempotency()
+    handler = Handler(delay=0.05)
+
+    first, retry = await asyncio.gather(run(idempotency, handler), run(idempotency, handler))
+
+    assert handler.calls == 1
+    assert first.body == retry.body
+    assert REPLAYED_HEADER.lower() not in first.headers
+    assert retry.headers[REPLAYED_HEADER] == "true"
+
+@pytest.mark.asyncio
+async def test_retry_on_another_worker_waits_for_the_response_then_replays():
+    store = InMemoryIdempotencyStore()
+    worker_a, worker_b = make_idempotency(store), make_idempotency(store)
+    handler = Handler(delay=0.05)
+
+    first, waited = await asyncio.gather(run(worker_a, handler), run(worker_b, handler))
+    later = await run(make_idempotency(store), handler)
+
+    assert handler.calls == 1
+    assert json.loads(waited.body) == json.loads(later.body) == {"call": 1}
+    assert waited.status_code == later.status_code == 200
+
+@pytest.mark.asyncio
+async def test_first_request_finishes_after_its_client_leaves():
+    idempotency = make_idempotency()
+    handler = Handler(delay=0.05)
+
+    first = asyncio.create_task(run(idempotency, handler))
+    await asyncio.sleep(0.01)
+    first.cancel()
+    retry = await run(idempotency, handler)
+
+    assert handler.calls == 1
+    assert json.loads(retry.body) == {"call": 1}
+
+@pytest.mark.asyncio
+async def test_failure_releases_the_key_for_a_retry():
+    idempotency = make_idempotency()
+    handler = Handler(fail=1)
+
+    with pytest.raises(HTTPException):
+        await run(idempotency, handler)
+    retry = await run(idempotency, handler)
+
+    assert handler.calls == 2
+    assert json.loads(retry.body) == {"call": 2}
+
+@pytest.mark.asyncio
+async def test_first_response_is_the_handlers_and_replays_keep_its_headers():
+    store = InMemoryIdempotencyStore()
+    accepted = JSONResponse({"job_id": "job_1"}, status_code=202, headers={"Location": "/jobs/job_1"})
+
+    async def enqueue():
+        return accepted
+
+    first = await run(make_idempotency(store), enqueue)
+    replayed = await run(make_idempotency(store), Handler())
+
+    assert first is accepted
+    assert replayed.status_code == 202
+    assert replayed.headers["Location"] == "/jobs/job_1"
+    assert replayed.headers["content-type"] == "application/json"
+    assert replayed.headers[REPLAYED_HEADER] == "true"
+
+@pytest.mark.asyncio
+async def test_key_reused_with_a_different_body_is_rejected():
+    idempotency = make_idempotency()
+    await run(idempotency, Handler(), body={"a": 1})
+
+    with pytest.raises(HTTPException) as e:
+        await run(idempotency, Handler(), body={"a": 2})
+    assert e.value.status_code == 422
+
+@pytest.mark.asyncio
+async def test_gives_up_with_409_when_the_other_worker_never_finishes():
+    store = InMemoryIdempotencyStore()
+    running = asyncio.create_task(run(make_idempotency(store), Handler(delay=1)))
+    await asyncio.sleep(0.01)
+
+    with pytest.raises(HTTPException) as e:
+        await run(make_idempotency(store, lock_ttl=0.05), Handler())
+    assert e.value.status_code == 409
+    running.cancel()
+
+@pytest.mark.asyncio
+async def test_generate_retry_spends_one_completion_and_one_credit():
+    store = InMemoryCreditStore()
+    ledger = CreditLedger(store, ClerkMetadataSync(store, interval=60, batch_size=10, concurrency=1))
+    user = ClerkUser(id="user_1", metadata=UserMetadata(recipes_remaining=3))
+    sessions = Sessions()
+    request_db = MagicMock()
+    calls = []
+
+    async def generate(self, request, user_id):
+        calls.append(self.db)
+        await asyncio.sleep(0.02)
+        return SimpleNamespace(id=f"recipe_{len(calls)}")
+
+    def response(**fields):
+        return {"generation_id": fields["generation_id"], "credits_remaining": fields["credits_remaining"]}
+
+    request = RecipeGenerationRequest(recipe_type="random", ingredients=["rice"])
+    with patch.object(generator, "credit_ledger", ledger), \
+         patch.object(generator, "idempotency", make_idempotency()), \
+         patch.object(generator, "SessionLocal", sessions), \
+         patch.object(generator.RecipeGeneratorService, "generate_recipe", generate), \
+         patch.object(generator, "RecipeResponse", response):
+        responses = await asyncio.gather(*[
+            generator.generate_recipe_endpoint(
+                request, None, queue=False, idempotency_key="retry-me", user=user, db=request_db
+            )
+            for _ in range(3)
+        ])
+
+    # The keyed generation can outlive the request, so it never uses the request's session
+    assert calls == sessions.opened
+    assert len(calls) == 1
+    assert {r.body for r in responses} == {responses[0].body}
+    assert json.loads(responses[0].body) == {"generation_id": "recipe_1", "credits_remaining": 2}
+    assert await ledger.get_remaining("user_1", 0) == 2
+
+def test_shopping_list_create_is_replayed_with_its_status():
+    app = FastAPI()
+    app.include_router(shopping.router, prefix="/api/v1/shopping")
+    app.dependency_overrides[get_current_user] = lambda: ClerkUser(id="user_1", metadata=UserMetadata())
+    app.dependency_overrides[get_db] = lambda: MagicMock()
+    sessions = Sessions()
+    created = []
+
+    async def create_list(self, recipe_id, user_id, servings=None):
+        assert self.db in sessions.opened
+        created.append(recipe_id)
+        return SimpleNamespace(id=f"list_{len(created)}", user_id=user_id, recipe_id=recipe_id, name="Rice", items=[])
+
+    headers = {"Idempotency-Key": "list-1"}
+    with patch.object(shopping, "idempotency", make_idempotency()), \
+         patch.object(shopping, "SessionLocal", sessions), \
+         patch.object(shopping.ShoppingListService, "create_list_from_recipe", create_list):
+        client = TestClient(app)
+        first = client.post("/api/v1/shopping", json={"recipe_id": "recipe_1"}, headers=headers)
+        retry = client.post("/api/v1/shopping", json={"recipe_id": "recipe_1"}, headers=headers)
+        other = client.post("/api/v1/shopping", json={"recipe_id": "recipe_2"}, headers=headers)
+
+    assert created == ["recipe_1"]
+    assert first.status_code == retry.status_code == 201
+    assert retry.json()["data"]["id"] == "list_1"
+    assert retry.headers[REPLAYED_HEADER] == "true"
+    assert other.status_code == 422
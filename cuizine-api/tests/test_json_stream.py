@@ -0,0 +1,60 @@
+import json
+import pytest
+from app.utils.json_stream import IncrementalJSONParser
+
+RECIPE = {
+    "title": "Brace {yourself} \"chili\"",
+    "ingredients": [
+        {"amount": 1, "unit": "cup", "item": "beans, [dried]"},
+        {"amount": 2, "unit": "tbsp", "item": "oil"}
+    ],
+    "instructions": [
+        {"step": 1, "content": "Soak \\ rinse"},
+        {"step": 2, "content": "Simmer"}
+    ],
+    "nutritional_info": {"calories": 400, "protein": 20},
+    "tips": []
+}
+
+def _feed_in_chunks(parser, text, size):
+    events = []
+    for i in range(0, len(text), size):
+        events.extend(parser.feed(text[i:i + size]))
+    return events
+
+@pytest.mark.parametrize("size", [1, 7, 4096])
+def test_events_match_document_for_any_chunking(size):
+    # Arrange
+    text = json.dumps(RECIPE, indent=2)
+    parser = IncrementalJSONParser(stream_arrays=("ingredients", "instructions"))
+
+    # Act
+    events = _feed_in_chunks(parser, text, size)
+
+    # Assert
+    assert [(e.kind, e.key, e.index) for e in events] == [
+        ("field", "title", None),
+        ("item", "ingredients", 0),
+        ("item", "ingredients", 1),
+        ("item", "instructions", 0),
+        ("item", "instructions", 1),
+        ("field", "nutritional_info", None),
+        ("field", "tips", None)
+    ]
+    assert events[0].value == RECIPE["title"]
+    assert events[2].value == RECIPE["ingredients"][1]
+    assert parser.done
+    assert parser.result() == RECIPE
+
+def test_field_is_emitted_as_soon_as_it_is_complete():
+    # Arrange
+    parser = IncrementalJSONParser()
+
+    # Act
+    first = parser.feed('{"title": "Soup", "desc')
+    second = parser.feed('ription": "Hot"')
+
+    # Assert
+    assert [(e.key, e.value) for e in first] == [("title", "Soup")]
+    assert second == []
+    assert not parser.done
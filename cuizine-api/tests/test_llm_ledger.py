@@ -0,0 +1,149 @@
+import asyncio
+import json
+import pytest
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from unittest.mock import patch
+from openai import AsyncOpenAI
+from sqlalchemy.dialects import postgresql
+from app.core import openai_manager
+from app.core.generation_cache import GenerationCache
+from app.core.openai_manager import OpenAIManager
+from app.core.retry_policy import RetryPolicy
+from app.monitoring.llm_ledger import LLMCallLedger, usage_summary_statement
+from fakes.openai_server import Fault, FakeOpenAIServer
+
+PARAMETERS = {
+    "recipe_type": "custom",
+    "selected_ingredients": ["pasta"],
+    "subscription_tier": "pro",
+    "user_id": "user_1"
+}
+
+class FakeSession:
+    def __init__(self, batches, fail=False):
+        self.batches = batches
+        self.fail = fail
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, statement, rows):
+        if self.fail:
+            raise ConnectionError("database is down")
+        self.batches.append(rows)
+
+    async def commit(self):
+        pass
+
+def make_ledger(batches, fail=False, **options):
+    return LLMCallLedger(session_factory=lambda: FakeSession(batches, fail), **options)
+
+@pytest.mark.asyncio
+async def test_flush_writes_in_batches():
+    batches = []
+    ledger = make_ledger(batches, batch_size=2, interval=60)
+    for i in range(5):
+        ledger.record(user_id=f"user_{i}", latency_ms=i)
+
+    assert await ledger.flush() == 5
+    assert [len(b) for b in batches] == [2, 2, 1]
+    assert ledger.pending == 0
+    assert all(row["id"] and row["created_at"] for b in batches for row in b)
+
+@pytest.mark.asyncio
+async def test_full_batch_is_written_without_waiting_for_the_interval():
+    batches = []
+    ledger = make_ledger(batches, batch_size=3, interval=60)
+    ledger.start()
+    try:
+        for i in range(3):
+            ledger.record(latency_ms=i)
+        for _ in range(50):
+            if batches:
+                break
+            await asyncio.sleep(0.01)
+    finally:
+        await ledger.stop()
+
+    assert [len(b) for b in batches] == [3]
+
+@pytest.mark.asyncio
+async def test_buffer_is_bounded_and_write_failures_are_dropped():
+    batches = []
+    ledger = make_ledger(batches, fail=True, batch_size=10, max_pending=2)
+    for i in range(4):
+        ledger.record(latency_ms=i)
+
+    assert ledger.pending == 2
+    assert await ledger.flush() == 0
+    assert ledger.pending == 0
+
+def test_summary_uses_percentiles_per_group():
+    since = datetime(2026, 10, 1, tzinfo=timezone.utc)
+    sql = str(usage_summary_statement("tier", since, user_id="user_1").compile(dialect=postgresql.dialect()))
+
+    assert "percentile_cont" in sql
+    assert "WITHIN GROUP (ORDER BY llm_calls.latency_ms)" in sql
+    assert "GROUP BY llm_calls.subscription_tier" in sql
+    assert "llm_calls.user_id =" in sql
+
+@pytest.mark.asyncio
+async def test_generation_records_tokens_retries_and_cache_hits():
+    ledger = make_ledger([], interval=60)
+    cache = GenerationCache(None, max_size=8, ttls={"custom": 60})
+    with FakeOpenAIServer([Fault(status=500)]) as server, \
+         patch.object(openai_manager, "llm_ledger", ledger), \
+         patch.object(openai_manager, "generation_cache", cache):
+        client = AsyncOpenAI(api_key="sk-test", base_url=server.url, max_retries=0)
+        policy = RetryPolicy(deadline=5.0, attempt_timeout=2.0, base_delay=0.01, max_delay=0.05)
+        manager = OpenAIManager(client=client, retry_policy=policy)
+        await manager.generate_recipe(PARAMETERS)
+        await manager.generate_recipe(PARAMETERS)
+
+    miss, hit = ledger._pending
+    assert miss["cache"] == "miss" and miss["status"] == "ok"
+    assert miss["model"] == "gpt-4o-mini"
+    assert (miss["prompt_tokens"], miss["completion_tokens"]) == (100, 200)
+    assert miss["retries"] == 1
+    assert miss["user_id"] == "user_1" and miss["subscription_tier"] == "pro"
+    assert miss["first_token_ms"] is None
+    assert hit["cache"] == "hit" and hit["model"] is None
+    assert hit["prompt_tokens"] == hit["completion_tokens"] == 0
+
+@pytest.mark.asyncio
+async def test_abandoned_stream_is_recorded_as_cancelled():
+    ledger = make_ledger([], interval=60)
+    recipe = {"title": "Pantry Pasta", "description": "Quick", "prep_time": 5, "cook_time": 10}
+    text = json.dumps(recipe)
+
+    async def chunks():
+        for i in range(0, len(text), 8):
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text[i:i + 8]))])
+
+    class Stream:
+        def __aiter__(self):
+            return chunks()
+
+        async def close(self):
+            pass
+
+    async def create(**kwargs):
+        return Stream()
+
+    client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    with patch.object(openai_manager, "llm_ledger", ledger):
+        manager = OpenAIManager(client=client, output_format="verbose")
+        stream = manager.stream_recipe({**PARAMETERS, "fresh": True})
+        first = await stream.__anext__()
+        await stream.aclose()
+
+    assert first.key == "title"
+    [call] = ledger._pending
+    assert call["status"] == "cancelled" and call["streamed"] is True
+    assert call["cache"] == "bypass"
+    assert call["first_token_ms"] is not None
+    assert openai_manager._admission.in_use == 0
@@ -0,0 +1,21 @@
+from app.monitoring.metrics import MetricsRegistry
+
+def test_counter_labels():
+    registry = MetricsRegistry()
+    hits = registry.counter("cache_hits", "Cache hits")
+
+    hits.inc(tier="free")
+    hits.inc(2, tier="pro")
+
+    assert hits.value(tier="pro") == 2
+    assert registry.snapshot()["cache_hits"]["values"] == {"tier=free": 1, "tier=pro": 2}
+
+def test_histogram_percentiles():
+    registry = MetricsRegistry()
+    latency = registry.histogram("latency", "Latency", buckets=(1, 2, 5, 10))
+
+    for value in [0.5] * 90 + [8] * 10:
+        latency.observe(value)
+
+    assert latency.percentile(0.5) <= 1
+    assert 5 < latency.percentile(0.95) <= 10
@@ -0,0 +1,156 @@
+import json
+import os
+import pytest
+from openai import AsyncOpenAI
+from app.core import openai_manager
+from app.core.model_router import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, ModelRouter
+from app.core.openai_manager import OpenAIManager
+from app.core.retry_policy import RetryPolicy
+from fakes.openai_server import Fault, FakeOpenAIServer
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+def config(primary_url=None, fallback_url=None, slo=5.0):
+    return {
+        "backends": {
+            "primary": {"model": "primary-model", "base_url": primary_url, "slo_p95": slo},
+            "fallback": {"model": "fallback-model", "base_url": fallback_url, "slo_p95": 30.0}
+        },
+        "routes": {
+            "premium": {"*": ["primary", "fallback"]},
+            "*": {"crazy": ["fallback"], "*": ["primary", "fallback"]}
+        }
+    }
+
+class TestCircuitBreaker:
+    def make(self, clock):
+        return CircuitBreaker(slo_p95=1.0, max_error_rate=0.5, window=60, min_samples=4, cooldown=30, clock=clock)
+
+    def test_opens_on_error_rate_and_probes_after_cooldown(self):
+        clock = Clock()
+        breaker = self.make(clock)
+        for ok in (True, False, False, False):
+            breaker.record(0.1, ok)
+
+        assert breaker.state == OPEN
+        assert not breaker.available()
+
+        clock.now += 30
+        assert breaker.available()
+        assert breaker.state == HALF_OPEN
+        assert not breaker.available()  # Only one probe at a time
+
+        breaker.record(0.1, True)
+        assert breaker.state == CLOSED
+
+    def test_opens_when_p95_breaches_slo(self):
+        breaker = self.make(Clock())
+        for latency in (0.2, 0.3, 0.2, 2.5):
+            breaker.record(latency, True)
+
+        assert breaker.state == OPEN
+
+    def test_old_samples_leave_the_window(self):
+        clock = Clock()
+        breaker = self.make(clock)
+        for _ in range(3):
+            breaker.record(0.1, False)
+        clock.now += 61
+        breaker.record(0.1, False)
+
+        assert breaker.state == CLOSED
+
+class TestModelRouter:
+    def test_routes_fall_back_from_tier_and_type_to_catch_all(self):
+        router = ModelRouter(config())
+
+        assert router.route("premium", "crazy") == ["primary", "fallback"]
+        assert router.route("free", "crazy") == ["fallback"]
+        assert router.route("free", "random") == ["primary", "fallback"]
+
+    def test_rejects_routes_to_unknown_backends(self):
+        broken = config()
+        broken["routes"]["*"]["*"] = ["missing"]
+
+        with pytest.raises(ValueError):
+            ModelRouter(broken)
+
+    def test_skips_open_and_excluded_backends(self):
+        router = ModelRouter(config(), min_samples=1)
+        assert router.choose("free", "random", exclude={"primary"}).name == "fallback"
+
+        router.breakers["primary"].record(0.1, False)
+        assert router.choose("free", "random").name == "fallback"
+
+        router.breakers["fallback"].record(0.1, False)
+        assert router.choose("free", "random").name == "primary"  # Everything is down: use the preferred one
+
+    def test_reloads_changed_file_and_keeps_config_on_bad_file(self, tmp_path):
+        clock = Clock()
+        path = tmp_path / "routes.json"
+        path.write_text(json.dumps(config()))
+        router = ModelRouter(config(), path=str(path), reload_interval=5, clock=clock)
+
+        updated = config()
+        updated["routes"]["*"]["*"] = ["fallback"]
+        path.write_text(json.dumps(updated))
+        os.utime(path, (1, 1))  # Distinct mtime even on coarse filesystem clocks
+        clock.now += 5
+        assert router.reload()
+        assert router.choose("free", "random").name == "fallback"
+
+        path.write_text("{not json")
+        os.utime(path, (2, 2))
+        clock.now += 5
+        assert not router.reload()
+        assert router.choose("free", "random").name == "fallback"
+
+PARAMETERS = {"recipe_type": "random", "selected_ingredients": ["pasta"], "servings": 2, "fresh": True}
+
+def make_manager(router):
+    policy = RetryPolicy(deadline=5.0, attempt_timeout=2.0, base_delay=0.01, max_delay=0.05)
+    return OpenAIManager(client=AsyncOpenAI(api_key="sk-test", max_retries=0), retry_policy=policy, router=router)
+
+@pytest.mark.asyncio
+async def test_failed_backend_fails_over_on_retry():
+    with FakeOpenAIServer([Fault(status=503)]) as primary, FakeOpenAIServer() as fallback:
+        router = ModelRouter(config(primary.url, fallback.url))
+        recipe = await make_manager(router).generate_recipe(PARAMETERS)
+
+    assert recipe.title == "Pantry Pasta"
+    assert [r["model"] for r in primary.requests] == ["primary-model"]
+    assert [r["model"] for r in fallback.requests] == ["fallback-model"]
+    await openai_manager.close_openai_client()
+
+@pytest.mark.asyncio
+async def test_timed_out_backend_fails_over_on_retry():
+    with FakeOpenAIServer([Fault(delay=1.0)]) as primary, FakeOpenAIServer() as fallback:
+        router = ModelRouter(config(primary.url, fallback.url))
+        policy = RetryPolicy(deadline=5.0, attempt_timeout=0.2, base_delay=0.01, max_delay=0.05)
+        manager = OpenAIManager(
+            client=AsyncOpenAI(api_key="sk-test", max_retries=0), retry_policy=policy, router=router
+        )
+        recipe = await manager.generate_recipe(PARAMETERS)
+
+    assert recipe.title == "Pantry Pasta"
+    assert len(primary.requests) == 1
+    assert [r["model"] for r in fallback.requests] == ["fallback-model"]
+    await openai_manager.close_openai_client()
+
+@pytest.mark.asyncio
+async def test_slo_breach_moves_traffic_to_fallback():
+    with FakeOpenAIServer([Fault(delay=0.1), Fault(delay=0.1)]) as primary, FakeOpenAIServer() as fallback:
+        router = ModelRouter(config(primary.url, fallback.url, slo=0.05), min_samples=2)
+        manager = make_manager(router)
+        for _ in range(4):
+            await manager.generate_recipe(PARAMETERS)
+
+    assert len(primary.requests) == 2
+    assert len(fallback.requests) == 2
+    assert router.breakers["primary"].state == OPEN
+    await openai_manager.close_openai_client()
@@ -0,0 +1,171 @@
+import asyncio
+import json
+import pytest
+from types import SimpleNamespace
+from unittest.mock import patch
+from app.core import openai_manager
+from app.core.admission import AdmissionRejected, PriorityAdmission
+from app.core.openai_manager import (
+    OpenAIManager,
+    completion_queue_depth,
+    completion_slot,
+    get_openai_client
+)
+from app.core.generation_cache import generation_cache
+from app.schemas.recipes import GeneratedRecipe
+from app.monitoring.metrics import metrics
+
+class FakeCompletionStream:
+    def __init__(self, text, size):
+        self.chunks = [text[i:i + size] for i in range(0, len(text), size)]
+        self.closed = False
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for chunk in self.chunks:
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=chunk))])
+
+    async def close(self):
+        self.closed = True
+
+class FakeStreamingClient:
+    def __init__(self, text, size=5):
+        self.stream = FakeCompletionStream(text, size)
+        self.calls = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    async def create(self, **kwargs):
+        self.calls.append(kwargs)
+        return self.stream
+
+RECIPE = {
+    "title": "Pantry Pasta",
+    "description": "Quick",
+    "prep_time": 5,
+    "cook_time": 10,
+    "ingredients": [{"amount": 200, "unit": "g", "item": "pasta"}],
+    "instructions": [
+        {"step": 1, "content": "Boil the pasta"},
+        {"step": 2, "content": "Toss with the sauce"}
+    ],
+    "nutritional_info": {"calories": 500}
+}
+
+COMPACT_RECIPE = {
+    "t": "Pantry Pasta",
+    "d": "Quick",
+    "p": 5,
+    "c": 10,
+    "sv": 2,
+    "l": "beginner",
+    "i": [{"n": "pasta", "q": 200, "u": "g", "x": None}],
+    "s": [
+        {"c": "Boil the pasta", "m": 10},
+        {"c": "Toss with the sauce", "m": None}
+    ],
+    "n": {"cal": 500, "pro": 15, "carb": 80, "fat": 10},
+    "e": ["pot"],
+    "h": [],
+    "k": None,
+    "lo": []
+}
+
+PARAMETERS = {"recipe_type": "random", "selected_ingredients": ["pasta"], "servings": 2}
+
+def test_client_is_shared():
+    assert OpenAIManager().client is OpenAIManager().client is get_openai_client()
+
+@pytest.mark.asyncio
+async def test_completion_slots_cap_concurrency():
+    running = 0
+    peak = 0
+    depths = []
+
+    async def completion():
+        nonlocal running, peak
+        async with completion_slot():
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            depths.append(completion_queue_depth.value())
+            running -= 1
+
+    admission = PriorityAdmission(capacity=2, headstarts={}, max_wait=60)
+    with patch.object(openai_manager, '_admission', admission):
+        await asyncio.gather(*[completion() for _ in range(6)])
+
+    assert peak == 2
+    # The first two run while the other four wait behind them
+    assert depths[0] == 4
+    assert completion_queue_depth.value() == 0
+    assert metrics.snapshot()["openai_completion_slot_wait_seconds"]["values"]["tier=free"]["count"] >= 6
+
+@pytest.mark.asyncio
+async def test_shed_completion_is_not_retried():
+    # Arrange
+    manager = OpenAIManager(client=FakeStreamingClient("{}"))
+    admission = PriorityAdmission(capacity=1, headstarts={}, max_wait=1, initial_service_time=30)
+    await admission.acquire("free")
+
+    # Act
+    with patch.object(openai_manager, '_admission', admission):
+        with pytest.raises(AdmissionRejected) as rejected:
+            await manager._generate({**PARAMETERS, "subscription_tier": "free"})
+
+    # Assert
+    assert rejected.value.retry_after == 30
+    assert manager.client.calls == []
+
+@pytest.mark.asyncio
+async def test_stream_recipe_yields_fields_before_completion_and_caches():
+    # Arrange
+    generation_cache.clear()
+    client = FakeStreamingClient(json.dumps(RECIPE))
+    manager = OpenAIManager(client=client, output_format="verbose")
+
+    # Act
+    events = [event async for event in manager.stream_recipe(PARAMETERS)]
+    replayed = [event async for event in manager.stream_recipe(PARAMETERS)]
+
+    # Assert
+    assert client.calls[0]["stream"] is True
+    assert len(client.calls) == 1
+    assert client.stream.closed
+    assert [(e.kind, e.key) for e in events[:2]] == [("field", "title"), ("field", "description")]
+    assert [e.index for e in events if e.key == "instructions"] == [0, 1]
+    assert events[-1].kind == "complete"
+    assert events[-1].value == GeneratedRecipe.model_validate(RECIPE)
+    assert replayed[-1].value == events[-1].value
+    assert [e.key for e in replayed if e.kind == "item"] == [e.key for e in events if e.kind == "item"]
+    generation_cache.clear()
+
+@pytest.mark.asyncio
+async def test_compact_stream_is_expanded_to_recipe_fields():
+    # Arrange
+    generation_cache.clear()
+    client = FakeStreamingClient(json.dumps(COMPACT_RECIPE), size=7)
+    manager = OpenAIManager(client=client, output_format="compact")
+
+    # Act
+    events = [event async for event in manager.stream_recipe({**PARAMETERS, "fresh": True})]
+
+    # Assert
+    assert client.calls[0]["response_format"]["json_schema"]["strict"] is True
+    assert client.calls[0]["max_tokens"] == 1500
+    assert [(e.kind, e.key) for e in events[:2]] == [("field", "title"), ("field", "description")]
+    ingredients = [e.value for e in events if e.key == "ingredients"]
+    assert ingredients == [{"item": "pasta", "amount": 200.0, "unit": "g", "notes": None}]
+    steps = [e.value for e in events if e.key == "instructions"]
+    assert [s["step_number"] for s in steps] == [1, 2]
+    assert steps[0]["timing"] == "10 minutes"
+    nutrition = next(e.value for e in events if e.key == "nutritional_info")
+    assert nutrition["calories"] == 500
+    recipe = events[-1].value
+    assert recipe.total_time == 15
+    assert recipe.instructions[1].content == "Toss with the sauce"
+    assert [e.key for e in events if e.kind == "field"] == [
+        "title", "description", "prep_time", "cook_time", "servings", "difficulty_level",
+        "nutritional_info", "equipment_needed", "recipe_tips", "storage_instructions", "leftover_ideas"
+    ]
@@ -0,0 +1,167 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, patch
+from app.core import rate_limit
+from app.core.rate_limit import (
+    InMemorySlidingWindow,
+    LocalTokenBucketLimiter,
+    SYNC_FAILURES_BEFORE_LOCAL_ONLY,
+    UpstashSlidingWindow,
+    check_rate_limit,
+    reset_rate_limit
+)
+
+@pytest.fixture
+def limiter():
+    backend = InMemorySlidingWindow()
+    with patch.object(rate_limit, 'rate_limiter', backend):
+        yield backend
+
+class TestInMemorySlidingWindow:
+    @pytest.mark.asyncio
+    async def test_allows_up_to_limit(self):
+        backend = InMemorySlidingWindow()
+
+        results = [await backend.hit("k", 3, 60_000, 1_000 + i) for i in range(4)]
+
+        assert [r[0] for r in results] == [True, True, True, False]
+        assert [r[1] for r in results] == [2, 1, 0, 0]
+        # Reset is when the oldest hit leaves the window
+        assert results[-1][2] == 61_000
+
+    @pytest.mark.asyncio
+    async def test_window_slides(self):
+        backend = InMemorySlidingWindow()
+        await backend.hit("k", 2, 1_000, 0)
+        await backend.hit("k", 2, 1_000, 500)
+
+        blocked, _, _ = await backend.hit("k", 2, 1_000, 900)
+        allowed, remaining, reset = await backend.hit("k", 2, 1_000, 1_000)
+
+        assert blocked is False
+        assert allowed is True
+        assert remaining == 0
+        assert reset == 1_500
+
+class TestCheckRateLimit:
+    @pytest.mark.asyncio
+    async def test_concurrent_requests_never_exceed_limit(self, limiter):
+        results = await asyncio.gather(*[
+            check_rate_limit("user_1:free", 10) for _ in range(50)
+        ])
+
+        assert sum(r.allowed for r in results) == 10
+        assert min(r.remaining for r in results) == 0
+
+    @pytest.mark.asyncio
+    async def test_reset(self, limiter):
+        for _ in range(2):
+            await check_rate_limit("user_1:free", 2)
+        assert not (await check_rate_limit("user_1:free", 2)).allowed
+
+        await reset_rate_limit("user_1:free")
+
+        assert (await check_rate_limit("user_1:free", 2)).allowed
+
+    @pytest.mark.asyncio
+    async def test_backend_failure_allows_request(self):
+        backend = AsyncMock()
+        backend.hit.side_effect = Exception("connection refused")
+
+        with patch.object(rate_limit, 'rate_limiter', backend):
+            result = await check_rate_limit("user_1:free", 10)
+
+        assert result.allowed
+        assert result.remaining is None
+
+@pytest.mark.asyncio
+async def test_upstash_backend_single_round_trip():
+    client = AsyncMock()
+    client.eval.return_value = [1, 9, 61_000]
+
+    result = await UpstashSlidingWindow(client).hit("rate:sw:u", 10, 60_000, 1_000)
+
+    assert result == (True, 9, 61_000)
+    client.eval.assert_awaited_once()
+    assert client.eval.call_args.kwargs["keys"] == ["rate:sw:u"]
+
+class TestLocalTokenBucketLimiter:
+    @pytest.fixture
+    def client(self):
+        client = AsyncMock()
+        client.eval.return_value = ["10"]
+        return client
+
+    @pytest.mark.asyncio
+    async def test_admits_without_remote_calls(self, client):
+        limiter = LocalTokenBucketLimiter(client, sync_interval_ms=250, overshoot=0.5)
+
+        results = [await limiter.hit("k", 10, 60_000, 1_000) for _ in range(6)]
+
+        # 50% overshoot: five unconfirmed requests, then wait for a sync
+        assert [r[0] for r in results] == [True] * 5 + [False]
+        client.eval.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_sync_batches_spent_tokens(self, client):
+        client.eval.return_value = ["8", "9"]
+        limiter = LocalTokenBucketLimiter(client, sync_interval_ms=250, overshoot=1.0)
+        await limiter.hit("a", 10, 60_000, 1_000)
+        await limiter.hit("a", 10, 60_000, 1_000)
+        await limiter.hit("b", 10, 60_000, 1_000)
+
+        await limiter.sync(now_ms=1_000)
+
+        client.eval.assert_awaited_once()
+        assert client.eval.call_args.kwargs["keys"] == ["a", "b"]
+        assert client.eval.call_args.kwargs["args"] == [1_000, 60_000, 10, 2, 10, 1]
+
+    @pytest.mark.asyncio
+    async def test_adopts_global_balance(self, client):
+        # Other workers have drained the shared bucket
+        client.eval.return_value = ["0"]
+        limiter = LocalTokenBucketLimiter(client, sync_interval_ms=250, overshoot=1.0)
+        await limiter.hit("k", 10, 60_000, 1_000)
+
+        await limiter.sync(now_ms=1_000)
+        allowed, remaining, _ = await limiter.hit("k", 10, 60_000, 1_000)
+
+        assert not allowed
+        assert remaining == 0
+
+    @pytest.mark.asyncio
+    async def test_failed_sync_keeps_pending(self, client):
+        client.eval.side_effect = Exception("timeout")
+        limiter = LocalTokenBucketLimiter(client, sync_interval_ms=250, overshoot=1.0)
+        await limiter.hit("k", 10, 60_000, 1_000)
+
+        with pytest.raises(Exception):
+            await limiter.sync(now_ms=1_000)
+        client.eval.side_effect = None
+        client.eval.return_value = ["9"]
+        await limiter.sync(now_ms=1_100)
+
+        assert client.eval.call_args.kwargs["args"][-1] == 1
+
+    @pytest.mark.asyncio
+    async def test_unreachable_redis_falls_back_to_local_buckets(self, client):
+        client.eval.side_effect = Exception("connection refused")
+        limiter = LocalTokenBucketLimiter(client, sync_interval_ms=250, overshoot=0.1)
+        assert (await limiter.hit("k", 10, 60_000, 1_000))[0]
+        assert not (await limiter.hit("k", 10, 60_000, 1_000))[0]
+
+        for _ in range(SYNC_FAILURES_BEFORE_LOCAL_ONLY):
+            with pytest.raises(Exception):
+                await limiter.sync(now_ms=1_000)
+        results = [(await limiter.hit("k", 10, 60_000, 1_000))[0] for _ in range(10)]
+
+        # The local bucket still holds the limit: 10 tokens, one already spent
+        assert results == [True] * 9 + [False]
+
+        client.eval.side_effect = None
+        client.eval.return_value = ["0"]
+        await limiter.sync(now_ms=1_000)
+
+        assert not limiter.local_only
+        # Only requests admitted after the outage are reported
+        assert client.eval.call_args.kwargs["args"][-1] == 9
@@ -0,0 +1,177 @@
+import pytest
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock, patch
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.recipes import Recipe
+from app.schemas.recipes import RecipeGenerationRequest
+from app.services import recipe_generator, recipe_library as library_module
+from app.services.recipe_generator import RecipeGeneratorService
+from app.services.recipe_library import RecipeLibrary
+
+CREATED = datetime(2026, 10, 1, tzinfo=timezone.utc)
+
+def stored_recipe(recipe_id, items, cuisine="Italian", meal_type="dinner", **overrides):
+    """A recipe row as the generator writes it: compact output leaves cuisine and meal type to the request"""
+    requested = RecipeGenerationRequest(
+        recipe_type="custom", ingredients=items, cuisine_type=cuisine, meal_type=meal_type
+    )
+    fields = {
+        "id": recipe_id,
+        "title": f"Recipe {recipe_id}",
+        "description": "Stored",
+        "prep_time": 10,
+        "cook_time": 20,
+        "total_time": 30,
+        "servings": 2,
+        "cuisine_type": [],
+        "meal_type": None,
+        "is_spicy": False,
+        "ingredients": [{"item": item, "amount": 1, "unit": "cup"} for item in items],
+        "instructions": [{"step_number": 1, "content": "Cook everything together"}],
+        "equipment_needed": [],
+        "nutritional_info": {},
+        "dietary_info": {"vegetarian": True},
+        "source_type": "ai",
+        "generated_from": requested.model_dump(mode="json"),
+        "creator_user_id": "author",
+        "created_at": CREATED
+    }
+    fields.update(overrides)
+    return Recipe(**fields)
+
+def params(ingredients, **overrides):
+    values = {
+        "recipe_type": "custom",
+        "selected_ingredients": ingredients,
+        "cuisine": None,
+        "meal_type": None,
+        "dietary_restrictions": [],
+        "servings": 2,
+        "is_spicy": False,
+        "fresh": False,
+        "subscription_tier": "free",
+        "user_id": "user_1"
+    }
+    values.update(overrides)
+    return values
+
+def make_library(*recipes, session_factory=None, max_entries=100):
+    library = RecipeLibrary(
+        session_factory=session_factory, min_score=0.9, top_k=1,
+        tiers=["free"], recipe_types=["custom"], enabled=True, max_entries=max_entries
+    )
+    for recipe in recipes:
+        library.add(recipe)
+    return library
+
+class TestRecipeLibrary:
+    def test_matches_requested_ingredients_by_word(self):
+        library = make_library(
+            stored_recipe("pasta", ["spaghetti", "Roma tomatoes", "fresh basil leaves"]),
+            stored_recipe("soup", ["tomato", "onion"], cuisine="French")
+        )
+
+        recipe_id, score = library.match(params(["tomato", "basil"], cuisine="italian"))
+
+        assert recipe_id == "pasta"
+        assert score == pytest.approx(1.0)
+
+    def test_missing_ingredient_or_cuisine_falls_below_the_threshold(self):
+        library = make_library(stored_recipe("pasta", ["spaghetti", "tomato"]))
+
+        assert library.match(params(["spaghetti", "tomato", "clams"])) is None
+        assert library.match(params(["spaghetti"], cuisine="Mexican")) is None
+
+    def test_requested_cuisine_and_meal_type_can_be_served(self):
+        library = make_library(stored_recipe("pasta", ["spaghetti"]))
+
+        recipe_id, score = library.match(params(["spaghetti"], cuisine="Italian", meal_type="Dinner"))
+
+        assert recipe_id == "pasta"
+        assert score == pytest.approx(1.0)
+        assert library.match(params(["spaghetti"], meal_type="breakfast")) is None
+
+    def test_hard_requirements_are_never_traded_for_score(self):
+        library = make_library(stored_recipe("pasta", ["spaghetti"]))
+
+        assert library.match(params(["spaghetti"], dietary_restrictions=["vegan"])) is None
+        assert library.match(params(["spaghetti"], dietary_restrictions=["Vegetarian"])) is not None
+        assert library.match(params(["spaghetti"], servings=4)) is None
+        assert library.match(params(["spaghetti"], is_spicy=True)) is None
+        assert library.match(params(["spaghetti"]), max_time=20) is None
+
+    def test_does_not_serve_users_their_own_recipes(self):
+        library = make_library(stored_recipe("pasta", ["spaghetti"], creator_user_id="user_1"))
+
+        assert library.match(params(["spaghetti"]), exclude_user="user_1") is None
+
+    def test_only_configured_tiers_and_types_are_served(self):
+        library = make_library()
+
+        assert library.serves(params([]))
+        assert not library.serves(params([], fresh=True))
+        assert not library.serves(params([], subscription_tier="premium"))
+        assert not library.serves(params([], recipe_type="crazy"))
+
+    def test_index_keeps_only_the_newest_entries(self):
+        library = make_library(
+            stored_recipe("old", ["spaghetti"]),
+            stored_recipe("mid", ["spaghetti"]),
+            stored_recipe("new", ["rice"]),
+            max_entries=2
+        )
+
+        assert len(library) == 2
+        assert library.match(params(["rice"]))[0] == "new"
+        assert library.match(params(["spaghetti"]))[0] == "mid"
+        assert "old" not in library._by_word.get("spaghetti", set())
+
+    @pytest.mark.asyncio
+    async def test_refresh_loads_only_new_rows(self):
+        later = stored_recipe("later", ["rice"], created_at=CREATED + timedelta(hours=1))
+        batches = [[stored_recipe("pasta", ["spaghetti"])], [later]]
+        statements = []
+        db = MagicMock(spec=AsyncSession)
+        db.__aenter__.return_value = db
+
+        async def scalars(statement):
+            statements.append(statement)
+            return MagicMock(**{"all.return_value": batches.pop(0)})
+
+        db.scalars.side_effect = scalars
+        library = make_library(session_factory=lambda: db)
+
+        assert await library.refresh() == 1
+        assert await library.refresh() == 1
+        assert len(library) == 2
+        assert "created_at >" not in str(statements[0])
+        assert "created_at >" in str(statements[1])
+
+@pytest.mark.asyncio
+async def test_service_serves_a_library_match_without_a_completion():
+    row = stored_recipe("pasta", ["spaghetti", "tomato"])
+    library = make_library(row)
+    ledger = MagicMock()
+    db = MagicMock(spec=AsyncSession)
+    db.scalar.return_value = None
+    db.get.return_value = row
+    service = RecipeGeneratorService(db)
+    service.openai = MagicMock()
+    request = RecipeGenerationRequest(recipe_type="custom", ingredients=["tomatoes"])
+
+    with patch.object(recipe_generator, "recipe_library", library), \
+         patch.object(library_module, "llm_ledger", ledger):
+        recipe = await service.generate_recipe(request, "user_1")
+
+    service.openai.generate_recipe.assert_not_called()
+    # The user gets their own copy; the author's recipe is untouched
+    copy = db.add.call_args.args[0]
+    assert recipe.id == copy.id != "pasta"
+    assert recipe.title == row.title
+    assert copy.creator_user_id == "user_1"
+    assert copy.source_type == "library"
+    assert copy.generated_from["ingredients"] == ["tomatoes"]
+    assert row.creator_user_id == "author"
+    db.commit.assert_awaited_once()
+    assert ledger.record.call_args.kwargs["cache"] == "library"
+    assert library_module.library_lookups.value(tier="free", recipe_type="custom", outcome="served") >= 1
@@ -0,0 +1,59 @@
+import pytest
+from unittest.mock import MagicMock
+from sqlalchemy.dialects.postgresql import asyncpg
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.schemas.recipes import RecipeLookupField, RecipeLookupMatch
+from app.services.recipe_storage import FuzzyMatch, RecipeStorageService
+
+def compiled(statement):
+    # asyncpg, as the app runs; its $n placeholders leave the % in `<%` unescaped
+    return str(statement.compile(dialect=asyncpg.dialect())), statement.compile().params
+
+async def lookup(query, field, rows=(), **kwargs):
+    db = MagicMock(spec=AsyncSession)
+    db.execute.return_value = list(rows)
+    matches = await RecipeStorageService(db).fuzzy_lookup(query, field, **kwargs)
+    return matches, [compiled(call.args[0]) for call in db.execute.call_args_list]
+
+@pytest.mark.asyncio
+async def test_title_lookup_uses_the_trigram_operator_best_first():
+    matches, [(setting, setting_params), (sql, params)] = await lookup(
+        "chiken curry", RecipeLookupField.TITLE, rows=[("r1", "Chicken curry", "Chicken curry", 0.8)],
+        limit=5, min_score=0.6
+    )
+
+    # The threshold applies to this transaction only
+    assert "set_config(" in setting
+    assert list(setting_params.values()) == ["pg_trgm.word_similarity_threshold", "0.6", True]
+    assert "<% recipes.title" in sql
+    assert "ORDER BY word_similarity(" in sql
+    assert "ingredient_names" not in sql
+    assert 5 in params.values()
+    assert matches == [FuzzyMatch("r1", "Chicken curry", "Chicken curry", 0.8)]
+
+@pytest.mark.asyncio
+async def test_ingredient_lookup_reports_the_closest_ingredient():
+    _, [_, (sql, params)] = await lookup("parmesian", RecipeLookupField.INGREDIENT)
+
+    assert "<% recipes.ingredient_names" in sql
+    assert "jsonb_array_elements_text(jsonb_path_query_array(" in sql
+    assert "'$[*].item'::jsonpath" in sql
+    assert list(params.values()).count("parmesian") >= 2
+
+@pytest.mark.asyncio
+async def test_user_recipes_filter_fuzzily_by_ingredient():
+    db = MagicMock(spec=AsyncSession)
+    db.scalars.return_value = MagicMock()
+
+    await RecipeStorageService(db).get_user_recipes("user_1", filters={"ingredient": "zuchini"})
+
+    sql, _ = compiled(db.scalars.call_args.args[0])
+    assert "<% recipes.ingredient_names" in sql
+    assert "set_config(" in str(db.execute.call_args.args[0])
+
+def test_match_serializes_for_the_api():
+    match = RecipeLookupMatch.model_validate(FuzzyMatch("r1", "Parmesan pasta", "parmesan", 0.73))
+
+    assert match.model_dump() == {
+        "recipe_id": "r1", "title": "Parmesan pasta", "matched": "parmesan", "score": 0.73
+    }
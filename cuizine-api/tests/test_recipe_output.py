@@ -0,0 +1,118 @@
+import json
+import pytest
+from pydantic import ValidationError
+from app.schemas.recipe_output import RECIPE_OUTPUT_SCHEMA, CompactRecipe
+from app.schemas.recipes import GeneratedRecipe, Recipe as RecipeSchema, RecipeGenerationRequest
+from app.services.recipe_generator import RecipeGeneratorService
+from unittest.mock import MagicMock
+
+COMPLETION = json.dumps({
+    "title": "Green Curry",
+    "description": "Fragrant Thai curry",
+    "prep_time": 15,
+    "cook_time": 20,
+    "servings": 4,
+    "difficulty_level": "intermediate",
+    "cuisine_type": "Thai",
+    "ingredients": [
+        {"amount": 400, "unit": "ml", "item": "coconut milk"},
+        {"amount": 1.255, "unit": "tbsp", "item": "green curry paste", "notes": "heaped"}
+    ],
+    "instructions": [
+        {"step": 1, "content": "Fry the paste until fragrant", "timing": "2 minutes"},
+        {"step": 2, "content": "Add the coconut milk and simmer"}
+    ],
+    "nutritional_info": {"calories": 450, "protein": 20, "carbs": 15, "fat": 35},
+    "tips": ["Use fresh basil"]
+})
+
+def test_completion_is_validated_in_one_pass():
+    recipe = GeneratedRecipe.model_validate_json(COMPLETION)
+
+    assert recipe.cuisine_type == ["Thai"]
+    assert recipe.recipe_tips == ["Use fresh basil"]
+    assert recipe.instructions[1].step_number == 2
+    assert str(recipe.ingredients[1].amount) == "1.26"
+
+def test_incomplete_output_is_rejected():
+    broken = json.loads(COMPLETION)
+    del broken["instructions"]
+
+    with pytest.raises(ValidationError):
+        GeneratedRecipe.model_validate_json(json.dumps(broken))
+
+def test_stored_row_and_response_come_from_the_same_validation():
+    generated = GeneratedRecipe.model_validate_json(COMPLETION)
+    service = RecipeGeneratorService(MagicMock())
+    request = RecipeGenerationRequest(recipe_type="custom", cooking_style="weeknight")
+
+    db_recipe = service._build_recipe(generated, "user_1", request)
+    response = RecipeSchema.from_generated(db_recipe, generated)
+
+    assert db_recipe.ingredients[1]["amount"] == "1.26"
+    assert db_recipe.total_time == 35
+    # Reading the stored row back yields the same response
+    assert response == RecipeSchema.from_db_model(db_recipe)
+    assert response.ingredients[0] is generated.ingredients[0]
+
+COMPACT = {
+    "t": "Green Curry",
+    "d": "Fragrant Thai curry",
+    "p": 15,
+    "c": 20,
+    "sv": 4,
+    "l": "intermediate",
+    "i": [
+        {"n": "coconut milk", "q": 400, "u": "ml", "x": None},
+        {"n": "green curry paste", "q": 1.255, "u": "tbsp", "x": "heaped"}
+    ],
+    "s": [
+        {"c": "Fry the paste until fragrant", "m": 2},
+        {"c": "Add the coconut milk and simmer", "m": None}
+    ],
+    "n": {"cal": 450, "pro": 20, "carb": 15, "fat": 35},
+    "e": ["wok"],
+    "h": ["Use fresh basil"],
+    "k": None,
+    "lo": []
+}
+
+def _objects(schema):
+    if isinstance(schema, dict):
+        if schema.get("type") == "object":
+            yield schema
+        for value in schema.values():
+            yield from _objects(value)
+    elif isinstance(schema, list):
+        for value in schema:
+            yield from _objects(value)
+
+def test_output_schema_satisfies_strict_mode():
+    objects = list(_objects(RECIPE_OUTPUT_SCHEMA))
+
+    assert len(objects) == 4
+    for schema in objects:
+        assert schema["additionalProperties"] is False
+        assert sorted(schema["required"]) == sorted(schema["properties"])
+    assert "allOf" not in json.dumps(RECIPE_OUTPUT_SCHEMA)
+    assert "default" not in json.dumps(RECIPE_OUTPUT_SCHEMA)
+
+def test_compact_output_expands_to_the_same_recipe():
+    compact = CompactRecipe.model_validate_json(json.dumps(COMPACT)).to_generated()
+    verbose = GeneratedRecipe.model_validate_json(COMPLETION)
+
+    assert compact.total_time == 35
+    assert compact.difficulty_level == "intermediate"
+    assert compact.instructions[0].timing == "2 minutes"
+    assert compact.instructions[1].step_number == 2
+    assert compact.ingredients == verbose.ingredients
+    assert compact.nutritional_info == verbose.nutritional_info
+    assert compact.recipe_tips == verbose.recipe_tips
+
+def test_compact_output_rejects_unknown_units_and_keys():
+    bad_unit = {**COMPACT, "i": [{"n": "salt", "q": 1, "u": "dash", "x": None}]}
+    extra_key = {**COMPACT, "title": "Green Curry"}
+
+    for broken in (bad_unit, extra_key):
+        with pytest.raises(ValidationError):
+            CompactRecipe.model_validate_json(json.dumps(broken))
@@ -0,0 +1,32 @@
+import pytest
+from unittest.mock import MagicMock
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.services.recipe_storage import RecipeStorageService
+
+async def searched_sql(query, **kwargs):
+    db = MagicMock(spec=AsyncSession)
+    db.scalars.return_value = MagicMock()
+    await RecipeStorageService(db).search_recipes(query, **kwargs)
+    statement = db.scalars.call_args.args[0]
+    return str(statement.compile(dialect=postgresql.dialect())), statement.compile().params
+
+@pytest.mark.asyncio
+async def test_search_matches_the_indexed_document_best_first():
+    sql, params = await searched_sql('"coconut milk" -shrimp', filters={"meal_type": "dinner"})
+
+    assert "recipes.search_vector @@ websearch_to_tsquery(" in sql
+    assert "ORDER BY ts_rank(recipes.search_vector, websearch_to_tsquery(" in sql
+    assert sql.index("ts_rank") < sql.index("recipes.created_at DESC")
+    assert "recipes.meal_type = " in sql
+    assert "ILIKE" not in sql.upper()
+    # The query text is bound as is for websearch syntax, never interpolated
+    assert '"coconut milk" -shrimp' in params.values()
+    assert "english" in params.values()
+
+@pytest.mark.asyncio
+async def test_blank_search_lists_newest_recipes():
+    sql, _ = await searched_sql("   ")
+
+    assert "search_vector" not in sql
+    assert "ORDER BY recipes.created_at DESC" in sql
@@ -0,0 +1,143 @@
+import asyncio
+import json
+import time
+import openai
+import pytest
+from contextlib import asynccontextmanager
+from unittest.mock import patch
+from openai import AsyncOpenAI
+from app.core import openai_manager
+from app.core.openai_manager import OpenAIManager
+from app.core.retry_policy import RetryBudgetExceeded, RetryPolicy, hedged_requests
+from fakes.openai_server import RECIPE, Fault, FakeOpenAIServer
+
+PARAMETERS = {"recipe_type": "random", "selected_ingredients": ["pasta"], "servings": 2}
+
+def make_manager(server, **policy):
+    options = {"deadline": 5.0, "attempt_timeout": 2.0, "base_delay": 0.01, "max_delay": 0.05}
+    options.update(policy)
+    client = AsyncOpenAI(api_key="sk-test", base_url=server.url, max_retries=0)
+    return OpenAIManager(client=client, retry_policy=RetryPolicy(**options))
+
+@pytest.mark.asyncio
+async def test_transient_error_is_retried_without_fixed_minimum_wait():
+    with FakeOpenAIServer([Fault(status=500), Fault(status=503)]) as server:
+        manager = make_manager(server)
+        started = time.monotonic()
+
+        recipe = await manager._generate(PARAMETERS)
+        elapsed = time.monotonic() - started
+
+    assert recipe.title == RECIPE["title"]
+    assert len(server.requests) == 3
+    assert elapsed < 1.0
+
+@pytest.mark.asyncio
+async def test_rate_limit_honours_retry_after():
+    faults = [Fault(status=429, headers={"retry-after-ms": "300"})]
+    with FakeOpenAIServer(faults) as server:
+        manager = make_manager(server)
+        started = time.monotonic()
+
+        await manager._generate(PARAMETERS)
+        elapsed = time.monotonic() - started
+
+    assert elapsed >= 0.3
+    assert len(server.requests) == 2
+
+@pytest.mark.asyncio
+async def test_bad_output_is_resampled_once():
+    with FakeOpenAIServer([Fault(content="not json"), Fault(content="{}")]) as server:
+        manager = make_manager(server)
+
+        with pytest.raises(ValueError):
+            await manager._generate(PARAMETERS)
+
+    # One re-sample for unusable output, then give up
+    assert len(server.requests) == 2
+
+@pytest.mark.asyncio
+async def test_client_errors_are_not_retried():
+    with FakeOpenAIServer([Fault(status=400)]) as server:
+        manager = make_manager(server)
+
+        with pytest.raises(openai.BadRequestError):
+            await manager._generate(PARAMETERS)
+
+    assert len(server.requests) == 1
+
+@pytest.mark.asyncio
+async def test_slow_attempt_times_out_and_is_retried():
+    with FakeOpenAIServer([Fault(delay=1.0)]) as server:
+        manager = make_manager(server, attempt_timeout=0.2)
+        started = time.monotonic()
+
+        recipe = await manager._generate(PARAMETERS)
+        elapsed = time.monotonic() - started
+
+    assert recipe.title == RECIPE["title"]
+    assert elapsed < 0.8
+
+@pytest.mark.asyncio
+async def test_deadline_bounds_total_time():
+    faults = [Fault(delay=0.3) for _ in range(10)]
+    with FakeOpenAIServer(faults) as server:
+        manager = make_manager(server, deadline=0.5, attempt_timeout=0.2, max_attempts=10)
+        started = time.monotonic()
+
+        with pytest.raises((TimeoutError, RetryBudgetExceeded)):
+            await manager._generate(PARAMETERS)
+        elapsed = time.monotonic() - started
+
+    assert elapsed < 0.8
+
+@pytest.mark.asyncio
+async def test_hedge_fires_after_p95_and_wins():
+    with FakeOpenAIServer([Fault(delay=1.5)]) as server:
+        manager = make_manager(server)
+        before = hedged_requests.value(winner="hedge")
+        started = time.monotonic()
+
+        with patch.object(openai_manager, 'hedge_delay', lambda: 0.1):
+            recipe = await manager._generate(PARAMETERS)
+        elapsed = time.monotonic() - started
+
+    assert recipe.title == RECIPE["title"]
+    assert len(server.requests) == 2
+    assert elapsed < 1.0
+    assert hedged_requests.value(winner="hedge") == before + 1
+
+def queued_for(seconds):
+    @asynccontextmanager
+    async def admit():
+        await asyncio.sleep(seconds)
+        yield seconds
+    return admit
+
+@pytest.mark.asyncio
+async def test_queue_wait_does_not_count_against_the_attempt_timeout():
+    policy = RetryPolicy(deadline=2.0, attempt_timeout=0.2, max_attempts=1)
+    attempts = []
+
+    async def attempt():
+        attempts.append(time.monotonic())
+        await asyncio.sleep(0.1)
+        return "ok"
+
+    assert await policy.run(attempt, admit=queued_for(0.3)) == "ok"
+    assert len(attempts) == 1
+
+@pytest.mark.asyncio
+async def test_still_queued_at_the_deadline_gives_up_instead_of_retrying():
+    policy = RetryPolicy(deadline=0.2, attempt_timeout=1.0, max_attempts=3)
+    attempts = []
+
+    async def attempt():
+        attempts.append(1)
+
+    started = time.monotonic()
+    with pytest.raises(RetryBudgetExceeded):
+        await policy.run(attempt, admit=queued_for(1.0))
+
+    assert attempts == []
+    assert time.monotonic() - started < 0.5
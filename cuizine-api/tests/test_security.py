@@ -0,0 +1,102 @@
+import pytest
+from fastapi import Depends, FastAPI, Request
+from fastapi.testclient import TestClient
+from unittest.mock import patch
+from app.api.deps import get_current_user, verify_subscription_access
+from app.core import security
+from app.core.security import (
+    JWKSCache,
+    TokenVerificationError,
+    VerifiedClaimsCache,
+    verify_token
+)
+from fakes.jwks import FakeJWKSServer
+
+@pytest.fixture
+def jwks_server():
+    with FakeJWKSServer() as server:
+        yield server
+
+@pytest.fixture
+def caches(jwks_server):
+    jwks = JWKSCache(jwks_server.url, min_refresh_interval=0)
+    claims = VerifiedClaimsCache(max_size=2, ttl=60)
+    with patch.object(security, 'jwks_cache', jwks), patch.object(security, 'claims_cache', claims):
+        yield jwks, claims
+
+class TestVerifyToken:
+    @pytest.mark.asyncio
+    async def test_valid_token(self, jwks_server, caches):
+        token = jwks_server.issue(sub="user_42")
+
+        claims = await verify_token(token)
+
+        assert claims["sub"] == "user_42"
+
+    @pytest.mark.asyncio
+    async def test_jwks_fetched_once(self, jwks_server, caches):
+        tokens = [jwks_server.issue(sub=f"user_{i}") for i in range(5)]
+
+        for token in tokens * 2:
+            await verify_token(token)
+
+        assert jwks_server.requests == 1
+
+    @pytest.mark.asyncio
+    async def test_unknown_kid_refreshes_keys(self, jwks_server, caches):
+        await verify_token(jwks_server.issue())
+        rotated = jwks_server.rotate("key-2")
+
+        claims = await verify_token(jwks_server.issue(sub="user_2", key=rotated))
+
+        assert claims["sub"] == "user_2"
+        assert jwks_server.requests == 2
+
+    @pytest.mark.asyncio
+    async def test_rejects_wrong_audience(self, jwks_server, caches):
+        with pytest.raises(TokenVerificationError):
+            await verify_token(jwks_server.issue(audience="someone-else"))
+
+    @pytest.mark.asyncio
+    async def test_rejects_expired_token(self, jwks_server, caches):
+        with pytest.raises(TokenVerificationError):
+            await verify_token(jwks_server.issue(expires_in=-120))
+
+class TestVerifiedClaimsCache:
+    def test_bounded(self):
+        cache = VerifiedClaimsCache(max_size=2, ttl=60)
+
+        for token in ("a", "b", "c"):
+            cache.set(token, {"sub": token})
+
+        assert cache.get("a") is None
+        assert cache.get("c") == {"sub": "c"}
+
+    def test_never_outlives_token(self):
+        cache = VerifiedClaimsCache(max_size=2, ttl=60)
+
+        cache.set("a", {"sub": "a", "exp": 1})
+
+        assert cache.get("a") is None
+
+def test_one_verification_per_request(jwks_server, caches):
+    app = FastAPI()
+
+    @app.middleware("http")
+    async def auth_middleware(request: Request, call_next):
+        await get_current_user(request)
+        return await call_next(request)
+
+    @app.get("/me")
+    async def me(
+        user = Depends(verify_subscription_access),
+        same_user = Depends(get_current_user)
+    ):
+        return {"id": user.id, "same": user is same_user}
+
+    token = jwks_server.issue(sub="user_7")
+    with patch.object(security.jwt, 'decode', wraps=security.jwt.decode) as decode:
+        response = TestClient(app).get("/me", headers={"Authorization": f"Bearer {token}"})
+
+    assert response.json() == {"id": "user_7", "same": True}
+    assert decode.call_count == 1
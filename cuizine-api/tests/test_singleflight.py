@@ -0,0 +1,106 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, patch
+from app.core import openai_manager
+from app.core.generation_cache import GenerationCache
+from app.core.openai_manager import OpenAIManager
+from app.core.singleflight import SingleFlight
+
+class TestSingleFlight:
+    @pytest.mark.asyncio
+    async def test_coalesces_concurrent_calls(self):
+        calls = 0
+
+        async def work():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return {"title": "Risotto"}
+
+        flights = SingleFlight()
+        results = await asyncio.gather(*[flights.do("k", work) for _ in range(5)])
+
+        assert calls == 1
+        assert all(r == {"title": "Risotto"} for r in results)
+        # Every caller owns its copy
+        assert len({id(r) for r in results}) == 5
+        assert not flights.in_flight("k")
+
+    @pytest.mark.asyncio
+    async def test_errors_propagate_and_are_not_cached(self):
+        attempts = 0
+
+        async def work():
+            nonlocal attempts
+            attempts += 1
+            await asyncio.sleep(0.01)
+            raise ValueError("bad output")
+
+        flights = SingleFlight()
+        results = await asyncio.gather(
+            *[flights.do("k", work) for _ in range(3)], return_exceptions=True
+        )
+        with pytest.raises(ValueError):
+            await flights.do("k", work)
+
+        assert all(isinstance(r, ValueError) for r in results)
+        assert attempts == 2
+
+    @pytest.mark.asyncio
+    async def test_cancelled_follower_does_not_cancel_leader(self):
+        async def work():
+            await asyncio.sleep(0.05)
+            return "done"
+
+        flights = SingleFlight()
+        leader = asyncio.create_task(flights.do("k", work))
+        follower = asyncio.create_task(flights.do("k", work))
+        await asyncio.sleep(0.01)
+        follower.cancel()
+
+        assert await leader == "done"
+        with pytest.raises(asyncio.CancelledError):
+            await follower
+
+    @pytest.mark.asyncio
+    async def test_last_cancellation_cancels_work(self):
+        started = asyncio.Event()
+        cancelled = asyncio.Event()
+
+        async def work():
+            started.set()
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        flights = SingleFlight()
+        caller = asyncio.create_task(flights.do("k", work))
+        await started.wait()
+        caller.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await caller
+        await asyncio.sleep(0)
+
+        assert cancelled.is_set()
+        assert not flights.in_flight("k")
+
+@pytest.mark.asyncio
+async def test_fresh_requests_bypass_coalescing():
+    async def generate(parameters, stats=None):
+        await asyncio.sleep(0.01)
+        return {"title": "Variant"}
+
+    cache = GenerationCache(None, max_size=8, ttls={"custom": 60})
+    params = {"recipe_type": "custom", "selected_ingredients": ["tofu"]}
+    with patch.object(openai_manager, 'generation_cache', cache), \
+         patch.object(OpenAIManager, '_generate', AsyncMock(side_effect=generate)) as completion:
+        manager = OpenAIManager(client=AsyncMock())
+        await asyncio.gather(
+            manager.generate_recipe(params),
+            manager.generate_recipe(params),
+            manager.generate_recipe({**params, "fresh": True})
+        )
+
+    assert completion.await_count == 2